@@ -0,0 +1,312 @@
+"""
+أدوات سطر الأوامر.
+الاستخدام: python -m app.cli <command> [options]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import sys
+from typing import Any, Dict, List, Tuple
+
+from app.core.bench import (
+    PERTURBATIONS, check_budgets, compare_reports, run_benchmark, run_scaling, synthetic_corpus
+)
+from app.core.dedup import (
+    CONFLICT_POLICIES, DEFAULT_THRESHOLD, deduplicate, find_duplicates, public_report
+)
+from app.core.index import CorpusIndex, blocking_recall, lsh_recall
+from app.core.meter import (
+    _DTW_BAND, _ENGINE, _LSH_BANDS, _LSH_ROWS, _SNAPSHOT_PATH, _TOP_K, _USE_SYLLABIC,
+    _load_examples, _load_index, build_snapshot, cache_self_test
+)
+from app.core.similarity import TextFeatures, self_test
+from app.core.stream import DEFAULT_CHUNK_SIZE, FORMATS, run_classify
+from app.core.vectorized import engine_self_test
+
+
+def _variant_queries(texts: List[str], count: int, seed: int) -> List[str]:
+    """أبيات قريبة من المدوّنة (حذف كلمة أو تبديل كلمتين) لقياس الاسترجاع."""
+    rnd = random.Random(seed)
+    sample = rnd.sample(texts, min(count, len(texts)))
+    queries = []
+    for text in sample:
+        words = text.split()
+        if len(words) > 2 and rnd.random() < 0.5:
+            del words[rnd.randrange(len(words))]
+        elif len(words) > 1:
+            i = rnd.randrange(len(words) - 1)
+            words[i], words[i + 1] = words[i + 1], words[i]
+        queries.append(' '.join(words))
+    return queries
+
+
+def _mixed_queries(texts: List[str], count: int, seed: int) -> List[str]:
+    """أبيات جديدة: النصف الأول من بيت مع النصف الثاني من بيت آخر."""
+    rnd = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        a, b = rnd.sample(texts, 2)
+        wa, wb = a.split(), b.split()
+        queries.append(' '.join(wa[:len(wa) // 2] + wb[len(wb) // 2:]))
+    return queries
+
+
+def _live_texts(index: CorpusIndex) -> List[str]:
+    # المحذوف من الفهرس يبقى None في entries
+    return [e.text for e in index.entries if e is not None]
+
+
+def cmd_recall(args: argparse.Namespace) -> int:
+    index = _load_index()
+    queries = _variant_queries(_live_texts(index), args.queries, args.seed)
+    for report in blocking_recall(index, queries, args.top_k):
+        print(json.dumps(report, ensure_ascii=False))
+    return 0
+
+
+def _lsh_config(value: str) -> Tuple[int, int]:
+    bands, _, rows = value.partition("x")
+    try:
+        return int(bands), int(rows)
+    except ValueError:
+        raise argparse.ArgumentTypeError("الصيغة BANDSxROWS، مثل 16x4") from None
+
+
+def cmd_lsh_recall(args: argparse.Namespace) -> int:
+    index = _load_index()
+    make_queries = _mixed_queries if args.mixed else _variant_queries
+    queries = make_queries(_live_texts(index), args.queries, args.seed)
+    for report in lsh_recall(index, queries, args.configs):
+        print(json.dumps(report, ensure_ascii=False))
+    return 0
+
+
+def cmd_build_index(args: argparse.Namespace) -> int:
+    path = args.output or _SNAPSHOT_PATH
+    header = build_snapshot(path)
+    print(json.dumps({
+        "path": path,
+        "bytes": os.path.getsize(path),
+        "entries": header["entries"],
+        "source_sha256": header["source_sha256"],
+    }, ensure_ascii=False))
+    return 0
+
+
+def _index_options(args: argparse.Namespace) -> Dict[str, Any]:
+    # نفس إعدادات الخادم (METER_*) ما لم يُحدَّد المحرك
+    return {
+        "engine": args.engine or _ENGINE,
+        "top_k": _TOP_K,
+        "use_syllabic": _USE_SYLLABIC,
+        "dtw_band": _DTW_BAND,
+        "lsh": (_LSH_BANDS, _LSH_ROWS) if _LSH_BANDS > 0 else None,
+    }
+
+
+def _progress(stage: str, done: int, total: int) -> None:
+    if done == total or done % 100 == 0:
+        print(f"{stage}: {done}/{total}", file=sys.stderr)
+
+
+def cmd_bench(args: argparse.Namespace) -> int:
+    data = _load_examples()
+    if args.write_corpus:
+        corpus = synthetic_corpus(data, args.synthetic[0] if args.synthetic else 10000, args.seed)
+        with open(args.write_corpus, "w", encoding="utf-8") as f:
+            json.dump(corpus, f, ensure_ascii=False, indent=2)
+        print(json.dumps({"path": args.write_corpus, "lines": sum(len(v["examples"]) for v in corpus.values())}))
+        return 0
+    if args.synthetic:
+        problems = []
+        for report in run_scaling(data, args.synthetic, _index_options(args), args.queries, args.seed):
+            print(json.dumps(report, ensure_ascii=False))
+            problems += [f"size {report['size']}: {p}" for p in check_budgets(report)]
+        for problem in problems:
+            print(f"REGRESSION {problem}", file=sys.stderr)
+        return 1 if problems else 0
+
+    report = run_benchmark(data, _index_options(args), args.limit, args.variants, args.seed, _progress)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        problems = compare_reports(baseline, report, args.tolerance, args.perf_tolerance)
+    else:
+        problems = check_budgets(report)
+    for problem in problems:
+        print(f"REGRESSION {problem}", file=sys.stderr)
+    return 1 if problems else 0
+
+
+def cmd_dedup(args: argparse.Namespace) -> int:
+    if args.input:
+        with open(args.input, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    else:
+        data = _load_examples()
+    try:
+        report = find_duplicates(data, args.threshold)
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return 2
+
+    summary = public_report(report)
+    if args.write_corpus:
+        corpus, removed = deduplicate(data, report, args.conflicts)
+        with open(args.write_corpus, "w", encoding="utf-8") as f:
+            f.write(json.dumps(corpus, ensure_ascii=False, indent=2))
+        summary["removed"] = removed
+        summary["corpus"] = args.write_corpus
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        # التقرير الكامل في الملف؛ على الشاشة الأعداد فقط
+        del summary["duplicate_clusters"]
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    return 0
+
+
+def cmd_classify(args: argparse.Namespace) -> int:
+    checkpoint = args.checkpoint
+    if checkpoint is None and args.output != "-":
+        checkpoint = args.output + ".ckpt"
+
+    def report(summary: Dict[str, Any]) -> None:
+        print(f"{summary['lines']} lines, {summary['lines_per_s']} lines/s, "
+              f"{summary['matched']} matched, {summary['seconds']} s", file=sys.stderr)
+
+    try:
+        summary = run_classify(
+            args.input, args.output, fmt=args.format, split=args.split,
+            field=args.field, id_field=args.id_field, workers=args.workers,
+            chunk_size=args.chunk_size, timeout=args.timeout or None,
+            checkpoint_path=checkpoint, resume=args.resume,
+            progress_every=args.progress_every, report=report,
+        )
+    except (OSError, ValueError) as e:
+        print(str(e), file=sys.stderr)
+        return 2
+    print(json.dumps(summary, ensure_ascii=False), file=sys.stderr)
+    return 0
+
+
+def _cache_groups(texts: List[str], count: int, seed: int) -> List[List[str]]:
+    """
+    أشكال لكل بيت جديد (ليس في المدوّنة، فلا يحسمه التطابق التام) بنفس
+    المفتاح: تشكيل، الأصل، تطويل، مسافات زائدة.
+    """
+    rnd = random.Random(seed)
+    groups = []
+    for text in _mixed_queries(texts, count, seed):
+        groups.append([
+            PERTURBATIONS["diacritics"](text, rnd),
+            text,
+            PERTURBATIONS["tatweel"](text, rnd),
+            " " + text.replace(" ", "  ") + " ",
+        ])
+    return groups
+
+
+def cmd_selftest(args: argparse.Namespace) -> int:
+    index = _load_index()
+    texts = _live_texts(index)
+    report = self_test(texts, args.max_pairs)
+    report.update(cache_self_test(_cache_groups(texts, args.cache_lines, args.seed)))
+    # المحركان على عيّنة من الأمثلة، مع أبيات مركّبة وكلمات مفردة (ثنائيات فارغة)
+    queries = _mixed_queries(texts, 20, args.seed) + [t.split()[0] for t in texts[:10] if t.split()]
+    report.update(engine_self_test(
+        [TextFeatures(t) for t in texts[:200]], [TextFeatures(q) for q in queries]
+    ))
+    print(json.dumps(report, ensure_ascii=False))
+    ok = report["levenshtein_mismatches"] == 0 and report["gestalt_mismatches"] == 0 \
+        and report["lcs_below_sequence_matcher"] == 0 and report["cache_mismatches"] == 0 \
+        and report["engine_mismatches"] == 0 \
+        and report["dtw_pairs"] > 0 and report["dtw_mismatches"] == 0 \
+        and report["lb_keogh_violations"] == 0
+    return 0 if ok else 1
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("recall", help="استرجاع مرحلة الحجب مقارنة بالبحث الشامل")
+    p.add_argument("--top-k", type=int, nargs="+", default=[50, 150, 300])
+    p.add_argument("--queries", type=int, default=200)
+    p.add_argument("--seed", type=int, default=13)
+    p.set_defaults(func=cmd_recall)
+
+    p = sub.add_parser("lsh-recall", help="recall@1 لوضع MinHash/LSH مقارنة بالبحث الشامل")
+    p.add_argument("--configs", type=_lsh_config, nargs="+", default=[(16, 4), (32, 2), (64, 2)],
+                   help="BANDSxROWS")
+    p.add_argument("--mixed", action="store_true", help="أبيات مركّبة من بيتين بدل تعديلات بسيطة")
+    p.add_argument("--queries", type=int, default=200)
+    p.add_argument("--seed", type=int, default=13)
+    p.set_defaults(func=cmd_lsh_recall)
+
+    p = sub.add_parser("build-index", help="بناء لقطة الفهرس الثنائية من examples.json")
+    p.add_argument("--output", default=None, help="المسار (افتراضياً METER_SNAPSHOT أو app/data/index.bin)")
+    p.set_defaults(func=cmd_build_index)
+
+    p = sub.add_parser("bench", help="دقة leave-one-out والتنويعات وأزمنة المراحل، أو التوسع على مدوّنة اصطناعية")
+    p.add_argument("--limit", type=int, default=None, help="عيّنة من الأمثلة (افتراضياً كلها)")
+    p.add_argument("--variants", type=int, default=1, help="تنويعات مشوّشة لكل نوع ولكل مثال")
+    p.add_argument("--seed", type=int, default=7)
+    p.add_argument("--engine", choices=["python", "numpy", "auto"], default=None)
+    p.add_argument("--output", default=None, help="حفظ التقرير JSON (خط أساس)")
+    p.add_argument("--compare", default=None, help="خط أساس JSON؛ رمز الخروج 1 عند التراجع")
+    p.add_argument("--tolerance", type=float, default=0.01, help="أقصى نقص مطلق في الدقة")
+    p.add_argument("--perf-tolerance", type=float, default=0.25, help="أقصى زيادة نسبية في الأزمنة/الذاكرة")
+    p.add_argument("--synthetic", type=int, nargs="+", default=None,
+                   help="أحجام مدوّنات اصطناعية لقياس التوسع، مثل 10000 100000")
+    p.add_argument("--queries", type=int, default=300, help="أبيات الاستعلام في وضع --synthetic")
+    p.add_argument("--write-corpus", default=None, help="كتابة مدوّنة اصطناعية بصيغة examples.json")
+    p.set_defaults(func=cmd_bench)
+
+    p = sub.add_parser("dedup", help="الأبيات المكررة وشبه المكررة والمتعارضة بين الأوزان (ربط تشابه)")
+    p.add_argument("--input", default=None, help="مدوّنة بصيغة examples.json (افتراضياً أمثلة الخادم)")
+    p.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                   help="أقل combined_similarity لاعتبار بيتين مكررين (تحت 0.834 يصبح الربط على "
+                        "n-grams حرفية وأبطأ بكثير)")
+    p.add_argument("--output", default=None, help="حفظ التقرير الكامل JSON")
+    p.add_argument("--write-corpus", default=None, help="كتابة مدوّنة منقّحة بصيغة examples.json")
+    p.add_argument("--conflicts", choices=CONFLICT_POLICIES, default="keep",
+                   help="التعارض بين الأوزان في المدوّنة المنقّحة: keep أو majority أو first")
+    p.set_defaults(func=cmd_dedup)
+
+    p = sub.add_parser("classify", help="تصنيف ملف كبير (نص/CSV/JSONL) إلى NDJSON بمجمّع عمليات")
+    p.add_argument("input", help='ملف المدخل، أو "-" للمدخل القياسي')
+    p.add_argument("--output", "-o", default="-", help='ملف NDJSON (افتراضياً "-" للمخرج القياسي)')
+    p.add_argument("--format", choices=FORMATS, default=None, help="افتراضياً حسب امتداد الملف")
+    p.add_argument("--split", choices=["bayt", "shatr"], default="bayt")
+    p.add_argument("--field", default="text", help="عمود/حقل النص في CSV وJSONL")
+    p.add_argument("--id-field", default=None, help="عمود/حقل معرّف السجل (يُنسخ إلى الناتج)")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="عدد العمليات (1 = بلا مجمّع)")
+    p.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="أبيات كل مهمة")
+    p.add_argument("--timeout", type=float, default=0.0,
+                   help="مهلة كل بيت بالثواني كما في METER_TIMEOUT (0 = بلا مهلة)")
+    p.add_argument("--checkpoint", default=None, help="ملف نقطة الاستئناف (افتراضياً OUTPUT.ckpt)")
+    p.add_argument("--resume", action="store_true", help="الإكمال من نقطة الاستئناف")
+    p.add_argument("--progress-every", type=float, default=5.0, help="ثوانٍ بين تقارير التقدم")
+    p.set_defaults(func=cmd_classify)
+
+    p = sub.add_parser("selftest", help="مقارنة المسافات السريعة بالمرجعية على أزواج الأمثلة، والذاكرة المؤقتة بالتحليل دونها")
+    p.add_argument("--max-pairs", type=int, default=None)
+    p.add_argument("--cache-lines", type=int, default=200, help="أبيات فحص الذاكرة المؤقتة (مخزّنة مقابل غير مخزّنة)")
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(func=cmd_selftest)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""
+تحليل قصيدة كاملة أو دفعة من الأبيات.
+يُقسَّم النص إلى أبيات (أو أشطر)، ويُحلَّل كل سطر في مجمّع عمّال يتشارك
+فهرس الأمثلة المحمّل، ثم نحسب الوزن الغالب ومدى اتساق القصيدة معه.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import re
+from collections import Counter
+import time
+from concurrent.futures import Executor
+from typing import Dict, List, Optional
+
+from app.core.meter import analyze_poem_line
+from app.core.metrics import METRICS_ENABLED, observe_many
+from app.core.pool import AnalysisPool, get_pool
+
+# فواصل الشطرين الشائعة في الكتابة: ... أو * أو / أو — أو مسافات متعددة/تاب
+_SHATR_SEP = re.compile(r"\s*(?:\.{2,}|…|\*+|/+|—+|\t)\s*|\s{3,}")
+
+# أقصى عدد أسطر في طلب واحد
+MAX_BATCH_LINES = int(os.environ.get("METER_MAX_BATCH_LINES", "2000"))
+# مهلة تحليل الدفعة كاملة بالثواني؛ الأسطر بعدها تعود بأفضل نتيجة جزئية
+BATCH_TIMEOUT = float(os.environ.get("METER_BATCH_TIMEOUT", "30.0"))
+
+
+def split_poem(text: str, mode: str = "bayt") -> List[str]:
+    """
+    تقسيم قصيدة إلى أسطر غير فارغة.
+    mode="bayt": كل سطر بيت. mode="shatr": يُقسم كل بيت أيضاً إلى شطريه.
+    """
+    lines = [line.strip() for line in (text or "").splitlines()]
+    lines = [line for line in lines if line]
+    if mode != "shatr":
+        return lines
+    parts = []
+    for line in lines:
+        parts.extend(p.strip() for p in _SHATR_SEP.split(line) if p.strip())
+    return parts
+
+
+def summarize_poem(results: List[Dict]) -> Dict:
+    """
+    الوزن الغالب بين الأسطر المطابقة، والاتساق = نسبة الأسطر المطابقة
+    التي جاءت على هذا الوزن.
+    """
+    weights = [r["weight"] for r in results if r.get("ok") and r.get("matched")]
+    if not weights:
+        return {"weight": None, "consistency": 0.0, "matched_lines": 0, "weights": {}}
+    counts = Counter(weights)
+    weight, count = counts.most_common(1)[0]
+    return {
+        "weight": weight,
+        "consistency": round(count / len(weights), 3),
+        "matched_lines": len(weights),
+        "weights": dict(counts.most_common()),
+    }
+
+
+def _analyze_chunk(lines: List[str], timings: bool = False, deadline: Optional[float] = None) -> List[Dict]:
+    return [analyze_poem_line(line, deadline=deadline, timings=timings) for line in lines]
+
+
+def _chunks(lines: List[str], max_chunks: int) -> List[List[str]]:
+    size = max(1, -(-len(lines) // max_chunks))
+    return [lines[i:i + size] for i in range(0, len(lines), size)]
+
+
+def analyze_lines(lines: List[str], executor: Optional[Executor] = None, workers: int = 1) -> List[Dict]:
+    """تحليل الأسطر (في executor إن أُعطي) مع الحفاظ على ترتيبها."""
+    if executor is None:
+        return _analyze_chunk(lines)
+    results: List[Dict] = []
+    # بضع قطع لكل عامل: توازن جيد دون كلفة إرسال كل سطر وحده
+    for chunk in executor.map(_analyze_chunk, _chunks(lines, workers * 4)):
+        results.extend(chunk)
+    return results
+
+
+async def analyze_lines_async(
+    lines: List[str],
+    pool: Optional[AnalysisPool] = None,
+    timeout: float = BATCH_TIMEOUT
+) -> List[Dict]:
+    """
+    مثل analyze_lines لكن في مجمّع التحليل دون حجب حلقة الأحداث.
+    يرفع PoolBusy إن لم يتسع الطابور لكل قطع الدفعة.
+    """
+    if pool is None:
+        pool = get_pool()
+    chunks = _chunks(lines, min(pool.workers * 4, pool.capacity))
+    pool.acquire(len(chunks))
+    deadline = time.time() + timeout
+    results = await asyncio.gather(
+        *(pool.run(_analyze_chunk, chunk, METRICS_ENABLED, deadline=deadline) for chunk in chunks)
+    )
+    lines_out = [r for chunk in results for r in chunk]
+    observe_many(lines_out)
+    return lines_out
+
+
+def poem_response(results: List[Dict]) -> Dict:
+    return {
+        "ok": True,
+        "count": len(results),
+        "results": results,
+        "poem": summarize_poem(results),
+    }
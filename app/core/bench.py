@@ -0,0 +1,358 @@
+"""
+قياس الدقة والأداء على examples.json بشكل قابل للتكرار (python -m app.cli bench).
+
+- leave-one-out: كل مثال يُحذف من الفهرس (add/remove التزايدي) ثم يُصنَّف
+  بالمراحل نفسها التي يمر بها الطلب، وتُقارن النتيجة بوزنه.
+- تنويعات مشوّشة (تشكيل، تطويل، تبديل حرفين، بدائل لهجية) تُصنَّف على
+  الفهرس الكامل لقياس متانة التطبيع والبحث.
+- مدوّنة اصطناعية كبيرة (نصف بيت + نصف بيت من الوزن نفسه) لقياس التوسع.
+
+التقرير JSON يُحفظ كخط أساس، وcompare_reports يعدّد التراجعات عنه.
+"""
+
+from __future__ import annotations
+
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import resource
+except ImportError:  # ويندوز
+    resource = None
+
+from app.core.index import CorpusIndex
+from app.core.meter import _analyze_uncached, _build_weight_profiles, _flatten_candidates
+from app.core.metrics import StageTimer
+from app.core.normalize import normalize_arabic
+
+_HARAKAT = "َُِّْ"
+_TATWEEL = "ـ"
+# بدائل إملائية لهجية شائعة (حرف -> بديله في الكتابة الشعبية)
+_DIALECT_LETTERS = {"ق": "گ", "ك": "چ", "ج": "چ"}
+_DIALECT_WORDS = {"هاي": "هذا", "الي": "الذي", "شلون": "كيف", "ليش": "لماذا"}
+_WORD_END = {"ه": "ة", "ي": "ى"}
+# سقف متوسط كلفة lookup_near_exact لكل استعلام (ميكروثانية)؛ المسح الخطي كان ~5000
+NEAR_EXACT_MAX_US = 1000.0
+
+
+def _add_diacritics(text: str, rnd: random.Random) -> str:
+    return "".join(c + rnd.choice(_HARAKAT) if c.isalpha() and rnd.random() < 0.4 else c for c in text)
+
+
+def _add_tatweel(text: str, rnd: random.Random) -> str:
+    out = []
+    for k, c in enumerate(text):
+        out.append(c)
+        nxt = text[k + 1] if k + 1 < len(text) else " "
+        if c.isalpha() and nxt.isalpha() and rnd.random() < 0.25:
+            out.append(_TATWEEL * rnd.randint(1, 3))
+    return "".join(out)
+
+
+def _swap_letters(text: str, rnd: random.Random) -> str:
+    words = text.split()
+    long_words = [k for k, w in enumerate(words) if len(w) > 3]
+    if not long_words:
+        return text
+    k = rnd.choice(long_words)
+    w = words[k]
+    i = rnd.randrange(len(w) - 1)
+    words[k] = w[:i] + w[i + 1] + w[i] + w[i + 2:]
+    return " ".join(words)
+
+
+def _dialect(text: str, rnd: random.Random) -> str:
+    words = []
+    for w in text.split():
+        if w in _DIALECT_WORDS:
+            w = _DIALECT_WORDS[w]
+        elif w[-1] in _WORD_END and rnd.random() < 0.5:
+            w = w[:-1] + _WORD_END[w[-1]]
+        w = "".join(_DIALECT_LETTERS.get(c, c) if rnd.random() < 0.5 else c for c in w)
+        words.append(w)
+    return " ".join(words)
+
+
+PERTURBATIONS: Dict[str, Callable[[str, random.Random], str]] = {
+    "diacritics": _add_diacritics,
+    "tatweel": _add_tatweel,
+    "letter_swap": _swap_letters,
+    "dialect": _dialect,
+}
+
+
+def synthetic_corpus(data: Dict, size: int, seed: int = 1) -> Dict:
+    """
+    مدوّنة بصيغة examples.json فيها size بيت: النصف الأول من مثال مع النصف
+    الثاني من مثال آخر من الوزن نفسه (بنسبة أوزان المدوّنة الأصلية).
+    """
+    rnd = random.Random(seed)
+    candidates = _flatten_candidates(data)
+    by_weight: Dict[str, List[List[str]]] = {}
+    for weight, text in candidates:
+        by_weight.setdefault(weight, []).append(text.split())
+    out: Dict[str, Any] = {w: {"examples": []} for w in by_weight}
+    for _ in range(size):
+        weight, _ = rnd.choice(candidates)
+        a, b = rnd.choice(by_weight[weight]), rnd.choice(by_weight[weight])
+        out[weight]["examples"].append(" ".join(a[:len(a) // 2] + b[len(b) // 2:]))
+    return out
+
+
+def _percentiles(values: Sequence[float]) -> Dict[str, float]:
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "mean": 0.0}
+    ordered = sorted(values)
+    n = len(ordered)
+
+    def rank(q: float) -> float:
+        return ordered[min(n - 1, max(0, int(q * n + 0.5) - 1))]
+
+    return {
+        "p50": round(rank(0.50), 4),
+        "p95": round(rank(0.95), 4),
+        "p99": round(rank(0.99), 4),
+        "mean": round(sum(ordered) / n, 4),
+    }
+
+
+def _peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    # Linux: كيلوبايت
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1)
+
+
+class _Run:
+    """نتائج مجموعة استعلامات: الدقة لكل وزن والطرق وأزمنة المراحل."""
+
+    def __init__(self):
+        self.lines = 0
+        self.matched = 0
+        self.correct = 0
+        self.per_weight: Dict[str, List[int]] = {}
+        self.methods: Dict[str, int] = {}
+        self.totals: List[float] = []
+        self.stages: Dict[str, List[float]] = {}
+        self.seconds = 0.0
+
+    def classify(self, index: CorpusIndex, text: str, weight: str, exclude: Optional[int] = None) -> None:
+        timer = StageTimer()
+        started = time.perf_counter()
+        normalized = normalize_arabic(text, deep=False)
+        timer.mark("normalize")
+        result = _analyze_uncached(text, normalized, index, None, timer, exclude)
+        self.seconds += time.perf_counter() - started
+
+        timings = timer.as_dict()
+        self.totals.append(timings["total_ms"])
+        for stage, ms in timings["stages_ms"].items():
+            self.stages.setdefault(stage, []).append(ms)
+        method = result.get("method") if result.get("matched") else "unmatched"
+        self.methods[method] = self.methods.get(method, 0) + 1
+        hit = int(bool(result.get("matched")) and result.get("weight") == weight)
+        self.lines += 1
+        self.matched += int(bool(result.get("matched")))
+        self.correct += hit
+        counts = self.per_weight.setdefault(weight, [0, 0])
+        counts[0] += 1
+        counts[1] += hit
+
+    def accuracy(self) -> Dict[str, Any]:
+        return {
+            "lines": self.lines,
+            "accuracy": round(self.correct / self.lines, 4) if self.lines else 0.0,
+            # نسبة الأبيات التي أُعطيت وزناً، ودقة الوزن بينها فقط
+            "coverage": round(self.matched / self.lines, 4) if self.lines else 0.0,
+            "precision": round(self.correct / self.matched, 4) if self.matched else 0.0,
+            "per_weight": {
+                w: {"lines": n, "accuracy": round(c / n, 4)} for w, (n, c) in sorted(self.per_weight.items())
+            },
+            "methods": dict(sorted(self.methods.items())),
+        }
+
+
+def _latency(runs: Sequence[_Run]) -> Dict[str, Any]:
+    totals = [t for r in runs for t in r.totals]
+    stages: Dict[str, List[float]] = {}
+    for r in runs:
+        for stage, values in r.stages.items():
+            stages.setdefault(stage, []).extend(values)
+    lines = sum(r.lines for r in runs)
+    seconds = sum(r.seconds for r in runs)
+    return {
+        "latency_ms": {
+            "total": _percentiles(totals),
+            "stages": {stage: _percentiles(v) for stage, v in stages.items()},
+        },
+        "throughput_lps": round(lines / seconds, 1) if seconds else 0.0,
+    }
+
+
+def _near_exact_cost(index: CorpusIndex, texts: Sequence[str]) -> Dict[str, float]:
+    """زمن lookup_near_exact (خفيف وعميق) لكل استعلام بالميكروثانية."""
+    costs: List[float] = []
+    for text in texts:
+        for deep in (False, True):
+            compact = normalize_arabic(text, deep=deep).replace(" ", "")
+            started = time.perf_counter()
+            index.lookup_near_exact(compact, deep)
+            costs.append((time.perf_counter() - started) * 1e6)
+    return _percentiles(costs)
+
+
+def check_budgets(report: Dict[str, Any]) -> List[str]:
+    """حدود مطلقة لا تحتاج خط أساس."""
+    problems: List[str] = []
+    mean = report.get("near_exact_us", {}).get("mean")
+    if mean is not None and mean > NEAR_EXACT_MAX_US:
+        problems.append(f"near_exact mean us: {mean} > {NEAR_EXACT_MAX_US}")
+    return problems
+
+
+def _build(candidates: List[Tuple[str, str]], options: Dict[str, Any]) -> Tuple[CorpusIndex, float]:
+    started = time.perf_counter()
+    profiles: Dict[str, List[str]] = {}
+    for weight, text in candidates:
+        profiles.setdefault(weight, []).append(text)
+    index = CorpusIndex(
+        list(candidates), {w: " ".join(v) for w, v in profiles.items()}, **options
+    )
+    return index, round(time.perf_counter() - started, 3)
+
+
+def run_benchmark(
+    data: Dict,
+    options: Dict[str, Any],
+    limit: Optional[int] = None,
+    variants: int = 1,
+    seed: int = 7,
+    progress: Optional[Callable[[str, int, int], None]] = None,
+) -> Dict[str, Any]:
+    """
+    options: معاملات CorpusIndex (engine, top_k, use_syllabic, dtw_band, lsh).
+    limit: عدد الأمثلة في leave-one-out (None = كلها، عيّنة ثابتة بـ seed).
+    variants: عدد التنويعات المشوّشة لكل نوع ولكل مثال في العيّنة.
+    """
+    candidates = _flatten_candidates(data)
+    index, build_seconds = _build(candidates, options)
+    rnd = random.Random(seed)
+    sample = list(candidates)
+    if limit is not None and limit < len(sample):
+        sample = rnd.sample(sample, limit)
+
+    # 1. leave-one-out: المثال مستبعد من كل المراحل، والمدوّنة لا تتغير
+    loo = _Run()
+    for n, (weight, text) in enumerate(sample):
+        loo.classify(index, text, weight, exclude=index.find_example(weight, text))
+        if progress is not None:
+            progress("loo", n + 1, len(sample))
+
+    # 2. التنويعات على الفهرس نفسه
+    runs: Dict[str, _Run] = {}
+    queries: List[str] = []
+    for kind, perturb in PERTURBATIONS.items():
+        run = runs[kind] = _Run()
+        for weight, text in sample:
+            for _ in range(variants):
+                query = perturb(text, rnd)
+                queries.append(query)
+                run.classify(index, query, weight)
+        if progress is not None:
+            progress(kind, len(sample), len(sample))
+
+    report: Dict[str, Any] = {
+        "config": {
+            "examples": len(candidates),
+            "weights": len(_build_weight_profiles(data)),
+            "sample": len(sample),
+            "variants": variants,
+            "seed": seed,
+            **{k: (list(v) if isinstance(v, tuple) else v) for k, v in options.items()},
+        },
+        "build_seconds": build_seconds,
+        "loo": loo.accuracy(),
+        "variants": {
+            kind: {k: v for k, v in run.accuracy().items() if k != "per_weight"}
+            for kind, run in runs.items()
+        },
+    }
+    report.update(_latency([loo, *runs.values()]))
+    report["near_exact_us"] = _near_exact_cost(index, queries)
+    report["peak_rss_mb"] = _peak_rss_mb()
+    return report
+
+
+def run_scaling(
+    data: Dict,
+    sizes: Sequence[int],
+    options: Dict[str, Any],
+    queries: int = 300,
+    seed: int = 7,
+) -> List[Dict[str, Any]]:
+    """لكل حجم: زمن البناء، والدقة والأزمنة على أبيات اصطناعية جديدة (ليست في المدوّنة)."""
+    reports = []
+    for size in sizes:
+        corpus = synthetic_corpus(data, size, seed)
+        index, build_seconds = _build(_flatten_candidates(corpus), options)
+        held_out = _flatten_candidates(synthetic_corpus(data, queries, seed + 1))
+        run = _Run()
+        for weight, text in held_out:
+            run.classify(index, text, weight)
+        report = {
+            "size": size,
+            "build_seconds": build_seconds,
+            "accuracy": run.accuracy()["accuracy"],
+        }
+        report.update(_latency([run]))
+        report["near_exact_us"] = _near_exact_cost(index, [text for _, text in held_out])
+        report["peak_rss_mb"] = _peak_rss_mb()
+        reports.append(report)
+    return reports
+
+
+def compare_reports(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    tolerance: float = 0.01,
+    perf_tolerance: float = 0.25,
+) -> List[str]:
+    """
+    التراجعات عن خط الأساس: دقة أقل بأكثر من tolerance (فرق مطلق)، أو
+    أزمنة/ذاكرة أعلى (أو إنتاجية أقل) بأكثر من perf_tolerance (نسبة)،
+    إضافة إلى حدود check_budgets على التقرير الحالي.
+    """
+    problems: List[str] = []
+
+    def accuracy(name: str, old: Optional[float], new: Optional[float]) -> None:
+        if old is not None and new is not None and new < old - tolerance:
+            problems.append(f"{name}: accuracy {old:.4f} -> {new:.4f}")
+
+    def higher(name: str, old: Optional[float], new: Optional[float]) -> None:
+        if old and new is not None and new > old * (1.0 + perf_tolerance):
+            problems.append(f"{name}: {old} -> {new} (+{100.0 * (new / old - 1.0):.0f}%)")
+
+    old_loo, new_loo = baseline.get("loo", {}), current.get("loo", {})
+    accuracy("loo", old_loo.get("accuracy"), new_loo.get("accuracy"))
+    accuracy("loo precision", old_loo.get("precision"), new_loo.get("precision"))
+    for weight, old in old_loo.get("per_weight", {}).items():
+        new = new_loo.get("per_weight", {}).get(weight)
+        if new is not None:
+            accuracy(f"loo[{weight}]", old["accuracy"], new["accuracy"])
+    for kind, old in baseline.get("variants", {}).items():
+        new = current.get("variants", {}).get(kind)
+        if new is not None:
+            accuracy(f"variants[{kind}]", old["accuracy"], new["accuracy"])
+
+    old_total = baseline.get("latency_ms", {}).get("total", {})
+    new_total = current.get("latency_ms", {}).get("total", {})
+    for q in ("p50", "p95", "p99"):
+        higher(f"latency {q} ms", old_total.get(q), new_total.get(q))
+    old_lps, new_lps = baseline.get("throughput_lps"), current.get("throughput_lps")
+    if old_lps and new_lps is not None and new_lps < old_lps * (1.0 - perf_tolerance):
+        problems.append(f"throughput: {old_lps} -> {new_lps} lines/s")
+    higher("near_exact p95 us", baseline.get("near_exact_us", {}).get("p95"),
+           current.get("near_exact_us", {}).get("p95"))
+    higher("peak_rss_mb", baseline.get("peak_rss_mb"), current.get("peak_rss_mb"))
+    return problems + check_budgets(current)
@@ -0,0 +1,335 @@
+"""
+كشف الأبيات المكررة أو شبه المكررة في examples.json، والتعارض بين الأوزان
+(البيت نفسه تقريباً تحت وزنين)، بربط تشابه (similarity join) على المدوّنة كلها
+(python -m app.cli dedup).
+
+1. التطابق التام: الأبيات ذات الشكل المضغوط نفسه (deep) مجموعة واحدة، وهي
+   ما يتنازع عليه exact_match (أول مثال بترتيب الملف يفوز).
+2. الربط: لكل مجموعة ممثّل واحد؛ ترشيح بالبادئة (prefix filtering) على
+   ثنائيات الكلمات (أو n-grams الحرفية للعتبات المنخفضة). عتبة Jaccard مشتقة
+   من عتبة combined_similarity (بقية المقاييس لا تتجاوز 1)، فلا يفوت الترشيح
+   أي زوج يبلغ العتبة، والنتيجة مطابقة للمقارنة الشاملة N².
+3. التحقق: حدود عليا رخيصة ثم combined_similarity_features نفسها.
+
+الأزواج المؤكدة تُضم في عناقيد (union-find)؛ العنقود متعارض إن ضم أكثر من وزن.
+"""
+
+from __future__ import annotations
+
+import math
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from app.core.index import _length_ratio, _sequence_bound
+from app.core.normalize import NormalizedText, normalize_arabic
+from app.core.similarity import (
+    _DEFAULT_WEIGHTS, TextFeatures, jaccard_similarity, similarity_breakdown, weighted_score
+)
+
+# عتبة combined_similarity الافتراضية لاعتبار بيتين مكررين
+DEFAULT_THRESHOLD = 0.9
+# سياسات التعارض عند كتابة المدوّنة المنقّحة
+CONFLICT_POLICIES = ("keep", "majority", "first")
+
+# المقاييس المستخدمة في التحقق (combined_similarity بإعداداته الافتراضية)
+_METRICS = ("levenshtein", "jaccard_words", "jaccard_char3", "jaccard_word2", "sequence")
+
+
+class _Line:
+    __slots__ = ("weight", "position", "text", "compact_deep")
+
+    def __init__(self, weight: str, position: int, text: str):
+        self.weight = weight
+        # موقعه في قائمة examples لوزنه (لكتابة المدوّنة المنقّحة)
+        self.position = position
+        self.text = text
+        self.compact_deep = normalize_arabic(text, deep=True).replace(' ', '')
+
+
+def _lines(data: Dict) -> List[_Line]:
+    # نفس تصفية _flatten_candidates (نصوص غير فارغة بعد strip)
+    lines = []
+    for weight, info in data.items():
+        for position, ex in enumerate(info.get("examples", [])):
+            if isinstance(ex, str) and ex.strip():
+                lines.append(_Line(weight, position, ex.strip()))
+    return lines
+
+
+# مجموعات Jaccard الممكنة مفتاحاً للربط، بترتيب التفضيل (الأندر عناصرَ أولاً)
+JOIN_KEYS = ("jaccard_word2", "jaccard_words", "jaccard_char3")
+
+
+def metric_threshold(threshold: float, metric: str) -> float:
+    """
+    أقل درجة للمقياس يمكن أن يبلغ معها combined_similarity العتبة (بقية
+    المقاييس لا تتجاوز 1): w·s + (W - w) >= T·W  =>  s >= 1 - W·(1 - T) / w.
+    """
+    total = sum(_DEFAULT_WEIGHTS[m] for m in _METRICS)
+    return 1.0 - total * (1.0 - threshold) / _DEFAULT_WEIGHTS[metric]
+
+
+def _key_sets(normalized: NormalizedText, key: str) -> FrozenSet[str]:
+    if key == "jaccard_word2":
+        return normalized.word_ngrams(2)
+    if key == "jaccard_words":
+        return normalized.token_set
+    return normalized.char_ngrams(3)
+
+
+class _UnionFind:
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+
+    def find(self, i: int) -> int:
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(self, a: int, b: int) -> None:
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            # الجذر = أصغر رقم (أول بيت في الملف)
+            if rb < ra:
+                ra, rb = rb, ra
+            self.parent[rb] = ra
+
+
+def similarity_join(
+    texts: List[str],
+    threshold: float = DEFAULT_THRESHOLD,
+    stats: Optional[Dict[str, int]] = None,
+    key: Optional[str] = None
+) -> List[Tuple[int, int, float]]:
+    """
+    كل الأزواج (i < j, score) التي يبلغ فيها combined_similarity العتبة.
+
+    بلوغ العتبة يستلزم حداً أدنى لكل مقياس على حدة (metric_threshold)، فالربط
+    يكون على مجموعة واحدة (key، افتراضياً أندر ما تسمح به العتبة) بترشيح
+    البادئة والموقع (PPJoin): العناصر مرتبة من الأندر للأشيع، وزوجان بلغا
+    Jaccard t لا بد أن يشتركا في عنصر من بادئتيهما، والمرشح يُستبعد حين لا
+    يكفي ما تبقى من البيتين لبلوغ التداخل اللازم. ثم حدود المقاييس الأخرى،
+    ثم combined_similarity_features نفسها.
+    """
+    weights = _DEFAULT_WEIGHTS
+    total = sum(weights[m] for m in _METRICS)
+    if key is None:
+        key = next((k for k in JOIN_KEYS if metric_threshold(threshold, k) > 0.0), JOIN_KEYS[-1])
+    t = metric_threshold(threshold, key)
+    if t <= 0.0:
+        # تحت هذا الحد قد يبلغ زوجٌ العتبة بلا أي عنصر مشترك
+        lowest = 1.0 - weights[key] / total
+        raise ValueError(f"العتبة يجب أن تكون أكبر من {lowest:.3f}")
+    t -= 1e-9
+    t_char3 = metric_threshold(threshold, "jaccard_char3") - 1e-9
+    t_words = metric_threshold(threshold, "jaccard_words") - 1e-9
+    t_word2 = metric_threshold(threshold, "jaccard_word2") - 1e-9
+    need = threshold * total - 1e-9
+
+    # بلا تخزين مؤقت: المدوّنة كلها تُطبَّع مرة واحدة
+    normalized = [NormalizedText(text, normalize_arabic(text, deep=False)) for text in texts]
+    sets = [_key_sets(n, key) for n in normalized]
+    freq: Counter = Counter()
+    for items in sets:
+        freq.update(items)
+    rank = {g: r for r, g in enumerate(sorted(freq, key=lambda g: (freq[g], g)))}
+    tokens = [sorted(rank[g] for g in items) for items in sets]
+    sizes = [len(toks) for toks in tokens]
+    order = sorted((i for i in range(len(texts)) if sizes[i]), key=lambda i: (sizes[i], i))
+    # خصائص التحقق الكاملة (gestalt، ...) للأبيات التي تبلغ مرحلة التحقق فقط
+    features: Dict[int, TextFeatures] = {}
+    # أقل تداخل لبلوغ Jaccard t بين مجموعتين حجماهما a و b: t/(1+t)·(a+b)
+    ratio = t / (1.0 + t)
+
+    # عنصر -> (رقم البيت، موقعه في البيت) لبادئة الفهرسة فقط
+    postings: Dict[int, List[Tuple[int, int]]] = defaultdict(list)
+    # بداية كل قائمة: ما قبلها أقصر من أن يبلغ العتبة مع البيت الحالي (الأطوال تتزايد)
+    starts: Dict[int, int] = defaultdict(int)
+    pairs: List[Tuple[int, int, float]] = []
+    candidates = verified = 0
+    for x in order:
+        toks = tokens[x]
+        size = sizes[x]
+        min_size = math.ceil(t * size)
+        overlap: Dict[int, int] = {}
+        for i in range(size - min_size + 1):
+            plist = postings[toks[i]]
+            start = starts[toks[i]]
+            while start < len(plist) and sizes[plist[start][0]] < min_size:
+                start += 1
+            starts[toks[i]] = start
+            rest_x = size - i - 1
+            for k in range(start, len(plist)):
+                y, j = plist[k]
+                seen = overlap.get(y, 0)
+                if seen < 0:
+                    continue
+                # ترشيح بالموقع: المشترك الممكن بعد هذا الـ n-gram لا يتجاوز أقصر البقيتين
+                rest = sizes[y] - j - 1
+                if seen + 1 + (rest if rest < rest_x else rest_x) >= ratio * (size + sizes[y]):
+                    overlap[y] = seen + 1
+                else:
+                    overlap[y] = -1
+        # بادئة الفهرسة أقصر: كل بيت لاحق لا يقل حجماً عن x
+        for i in range(size - math.ceil(2.0 * ratio * size) + 1):
+            postings[toks[i]].append((x, i))
+
+        nx = normalized[x]
+        for y, seen in overlap.items():
+            if seen <= 0:
+                continue
+            candidates += 1
+            ny = normalized[y]
+            inter = len(sets[x] & sets[y])
+            if inter / (size + sizes[y] - inter) < t:
+                continue
+            j3 = jaccard_similarity(nx.char_ngrams(3), ny.char_ngrams(3))
+            if j3 < t_char3:
+                continue
+            jw = jaccard_similarity(nx.token_set, ny.token_set)
+            if jw < t_words:
+                continue
+            jw2 = jaccard_similarity(nx.word_ngrams(2), ny.word_ngrams(2))
+            if jw2 < t_word2:
+                continue
+            la, lb = len(texts[x]), len(texts[y])
+            bound = (
+                weights["jaccard_char3"] * j3
+                + weights["jaccard_words"] * jw
+                + weights["jaccard_word2"] * jw2
+                + weights["levenshtein"] * _length_ratio(la, lb)
+                + weights["sequence"] * _sequence_bound(la, lb, min(la, lb))
+            )
+            if bound < need:
+                continue
+            verified += 1
+            a, b = (x, y) if x < y else (y, x)
+            for i in (a, b):
+                if i not in features:
+                    features[i] = TextFeatures(texts[i])
+            score = weighted_score(similarity_breakdown(features[a], features[b]), weights)
+            if score >= threshold:
+                pairs.append((a, b, score))
+
+    if stats is not None:
+        stats["key"] = key
+        stats["candidates"] = candidates
+        stats["verified"] = verified
+    pairs.sort()
+    return pairs
+
+
+def find_duplicates(data: Dict, threshold: float = DEFAULT_THRESHOLD) -> Dict[str, Any]:
+    """تقرير العناقيد (مكررة أو متعارضة) لمدوّنة بصيغة examples.json."""
+    timings: Dict[str, float] = {}
+    start = time.perf_counter()
+    lines = _lines(data)
+    timings["normalize_s"] = time.perf_counter() - start
+
+    uf = _UnionFind(len(lines))
+    first_of: Dict[str, int] = {}
+    representatives: List[int] = []
+    for i, line in enumerate(lines):
+        first = first_of.setdefault(line.compact_deep, i)
+        if first == i:
+            representatives.append(i)
+        else:
+            uf.union(first, i)
+
+    start = time.perf_counter()
+    stats: Dict[str, int] = {}
+    pairs = similarity_join([lines[i].text for i in representatives], threshold, stats)
+    timings["join_s"] = time.perf_counter() - start
+
+    # أدنى تشابه مؤكد داخل كل عنقود (1.0 لعناقيد التطابق التام وحدها)
+    for a, b, _ in pairs:
+        uf.union(representatives[a], representatives[b])
+    min_score: Dict[int, float] = {}
+    for a, b, score in pairs:
+        root = uf.find(representatives[a])
+        min_score[root] = min(min_score.get(root, 1.0), score)
+
+    members: Dict[int, List[int]] = defaultdict(list)
+    for i in range(len(lines)):
+        members[uf.find(i)].append(i)
+
+    clusters = []
+    for root, ids in members.items():
+        if len(ids) < 2:
+            continue
+        weights = list(dict.fromkeys(lines[i].weight for i in ids))
+        clusters.append({
+            "weights": weights,
+            "conflict": len(weights) > 1,
+            "exact": len({lines[i].compact_deep for i in ids}) == 1,
+            "min_similarity": round(min_score.get(root, 1.0), 3),
+            "members": [{"weight": lines[i].weight, "text": lines[i].text} for i in ids],
+            "_ids": ids,
+        })
+
+    timings = {k: round(v, 3) for k, v in timings.items()}
+    return {
+        "lines": len(lines),
+        "threshold": threshold,
+        "join_key": stats["key"],
+        "exact_groups": len(lines) - len(representatives),
+        "candidates": stats["candidates"],
+        "verified": stats["verified"],
+        "pairs": len(pairs),
+        "clusters": len(clusters),
+        "conflicts": sum(c["conflict"] for c in clusters),
+        "timings_s": timings,
+        "duplicate_clusters": clusters,
+        "_lines": lines,
+    }
+
+
+def deduplicate(data: Dict, report: Dict[str, Any], conflicts: str = "keep") -> Tuple[Dict, int]:
+    """
+    نسخة منقّحة من المدوّنة وعدد الأبيات المحذوفة. من كل عنقود يبقى أول بيت
+    لكل وزن؛ والتعارض: keep = تبقى كل الأوزان، majority = الوزن الأكثر
+    أبياتاً في العنقود (التعادل لأسبقها)، first = أول بيت في الملف فقط.
+    """
+    if conflicts not in CONFLICT_POLICIES:
+        raise ValueError(f"سياسة تعارض غير معروفة: {conflicts}")
+    lines: List[_Line] = report["_lines"]
+    drop = defaultdict(set)
+    for cluster in report["duplicate_clusters"]:
+        ids = cluster["_ids"]
+        keep_weights = cluster["weights"]
+        if conflicts == "majority":
+            counts = Counter(lines[i].weight for i in ids)
+            keep_weights = [max(keep_weights, key=lambda w: counts[w])]
+        elif conflicts == "first":
+            keep_weights = keep_weights[:1]
+        kept = set()
+        for i in ids:
+            line = lines[i]
+            if line.weight in keep_weights and line.weight not in kept:
+                kept.add(line.weight)
+                continue
+            drop[line.weight].add(line.position)
+
+    out = {}
+    removed = 0
+    for weight, info in data.items():
+        info = dict(info)
+        examples = info.get("examples", [])
+        positions = drop.get(weight)
+        if positions:
+            info["examples"] = [ex for p, ex in enumerate(examples) if p not in positions]
+            removed += len(positions)
+        out[weight] = info
+    return out, removed
+
+
+def public_report(report: Dict[str, Any]) -> Dict[str, Any]:
+    """التقرير بلا الحقول الداخلية (لكتابته JSON)."""
+    out = {k: v for k, v in report.items() if not k.startswith("_")}
+    out["duplicate_clusters"] = [
+        {k: v for k, v in c.items() if not k.startswith("_")} for c in report["duplicate_clusters"]
+    ]
+    return out
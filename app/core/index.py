@@ -0,0 +1,983 @@
+"""
+فهرس الأمثلة المحسوب مسبقاً.
+يُبنى مرة واحدة عند تحميل الأمثلة، حتى لا يعيد كل طلب تطبيع المدوّنة الثابتة.
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import math
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from app.core.lsh import MinHashLSH
+from app.core.metrics import StageTimer
+from app.core.normalize import normalize_arabic, normalize_text, tokenize
+from app.core.prosody import ProsodyEngine, arud_bits, syllables_from_bits
+from app.core.similarity import (
+    _DEFAULT_WEIGHTS, DTW_BAND, BestMatch, TextFeatures, TfidfVectorizer,
+    dtw_envelope, jaccard_similarity, lb_keogh, lcs_length, pattern_similarity,
+    levenshtein_distance_bounded, levenshtein_ratio,
+    gestalt_ratio, weighted_score
+)
+from app.core.vectorized import HAVE_NUMPY, VectorEngine, np
+
+# عتبة التطابق شبه التام (levenshtein_ratio على الشكل المضغوط)
+NEAR_EXACT_RATIO = 0.95
+# أقصى فرق في الطول بين المدخل والمثال في البحث شبه التام
+NEAR_EXACT_LEN_DELTA = 2
+# عدد المرشحين الذين يمرون من مرحلة الحجب (blocking) إلى combined_similarity.
+# 0 أو None = بحث شامل على كل الأمثلة.
+DEFAULT_TOP_K = 150
+# كل كم مرشحاً نفحص المهلة (deadline)
+DEADLINE_CHECK_EVERY = 32
+# محرك المقاييس: "python" أو "numpy" أو "auto" (numpy إن كانت مثبتة)
+DEFAULT_ENGINE = "auto"
+
+
+_VERSIONS = itertools.count(1)
+
+
+def _norm(vec: Dict[str, float]) -> float:
+    return math.sqrt(sum(v * v for v in vec.values()))
+
+
+def _query_features(text: str) -> TextFeatures:
+    """خصائص الاستعلام على شكله المطبّع (deep=False) كالأمثلة، فالتشكيل والتطويل لا يغيّران الدرجة."""
+    return TextFeatures(normalize_arabic(text, deep=False))
+
+
+def _idf_offset(doc_count: int) -> float:
+    """الجزء المشترك بين كل الكلمات في idf = log(N) + 1 - log(1 + df)."""
+    return math.log(doc_count) + 1.0 if doc_count > 0 else 0.0
+
+
+class IndexedExample:
+    """مثال واحد مع كل أشكاله المطبّعة وخصائصه."""
+    __slots__ = (
+        "weight", "text", "light", "deep",
+        "compact_light", "compact_deep", "_features", "tfidf", "tfidf_norm",
+        "tfidf_gen", "syllables",
+    )
+
+    def __init__(self, weight: str, text: str, vectorizer: TfidfVectorizer):
+        self.weight = weight
+        self.text = text
+        normalized = normalize_text(text)
+        self.light = normalized.text
+        self.deep = normalize_arabic(text, deep=True)
+        self.compact_light = normalized.compact
+        self.compact_deep = self.deep.replace(' ', '')
+        # الخصائص (ومنها gestalt) على الشكل المطبّع، كما يُقاس الاستعلام
+        self._features: Optional[TextFeatures] = TextFeatures(self.light)
+        self.tfidf = vectorizer.vector(text)
+        self.tfidf_norm = _norm(self.tfidf)
+        # جيل idf الذي حُسب عليه المتجه (انظر CorpusIndex.entry_tfidf)
+        self.tfidf_gen = vectorizer.generation
+        self.syllables = syllables_from_bits(arud_bits(self.light))
+
+    @classmethod
+    def restore(
+        cls,
+        weight: str,
+        text: str,
+        light: str,
+        deep: str,
+        tfidf: Dict[str, float],
+        tfidf_norm: float,
+        syllables: str
+    ) -> "IndexedExample":
+        """مثال من قيم محفوظة (لقطة الفهرس)؛ الخصائص تُحسب عند أول استخدام."""
+        entry = cls.__new__(cls)
+        entry.weight = weight
+        entry.text = text
+        entry.light = light
+        entry.deep = deep
+        entry.compact_light = light.replace(' ', '')
+        entry.compact_deep = deep.replace(' ', '')
+        entry._features = None
+        entry.tfidf = tfidf
+        entry.tfidf_norm = tfidf_norm
+        entry.tfidf_gen = 0
+        entry.syllables = syllables
+        return entry
+
+    @property
+    def features(self) -> TextFeatures:
+        if self._features is None:
+            self._features = TextFeatures(self.light)
+        return self._features
+
+
+class RankedExample:
+    """مثال مرشح مع درجته المدمجة ودرجة كل مقياس."""
+    __slots__ = ("weight", "example", "score", "breakdown")
+
+    def __init__(self, weight: str, example: str, score: float, breakdown: Dict[str, float]):
+        self.weight = weight
+        self.example = example
+        self.score = score
+        self.breakdown = breakdown
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "weight": self.weight,
+            "example": self.example,
+            "similarity": round(self.score, 3),
+            "breakdown": {name: round(v, 3) for name, v in self.breakdown.items()},
+        }
+
+
+def _partition(text: str, parts: int) -> List[str]:
+    """تقسيم النص إلى parts قطعة متجاورة متقاربة الطول."""
+    n = len(text)
+    return [text[n * i // parts:n * (i + 1) // parts] for i in range(parts)]
+
+
+def _length_ratio(la: int, lb: int) -> float:
+    """حد أعلى لـ levenshtein_ratio من الطولين وحدهما (المسافة >= فرق الطولين)."""
+    if not la and not lb:
+        return 1.0
+    if not la or not lb:
+        return 0.0
+    return 1.0 - (abs(la - lb) / max(la, lb))
+
+
+def _sequence_bound(la: int, lb: int, matches: int) -> float:
+    """صيغة gestalt_ratio لعدد تطابقات matches؛ حد أعلى حين لا يقل عن التطابقات الفعلية (LCS مثلاً)."""
+    length = la + lb
+    if length:
+        return 2.0 * matches / length
+    return 1.0
+
+
+class CorpusIndex:
+    """
+    candidates: (weight_name, example_text)
+    weight_profiles: name -> combined_text (نصوص البناء الأولي)
+
+    add_example / remove_example تعدّل الفهرس في مكانه؛ على المستدعي منع
+    القراءة أثناء التعديل (meter يستخدم قفل قرّاء/كاتب). الأمثلة المحذوفة
+    تبقى أرقامها فارغة (None في entries وcandidates) حتى لا يتغير ترتيب المدوّنة.
+    """
+
+    def __init__(
+        self,
+        candidates: List[Tuple[str, str]],
+        weight_profiles: Dict[str, str],
+        top_k: Optional[int] = DEFAULT_TOP_K,
+        engine: str = DEFAULT_ENGINE,
+        use_syllabic: bool = False,
+        dtw_band: int = DTW_BAND,
+        lsh: Optional[Tuple[int, int]] = None
+    ):
+        self.candidates = candidates
+        # يتغير مع كل بناء/تعديل للفهرس (لإبطال الذاكرة المؤقتة)
+        self.version = next(_VERSIONS)
+        self.top_k = top_k
+        # مقياس المقاطع (DTW بشريط مع تقليم) ضمن combined_similarity
+        self.use_syllabic = use_syllabic
+        self.dtw_band = dtw_band
+        self.weight_profiles = weight_profiles
+        self.vectorizer = TfidfVectorizer([ex for _, ex in candidates])
+        self.entries = [IndexedExample(w, ex, self.vectorizer) for w, ex in candidates]
+        # ملف كل وزن: tf كلماته فقط، وidf يُضرب عند الاستعلام (يتغير مع كل تعديل)
+        idf = self.vectorizer.idf
+        self.profile_tf: Dict[str, Dict[str, float]] = {
+            w: {t: v for t, v in self.vectorizer.tf(profile).items() if t in idf}
+            for w, profile in weight_profiles.items()
+        }
+        # مجاميع طول كل ملف (انظر _profile_norm) وقيمة idf_offset التي حُسبت عليها
+        self._idf_base = _idf_offset(self.vectorizer.doc_count)
+        self._profile_stats = {w: self._stats(tf, 0.0) for w, tf in self.profile_tf.items()}
+
+        # فهرس التطابق التام: الشكل المضغوط -> أول مثال بهذا الشكل
+        self.exact_light: Dict[str, IndexedExample] = {}
+        self.exact_deep: Dict[str, IndexedExample] = {}
+        # دلاء حسب طول الشكل المضغوط -> أرقام الأمثلة بترتيبها الأصلي
+        self.light_buckets: Dict[int, List[int]] = defaultdict(list)
+        self.deep_buckets: Dict[int, List[int]] = defaultdict(list)
+        for i, entry in enumerate(self.entries):
+            self.exact_light.setdefault(entry.compact_light, entry)
+            self.exact_deep.setdefault(entry.compact_deep, entry)
+            self.light_buckets[len(entry.compact_light)].append(i)
+            self.deep_buckets[len(entry.compact_deep)].append(i)
+
+        # فهرس مقلوب: n-gram حرفي ثلاثي / كلمة -> أرقام الأمثلة
+        self.char3_postings: Dict[str, List[int]] = defaultdict(list)
+        self.word_postings: Dict[str, List[int]] = defaultdict(list)
+        for i, entry in enumerate(self.entries):
+            for g in entry.features.char3:
+                self.char3_postings[g].append(i)
+            for w in entry.features.words:
+                self.word_postings[w].append(i)
+        # أحجام المجموعات لكل مثال (لحساب Jaccard من عدد المشترك فقط)
+        self.char3_sizes: Sequence[int] = [len(e.features.char3) for e in self.entries]
+        self.word_sizes: Sequence[int] = [len(e.features.words) for e in self.entries]
+
+        # قوالب المقاطع العروضية لكل وزن (المرحلة الأولى السريعة)
+        self.prosody = ProsodyEngine()
+        for entry in self.entries:
+            self.prosody.add(entry.weight, entry.text, entry.syllables)
+
+        # وضع تقريبي اختياري: (bands, rows) لـ MinHash/LSH بدل مرحلة الحجب
+        self.lsh: Optional[MinHashLSH] = None
+        if lsh is not None:
+            self.lsh = MinHashLSH(*lsh)
+            self.lsh.add_many((i, e.features.char3) for i, e in enumerate(self.entries))
+
+        self.engine: Optional[VectorEngine] = None
+        if engine == "numpy" or (engine == "auto" and HAVE_NUMPY):
+            self.engine = VectorEngine([e.features for e in self.entries])
+        # لقطة الفهرس الثنائية إن حُمّل منها (snapshot.load_snapshot_index)
+        self.snapshot = None
+        # أرقام الأمثلة المحذوفة، وعدّادات كلمات كل وزن (تُحسب عند أول تعديل)
+        self.removed: Set[int] = set()
+        self._profile_counts: Optional[Dict[str, Counter]] = None
+        # (deep, الطول) -> نصوص الدلو متصلة بفاصل مع أرقامها (lookup_near_exact)
+        self._bucket_texts: Dict[Tuple[bool, int], Tuple[str, List[int]]] = {}
+
+    @classmethod
+    def restore(cls, **parts: Any) -> "CorpusIndex":
+        """
+        فهرس من أجزاء جاهزة (انظر snapshot.load_snapshot_index) دون إعادة
+        التطبيع أو بناء أي بنية: كل سمات __init__ تُمرَّر كما هي.
+        """
+        index = cls.__new__(cls)
+        index.version = next(_VERSIONS)
+        for name, value in parts.items():
+            setattr(index, name, value)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.entries) - len(self.removed)
+
+    def lookup_exact(self, compact: str, deep: bool = False, exclude: Optional[int] = None) -> Optional[IndexedExample]:
+        """
+        تطابق تام O(1) على الشكل المضغوط (بدون مسافات).
+        exclude: رقم مثال يُعامل كأنه محذوف (leave-one-out دون تعديل المدوّنة).
+        """
+        table = self.exact_deep if deep else self.exact_light
+        entry = table.get(compact)
+        if entry is None or exclude is None or entry is not self.entries[exclude]:
+            return entry
+        # المثال التالي بنفس الشكل، كما يحل محله في remove_example
+        attr = "compact_deep" if deep else "compact_light"
+        buckets = self.deep_buckets if deep else self.light_buckets
+        return next((self.entries[j] for j in buckets[len(compact)]
+                     if j != exclude and getattr(self.entries[j], attr) == compact), None)
+
+    def lookup_near_exact(self, compact: str, deep: bool = False, exclude: Optional[int] = None) -> Optional[IndexedExample]:
+        """
+        أول مثال (بترتيب المدوّنة) نسبة تشابهه > NEAR_EXACT_RATIO،
+        مع فحص دلاء الطول len±2 فقط ومسافة محدودة تتوقف مبكراً.
+
+        قبل المسافة: ترشيح الحمام (pigeonhole). نقسم الاستعلام إلى budget+1
+        قطعة؛ كل تعديل يمس قطعة واحدة على الأكثر، فإن كانت المسافة <= budget
+        بقيت قطعة سليمة وظهرت كما هي في المثال. نبحث عن القطع بـ str.find في
+        نص الدلو كله، فلا نمر في بايثون إلا على الأمثلة التي تحوي قطعة.
+        """
+        n = len(compact)
+        if not compact:
+            return None
+        found: Set[int] = set()
+        for length in range(max(0, n - NEAR_EXACT_LEN_DELTA), n + NEAR_EXACT_LEN_DELTA + 1):
+            bucket = self._bucket_text(length, deep)
+            if bucket is None:
+                continue
+            text, ids = bucket
+            # حد المسافة المسموح (تقدير أعلى، ثم نتحقق بنفس صيغة levenshtein_ratio)
+            budget = int(max(n, length) * (1.0 - NEAR_EXACT_RATIO)) + 1
+            for segment in _partition(compact, min(budget + 1, n)):
+                pos = text.find(segment)
+                while pos != -1:
+                    # كل مثال في الدلو بطول length + الفاصل
+                    found.add(ids[pos // (length + 1)])
+                    pos = text.find(segment, pos + 1)
+
+        found.discard(exclude)
+        for i in sorted(found):
+            entry = self.entries[i]
+            other = entry.compact_deep if deep else entry.compact_light
+            max_len = max(n, len(other))
+            budget = int(max_len * (1.0 - NEAR_EXACT_RATIO)) + 1
+            dist = levenshtein_distance_bounded(compact, other, budget)
+            if dist <= budget and 1.0 - (dist / max_len) > NEAR_EXACT_RATIO:
+                return entry
+        return None
+
+    def _bucket_text(self, length: int, deep: bool) -> Optional[Tuple[str, List[int]]]:
+        """أشكال دلو الطول مضغوطةً في نص واحد بفاصل (البحث بـ str.find)، مخزّنة حتى تعديل الدلو."""
+        key = (deep, length)
+        cached = self._bucket_texts.get(key)
+        if cached is not None:
+            return cached
+        buckets = self.deep_buckets if deep else self.light_buckets
+        ids = list(buckets.get(length, ()))
+        if not ids or not length:
+            return None
+        attr = "compact_deep" if deep else "compact_light"
+        # الفاصل ليس في أي شكل مطبّع، فلا تعبر قطعةٌ حدود مثالين
+        text = "\x00".join(getattr(self.entries[i], attr) for i in ids)
+        cached = self._bucket_texts[key] = (text, ids)
+        return cached
+
+    def profile_cosines(self, query_vec: Dict[str, float], exclude: Optional[int] = None) -> Dict[str, float]:
+        """
+        cosine بين متجه الاستعلام وملف كل وزن (tf × idf الحالي): ضرب نقطي
+        متناثر على كلمات الاستعلام فقط، والطول من مجاميع الملف.
+        exclude: الملفات وidf كأن هذا المثال محذوف (query_vec من idf_without).
+        """
+        q_norm = _norm(query_vec)
+        idf = self.vectorizer.idf
+        shift = self._idf_shift()
+        profiles = self.profile_tf
+        held: Optional[IndexedExample] = None
+        if exclude is not None:
+            held = self.entries[exclude]
+            held_words = set(tokenize(held.text))
+            before = {t: idf[t] - shift for t in held_words}
+            idf = self.vectorizer.idf_without(held.text)
+            shift = _idf_offset(self.vectorizer.doc_count - 1) - self._idf_base
+            counts = self._weight_counts()[held.weight] - Counter(tokenize(held.text))
+            total = sum(counts.values())
+            profiles = dict(profiles)
+            if total:
+                profiles[held.weight] = {t: c / total for t, c in counts.items() if t in idf}
+            else:
+                # كان المثال الوحيد لوزنه: لا ملف له
+                del profiles[held.weight]
+        weighted = [(t, val * idf[t]) for t, val in query_vec.items()]
+        cosines = {}
+        for w, tf in profiles.items():
+            if held is None:
+                p_norm = self._profile_norm(w, shift)
+            elif w == held.weight:
+                p_norm = math.sqrt(sum((v * idf[t]) ** 2 for t, v in tf.items()))
+            else:
+                # كما في _refresh_profiles: تصحيح كلمات المثال المحذوف فقط
+                sq = self._profile_norm(w, shift) ** 2
+                for t in held_words:
+                    v = tf.get(t)
+                    if v is not None and t in idf:
+                        sq += v * v * (idf[t] ** 2 - (before[t] + shift) ** 2)
+                p_norm = math.sqrt(max(0.0, sq))
+            if not q_norm or not p_norm:
+                cosines[w] = 0.0
+                continue
+            get = tf.get
+            dot = sum(val * get(t, 0.0) for t, val in weighted)
+            cosines[w] = dot / (q_norm * p_norm)
+        return cosines
+
+    def _idf_shift(self) -> float:
+        """تغيّر idf لكل الكلمات منذ حساب مجاميع الملفات (يتبع عدد الوثائق فقط)."""
+        return _idf_offset(self.vectorizer.doc_count) - self._idf_base
+
+    def _stats(self, tf: Dict[str, float], shift: float) -> List[float]:
+        """
+        [Σtf², Σtf²·s, Σtf²·s²] حيث s = idf - shift لا يتغير إلا بتغير df الكلمة،
+        فطول الملف عند أي shift لاحق يُحسب منها دون المرور على كلماته.
+        """
+        idf = self.vectorizer.idf
+        a = d1 = d2 = 0.0
+        for t, v in tf.items():
+            s = idf[t] - shift
+            v2 = v * v
+            a += v2
+            d1 += v2 * s
+            d2 += v2 * s * s
+        return [a, d1, d2]
+
+    def _profile_norm(self, weight: str, shift: float) -> float:
+        a, d1, d2 = self._profile_stats[weight]
+        return math.sqrt(max(0.0, d2 + 2.0 * shift * d1 + shift * shift * a))
+
+    def nearest_example(self, query_vec: Dict[str, float], weight: str, exclude: Optional[int] = None) -> str:
+        """
+        أقرب مثال فعلي (cosine TF-IDF) من أمثلة الوزن، عبر الفهرس المقلوب للكلمات.
+        إن لم يشارك أي مثال كلمة مع الاستعلام نعيد أول مثال للوزن.
+        """
+        # مع exclude: متجهات الأمثلة بـ idf دون المثال المستبعد (لا تُخزَّن)
+        idf = None if exclude is None else self.vectorizer.idf_without(self.entries[exclude].text)
+        vectors: Dict[int, Dict[str, float]] = {}
+        dots: Dict[int, float] = defaultdict(float)
+        for t, val in query_vec.items():
+            for i in self.word_postings.get(t, ()):
+                entry = self.entries[i]
+                if entry.weight == weight and i != exclude:
+                    if idf is None:
+                        vec = self.entry_tfidf(entry)
+                    else:
+                        vec = vectors.get(i)
+                        if vec is None:
+                            vec = vectors[i] = self.vectorizer.vector(entry.text, idf)
+                    dots[i] += val * vec.get(t, 0.0)
+        best_i = -1
+        best_cos = 0.0
+        for i in sorted(dots):
+            norm = self.entries[i].tfidf_norm if idf is None else _norm(vectors[i])
+            cos = dots[i] / norm if norm else 0.0
+            if cos > best_cos:
+                best_i, best_cos = i, cos
+        if best_i >= 0:
+            return self.entries[best_i].text
+        return next((e.text for i, e in enumerate(self.entries)
+                     if e is not None and e.weight == weight and i != exclude), "")
+
+    def entry_tfidf(self, entry: IndexedExample) -> Dict[str, float]:
+        """متجه TF-IDF للمثال، يُعاد حسابه إن تغيّر idf منذ حسابه (بعد تعديل المدوّنة)."""
+        generation = self.vectorizer.generation
+        if entry.tfidf_gen != generation:
+            tfidf = self.vectorizer.vector(entry.text)
+            entry.tfidf = tfidf
+            entry.tfidf_norm = _norm(tfidf)
+            entry.tfidf_gen = generation
+        return entry.tfidf
+
+    def syllabic_score(
+        self,
+        query: TextFeatures,
+        entry: IndexedExample,
+        sims: Dict[str, float],
+        best_score: float,
+        envelopes: Dict[int, Tuple[List[int], List[int]]]
+    ) -> float:
+        """
+        تشابه المقاطع لمرشح، أو 0.0 إن ثبت أنه لا يتجاوز best_score.
+        من باقي المقاييس نعرف أقل تشابه مقاطع يلزمه، أي أقصى مسافة DTW؛
+        نقارنها أولاً بحد LB_Keogh ثم نحسب DTW بشريط يتوقف عندها.
+        envelopes: أغلفة الاستعلام حسب طول المرشح (تُملأ أثناء البحث).
+        """
+        p = query.syllabic
+        q = entry.features.syllabic
+        if not p or not q:
+            return pattern_similarity(p, q)
+        w = _DEFAULT_WEIGHTS['syllabic']
+        total = w + sum(_DEFAULT_WEIGHTS.get(k, 0.0) for k in sims)
+        partial = sum(v * _DEFAULT_WEIGHTS.get(k, 0.0) for k, v in sims.items())
+        needed = (best_score * total - partial) / w
+        if needed > 1.0:
+            return 0.0
+        cutoff = None
+        if needed > 0.0:
+            # s = 1/(1+d) > needed  <=>  d < 1/needed - 1 (مع هامش للتقريب)
+            cutoff = 1.0 / needed - 1.0 + 1e-9
+            envelope = envelopes.get(len(q))
+            if envelope is None:
+                envelope = envelopes[len(q)] = dtw_envelope(p, len(q), self.dtw_band)
+            if lb_keogh(q, envelope) > cutoff * max(len(p), len(q)):
+                return 0.0
+        return pattern_similarity(p, q, self.dtw_band, cutoff)
+
+    def _rank(
+        self,
+        query: TextFeatures,
+        ids: Iterable[int],
+        jaccards: Optional[Dict[str, "np.ndarray"]],
+        k: int,
+        per_weight: bool = False,
+        deadline: Optional[float] = None,
+        timer: Optional[StageTimer] = None,
+        exclude: Optional[int] = None
+    ) -> Tuple[List[RankedExample], Dict[str, RankedExample], bool]:
+        """
+        أفضل k مرشحاً بترتيب (الدرجة تنازلياً، الرقم تصاعدياً)، وأفضل مرشح لكل
+        وزن إن طُلب، وهل انتهت المهلة. درجة صفر لا تُحسب تطابقاً.
+
+        الحدود العليا متدرجة الكلفة: Jaccard (دقيق ورخيص) مع حدود الطول
+        لـ levenshtein وgestalt، ثم levenshtein الدقيق مع حد LCS لـ gestalt،
+        ثم gestalt (الأغلى) والمقاطع. المرشحون مرتبون بالحد الأول، فنتوقف
+        حين يقل عن أدنى النتائج المحفوظة، ويُترك كل مرشح لا يبلغه حده التالي.
+        """
+        text = query.text
+        la = len(text)
+        bounds = []
+        for i in ids:
+            entry = self.entries[i]
+            if entry is None or i == exclude:
+                continue
+            lb = len(entry.light)
+            if jaccards is None:
+                features = entry.features
+                jw = jaccard_similarity(query.words, features.words)
+                j3 = jaccard_similarity(query.char3, features.char3)
+                jw2 = jaccard_similarity(query.word2, features.word2)
+            else:
+                jw = float(jaccards['jaccard_words'][0, i])
+                j3 = float(jaccards['jaccard_char3'][0, i])
+                jw2 = float(jaccards['jaccard_word2'][0, i])
+            # نفس ترتيب مفاتيح similarity_breakdown (فالدرجة تُجمع بالترتيب نفسه)
+            sims = {
+                'levenshtein': _length_ratio(la, lb),
+                'jaccard_words': jw,
+                'jaccard_char3': j3,
+                'jaccard_word2': jw2,
+                'sequence': _sequence_bound(la, lb, min(la, lb)),
+            }
+            bound = weighted_score(dict(sims, syllabic=1.0) if self.use_syllabic else sims)
+            if bound > 0.0:
+                bounds.append((bound, i, sims))
+        bounds.sort(key=lambda b: (-b[0], b[1]))
+
+        heap: List[Tuple[float, int, int]] = []   # (score, -i, i) أصغرها في الرأس
+        by_weight: Dict[str, Tuple[float, int]] = {}
+        scored: Dict[int, Tuple[float, Dict[str, float]]] = {}
+        envelopes: Dict[int, Tuple[List[int], List[int]]] = {}
+        partial = False
+        full = 0
+        for n, (bound, i, sims) in enumerate(bounds):
+            if deadline is not None and n % DEADLINE_CHECK_EVERY == 0 and time.time() > deadline:
+                partial = True
+                break
+            entry = self.entries[i]
+            floor = heap[0][0] if k and len(heap) >= k else (0.0 if k else float("inf"))
+            if bound < floor and not per_weight:
+                break
+            if per_weight:
+                current = by_weight.get(entry.weight)
+                floor = min(floor, current[0] if current is not None else 0.0)
+                if bound < floor:
+                    continue
+
+            other = entry.light
+            sims['levenshtein'] = levenshtein_ratio(text, other)
+            sims['sequence'] = _sequence_bound(la, len(other), lcs_length(text, other))
+            if weighted_score(dict(sims, syllabic=1.0) if self.use_syllabic else sims) < floor:
+                continue
+            sims['sequence'] = gestalt_ratio(text, other, entry.features.b2j)
+            full += 1
+            if self.use_syllabic:
+                sims['syllabic'] = self.syllabic_score(query, entry, sims, floor, envelopes)
+            score = weighted_score(sims)
+            if score <= 0.0:
+                continue
+
+            kept = False
+            if k and (len(heap) < k or (score, -i) > heap[0][:2]):
+                if len(heap) >= k:
+                    heapq.heapreplace(heap, (score, -i, i))
+                else:
+                    heapq.heappush(heap, (score, -i, i))
+                kept = True
+            if per_weight:
+                current = by_weight.get(entry.weight)
+                if current is None or score > current[0] or (score == current[0] and i < current[1]):
+                    by_weight[entry.weight] = (score, i)
+                    kept = True
+            if kept:
+                scored[i] = (score, sims)
+
+        if timer is not None:
+            timer.count("scored", full)
+        top = [self._ranked(i, *scored[i]) for _, _, i in sorted(heap, key=lambda h: (-h[0], h[2]))]
+        best = {w: self._ranked(i, *scored[i]) for w, (_, i) in sorted(by_weight.items(), key=lambda b: (-b[1][0], b[1][1]))}
+        return top, best, partial
+
+    def _ranked(self, i: int, score: float, sims: Dict[str, float]) -> RankedExample:
+        entry = self.entries[i]
+        return RankedExample(entry.weight, entry.text, score, sims)
+
+    def block_candidates(
+        self,
+        query: TextFeatures,
+        top_k: int,
+        jaccards: Optional[Dict[str, "np.ndarray"]] = None,
+        exclude: Optional[int] = None
+    ) -> List[int]:
+        """
+        مرحلة الحجب: نعدّ الـ n-grams والكلمات المشتركة عبر الفهرس المقلوب،
+        ونحسب منها Jaccard الحرفي وJaccard الكلمات بدقة، ثم نرجع أفضل top_k
+        مثالاً (بترتيب المدوّنة) ليُحسب لهم combined_similarity الكامل.
+        jaccards: نتيجة VectorEngine.jaccards إن وُجدت (نفس القيم بدون postings).
+        """
+        if jaccards is not None:
+            scores_arr = 0.20 * jaccards['jaccard_char3'][0] + 0.15 * jaccards['jaccard_words'][0]
+            if self.removed:
+                scores_arr[list(self.removed)] = 0.0
+            if exclude is not None:
+                scores_arr[exclude] = 0.0
+            ids_arr = np.flatnonzero(scores_arr > 0)
+            # ترتيب تنازلي حسب الدرجة ثم تصاعدي حسب الرقم (نفس المسار البايثوني)
+            order = np.lexsort((ids_arr, -scores_arr[ids_arr]))[:top_k]
+            return sorted(ids_arr[order].tolist())
+
+        char3_shared: Dict[int, int] = defaultdict(int)
+        for g in query.char3:
+            for i in self.char3_postings.get(g, ()):
+                char3_shared[i] += 1
+        word_shared: Dict[int, int] = defaultdict(int)
+        for w in query.words:
+            for i in self.word_postings.get(w, ()):
+                word_shared[i] += 1
+
+        n3 = len(query.char3)
+        nw = len(query.words)
+        scores: Dict[int, float] = {}
+        char3_sizes = self.char3_sizes
+        word_sizes = self.word_sizes
+        for i, c in char3_shared.items():
+            scores[i] = 0.20 * (c / (n3 + char3_sizes[i] - c))
+        for i, c in word_shared.items():
+            scores[i] = scores.get(i, 0.0) + 0.15 * (c / (nw + word_sizes[i] - c))
+        scores.pop(exclude, None)
+
+        best_ids = heapq.nlargest(top_k, scores, key=lambda i: (scores[i], -i))
+        best_ids.sort()
+        return best_ids
+
+    def _candidates(
+        self,
+        query: TextFeatures,
+        top_k: Optional[int] = None,
+        exclude: Optional[int] = None
+    ) -> Tuple[Sequence[int], Optional[Dict[str, "np.ndarray"]]]:
+        """
+        أرقام المرشحين بعد LSH/الحجب (أو كل المدوّنة)، ومقاييس VectorEngine إن حُسبت.
+        exclude: مثال لا يُرشَّح (يُعامل كالمحذوف).
+        """
+        if top_k is None:
+            top_k = self.top_k
+        ids: Sequence[int] = range(len(self.entries))
+        blocking = bool(top_k) and top_k < len(self)
+        # مع LSH لا نحسب المقاييس المتجهية على كل المدوّنة
+        jaccards = None
+        if self.engine is not None and not (blocking and self.lsh is not None):
+            jaccards = self.engine.jaccards([query])
+        if blocking:
+            # LSH إن فُعّل، ثم الحجب بالفهرس المقلوب، ثم (بلا أي n-gram مشترك) البحث الشامل
+            lsh_ids = None
+            if self.lsh is not None:
+                lsh_ids = [i for i in self.lsh.candidates(query.char3, top_k)
+                           if i not in self.removed and i != exclude]
+            ids = lsh_ids or self.block_candidates(query, top_k, jaccards, exclude) or ids
+        return ids, jaccards
+
+    def rank_matches(
+        self,
+        text: str,
+        k: int = 5,
+        per_weight: bool = False,
+        top_k: Optional[int] = None,
+        deadline: Optional[float] = None
+    ) -> Tuple[List[RankedExample], Dict[str, RankedExample], bool]:
+        """
+        أفضل k مثالاً للبيت، وأفضل مثال لكل وزن (per_weight)، مع درجة كل مقياس.
+        المرشحون من مرحلة الحجب نفسها (لا تقل عن k)؛ الثالث: هل انتهت المهلة.
+        أفضل مثال لكل وزن من كل أمثلته (لا من قائمة الحجب وحدها، فقد لا يبلغها
+        الوزن أو أفضل أمثلته)؛ الوزن الغائب عنها درجته صفر مع كل أمثلته.
+        """
+        if top_k is None:
+            top_k = self.top_k
+        if top_k:
+            top_k = max(top_k, k)
+        query = _query_features(text)
+        ids, jaccards = self._candidates(query, top_k)
+        everything = len(ids) == len(self.entries)
+        top, best, partial = self._rank(query, ids, jaccards, k, per_weight and everything, deadline)
+        if per_weight and not everything and not partial:
+            _, best, partial = self._rank(query, range(len(self.entries)), jaccards, 0, True, deadline)
+        return top, best, partial
+
+    def find_best_match(
+        self,
+        text: str,
+        top_k: Optional[int] = None,
+        deadline: Optional[float] = None,
+        timer: Optional[StageTimer] = None,
+        exclude: Optional[int] = None
+    ) -> BestMatch:
+        """
+        مثل similarity.find_best_match لكن العمل على المدخل فقط.
+        top_k: عدد المرشحين بعد الحجب أو LSH (None = قيمة الفهرس، 0 = بحث شامل).
+        deadline: وقت (time.time) نتوقف بعده عن فحص المرشحين ونعيد
+        أفضل نتيجة حتى الآن مع partial=True.
+        timer: أزمنة المراحل (blocking / examples / syllabic / profile) وعدد المرشحين.
+        exclude: رقم مثال يُعامل كأنه محذوف في المرشحين والملفات وidf (leave-one-out).
+        """
+        best = BestMatch(score=0.0, example="", weight="", method="")
+        query = _query_features(text)
+        if timer is not None:
+            timer.mark("features")
+
+        ids, jaccards = self._candidates(query, top_k, exclude)
+        if timer is not None:
+            timer.mark("blocking")
+            timer.count("candidates", len(ids))
+
+        # 1. مقارنة مع الأمثلة المرشحة: أفضلها فقط، بالحدود العليا (انظر _rank)
+        top, _, best.partial = self._rank(query, ids, jaccards, 1, deadline=deadline, timer=timer, exclude=exclude)
+        if top:
+            best.score = top[0].score
+            best.example = top[0].example
+            best.weight = top[0].weight
+            best.method = "example_similarity"
+        if timer is not None:
+            timer.mark("examples")
+
+        # 2. مقارنة TF-IDF مع ملف كل وزن
+        if self.profile_tf and best.score < 0.9:
+            idf = None if exclude is None else self.vectorizer.idf_without(self.entries[exclude].text)
+            query_vec = self.vectorizer.vector(text, idf)
+            cosines = self.profile_cosines(query_vec, exclude)
+            tfidf_weight = ""
+            for w, sim in cosines.items():
+                if sim * 1.1 > best.score:
+                    best.score = sim * 1.1
+                    tfidf_weight = w
+            if tfidf_weight:
+                best.example = self.nearest_example(query_vec, tfidf_weight, exclude)
+                best.weight = tfidf_weight
+                best.method = "weight_tfidf"
+            if timer is not None:
+                timer.mark("profile")
+
+        return best
+
+    # -------------------------------------------------------------
+    # تعديل المدوّنة في مكانها (بلا إعادة بناء)
+    # -------------------------------------------------------------
+
+    def find_example(self, weight: str, text: str) -> Optional[int]:
+        """رقم المثال (weight, text) إن وُجد؛ البحث في دلو طوله فقط."""
+        compact = normalize_text(text).compact
+        for i in self.light_buckets.get(len(compact), ()):
+            entry = self.entries[i]
+            if entry.text == text and entry.weight == weight:
+                return i
+        return None
+
+    def example_score(self, text: str, weight: str, example: str) -> float:
+        """درجة combined_similarity بين البيت ومثال بعينه (صفر إن لم يوجد)."""
+        i = self.find_example(weight, example)
+        if i is None:
+            return 0.0
+        top, _, _ = self._rank(_query_features(text), [i], None, 1)
+        return top[0].score if top else 0.0
+
+    def add_example(self, weight: str, text: str) -> IndexedExample:
+        """
+        إضافة مثال في آخر المدوّنة: القواميس والدلاء والفهارس المقلوبة و df
+        وصفوف VectorEngine تتحدث بكلفة المثال وحده، وملف وزنه بكلفة مفرداته.
+        """
+        self._weight_counts()
+        before = self._idf_points(text)
+        self.vectorizer.add_document(text)
+        entry = IndexedExample(weight, text, self.vectorizer)
+        i = len(self.entries)
+        self.entries.append(entry)
+        self.candidates.append((weight, text))
+
+        self.exact_light.setdefault(entry.compact_light, entry)
+        self.exact_deep.setdefault(entry.compact_deep, entry)
+        self.light_buckets[len(entry.compact_light)].append(i)
+        self.deep_buckets[len(entry.compact_deep)].append(i)
+        self._bucket_texts.pop((False, len(entry.compact_light)), None)
+        self._bucket_texts.pop((True, len(entry.compact_deep)), None)
+        for g in entry.features.char3:
+            self.char3_postings[g].append(i)
+        for w in entry.features.words:
+            self.word_postings[w].append(i)
+        self.char3_sizes.append(len(entry.features.char3))
+        self.word_sizes.append(len(entry.features.words))
+
+        self.prosody.add(weight, text, entry.syllables)
+        if self.lsh is not None:
+            # تحت قفل الكتابة (لا يجمّد الاستعلام الجداول بين القرّاء)؛
+            # المثال الواحد يُدرج في موضعه دون إعادة ترتيب
+            self.lsh.add(i, entry.features.char3)
+            self.lsh.freeze()
+        if self.engine is not None:
+            self.engine.add(entry.features)
+
+        self._profile_counts.setdefault(weight, Counter()).update(tokenize(text))
+        self._refresh_profiles(weight, before)
+        self.version = next(_VERSIONS)
+        return entry
+
+    def remove_example(self, weight: str, text: str) -> bool:
+        """
+        حذف مثال: يبقى رقمه فارغاً، ويحل محله في جداول التطابق التام أول
+        مثال تالٍ بنفس الشكل المضغوط. False إن لم يوجد.
+        """
+        i = self.find_example(weight, text)
+        if i is None:
+            return False
+        self._weight_counts()
+        entry = self.entries[i]
+        before = self._idf_points(text)
+        self.vectorizer.remove_document(text)
+        self.entries[i] = None
+        self.candidates[i] = None
+        self.removed.add(i)
+
+        for table, buckets, attr in (
+            (self.exact_light, self.light_buckets, "compact_light"),
+            (self.exact_deep, self.deep_buckets, "compact_deep"),
+        ):
+            compact = getattr(entry, attr)
+            bucket = buckets[len(compact)]
+            bucket.remove(i)
+            self._bucket_texts.pop((attr == "compact_deep", len(compact)), None)
+            if not bucket:
+                del buckets[len(compact)]
+            if table.get(compact) is entry:
+                nxt = next((self.entries[j] for j in bucket if getattr(self.entries[j], attr) == compact), None)
+                if nxt is None:
+                    del table[compact]
+                else:
+                    table[compact] = nxt
+        for postings, keys in ((self.char3_postings, entry.features.char3),
+                               (self.word_postings, entry.features.words)):
+            for key in keys:
+                ids = postings[key]
+                ids.remove(i)
+                if not ids:
+                    del postings[key]
+        self.char3_sizes[i] = 0
+        self.word_sizes[i] = 0
+
+        same_weight = [e for e in self.entries if e is not None and e.weight == weight]
+        replacement = next((e.text for e in same_weight if e.syllables == entry.syllables), None)
+        self.prosody.remove(weight, text, entry.syllables, replacement)
+        # LSH وVectorEngine: لا حذف من الجداول، الأرقام المحذوفة تُستبعد عند الاستعلام
+
+        counts = self._profile_counts[weight]
+        counts.subtract(tokenize(text))
+        for w in [w for w, c in counts.items() if c <= 0]:
+            del counts[w]
+        if not same_weight:
+            # وزن بلا أمثلة لا ملف له (كما في _build_weight_profiles)
+            del self._profile_counts[weight]
+        self._refresh_profiles(weight, before)
+        self.version = next(_VERSIONS)
+        return True
+
+    def _weight_counts(self) -> Dict[str, Counter]:
+        """عدد كل كلمة في أمثلة كل وزن (= tf ملف الوزن قبل القسمة على الطول)."""
+        if self._profile_counts is None:
+            counts: Dict[str, Counter] = {}
+            for entry in self.entries:
+                if entry is not None:
+                    counts.setdefault(entry.weight, Counter()).update(tokenize(entry.text))
+            self._profile_counts = counts
+        return self._profile_counts
+
+    def _idf_points(self, text: str) -> Dict[str, float]:
+        """s = idf - shift لكلمات النص قبل تعديل df (لتصحيح مجاميع الملفات)."""
+        idf = self.vectorizer.idf
+        shift = self._idf_shift()
+        return {t: idf[t] - shift for t in set(tokenize(text)) if t in idf}
+
+    def _refresh_profiles(self, weight: str, before: Dict[str, float]) -> None:
+        """
+        بعد إضافة/حذف مثال من weight: ملفه يُعاد من عدّاداته، وفي بقية الملفات
+        تُصحَّح المجاميع للكلمات التي تغيّر df لها فقط (before: قيمها السابقة).
+        تغيّر عدد الوثائق يزيح idf كل الكلمات بالقدر نفسه فتكفيه _idf_shift.
+        """
+        idf = self.vectorizer.idf
+        shift = self._idf_shift()
+        stale = {weight}
+        for w, tf in self.profile_tf.items():
+            if w == weight:
+                continue
+            stats = self._profile_stats[w]
+            for t, old in before.items():
+                v = tf.get(t)
+                if v is None:
+                    continue
+                if t not in idf:
+                    # كلمة لم تعد في المدوّنة: الملف يُعاد من عدّاداته
+                    stale.add(w)
+                    break
+                new = idf[t] - shift
+                v2 = v * v
+                stats[1] += v2 * (new - old)
+                stats[2] += v2 * (new * new - old * old)
+        for w in stale:
+            counts = self._profile_counts.get(w)
+            if counts is None:
+                self.profile_tf.pop(w, None)
+                self._profile_stats.pop(w, None)
+                continue
+            total = sum(counts.values())
+            tf = {t: c / total for t, c in counts.items() if t in idf} if total else {}
+            self.profile_tf[w] = tf
+            self._profile_stats[w] = self._stats(tf, shift)
+
+
+def blocking_recall(index: CorpusIndex, queries: List[str], top_k_values: Iterable[int]) -> List[Dict[str, float]]:
+    """
+    لكل قيمة top_k: نسبة الاستعلامات التي يعطي فيها البحث مع الحجب
+    نفس نتيجة البحث الشامل (نفس المثال، ونفس الوزن).
+    """
+    exhaustive = [index.find_best_match(q, top_k=0) for q in queries]
+    total = len(queries) or 1
+    reports = []
+    for top_k in top_k_values:
+        same_example = 0
+        same_weight = 0
+        for q, full in zip(queries, exhaustive):
+            blocked = index.find_best_match(q, top_k=top_k)
+            if blocked.weight == full.weight:
+                same_weight += 1
+                if blocked.example == full.example:
+                    same_example += 1
+        reports.append({
+            "queries": len(queries),
+            "top_k": top_k,
+            "recall_example": same_example / total,
+            "recall_weight": same_weight / total,
+        })
+    return reports
+
+
+def lsh_recall(
+    index: CorpusIndex,
+    queries: List[str],
+    configs: Iterable[Tuple[int, int]]
+) -> List[Dict[str, float]]:
+    """
+    لكل (bands, rows): recall@1 للوضع التقريبي مقارنة بالبحث الشامل، مع
+    متوسط عدد المرشحين وزمن الاستعلام وحجم جداول LSH لكل مثال.
+    يستبدل index.lsh مؤقتاً ثم يعيده.
+    """
+    exhaustive = [index.find_best_match(q, top_k=0) for q in queries]
+    query_grams = [TextFeatures(q).char3 for q in queries]
+    total = len(queries) or 1
+    saved = index.lsh
+    reports = []
+    try:
+        for bands, rows in configs:
+            index.lsh = MinHashLSH(bands, rows)
+            index.lsh.add_many(
+                (i, e.features.char3) for i, e in enumerate(index.entries) if e is not None
+            )
+            same_example = same_weight = 0
+            candidates = 0
+            started = time.perf_counter()
+            for q, full in zip(queries, exhaustive):
+                approx = index.find_best_match(q)
+                if approx.weight == full.weight:
+                    same_weight += 1
+                    if approx.example == full.example:
+                        same_example += 1
+            elapsed = time.perf_counter() - started
+            for grams in query_grams:
+                candidates += len(index.lsh.candidates(grams, index.top_k))
+            reports.append({
+                "queries": len(queries),
+                "bands": bands,
+                "rows": rows,
+                "threshold": round(index.lsh.threshold(), 3),
+                "recall_at_1": same_example / total,
+                "recall_weight": same_weight / total,
+                "avg_candidates": candidates / total,
+                "avg_query_ms": 1000 * elapsed / total,
+                "bytes_per_example": index.lsh.nbytes() / max(1, len(index)),
+            })
+    finally:
+        index.lsh = saved
+    return reports
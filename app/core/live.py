@@ -0,0 +1,129 @@
+"""
+تحليل مبدئي أثناء الكتابة (WebSocket /api/live).
+
+كل اتصال يحتفظ بجلسة: مجموعات n-grams والكلمات للنص السابق، وعدد ما
+يشاركه كل مثال منها (من الفهرس المقلوب). مع كل ضغطة مفتاح تتغير بضعة
+n-grams فقط، فنحدّث العدّادات بفروقها بدل إعادة مرحلة الحجب كاملة، ثم
+نرتب قائمة المرشحين القصيرة بـ CorpusIndex._rank (حدود عليا، بلا بحث شامل).
+النتيجة تقريبية: لا تطابق شبه تام ولا مرحلة عروضية ولا TF-IDF، وهذه كلها
+في التحليل الكامل (final). النص يُطبَّع كما في analyze_poem_line (مفتاح
+الذاكرة المؤقتة نفسه)، فالمقاييس تُحسب على الشكل الذي يقيسه التحليل الكامل.
+"""
+
+from __future__ import annotations
+
+import heapq
+import os
+from collections import defaultdict
+from typing import Any, Dict, FrozenSet, List, Optional
+
+from app.core.index import CorpusIndex, _query_features
+from app.core.meter import _INDEX_LOCK, _load_index
+from app.core.normalize import normalize_arabic
+from app.core.similarity import TextFeatures
+
+# عدد الأوزان المرشحة في كل رد مبدئي
+LIVE_WEIGHTS = int(os.environ.get("METER_LIVE_WEIGHTS", "3"))
+# أقصى طول للنص في التحليل المبدئي
+LIVE_MAX_CHARS = int(os.environ.get("METER_LIVE_MAX_CHARS", "300"))
+# نفس عتبة التطابق في analyze_poem_line
+_MATCH_THRESHOLD = 0.3
+
+
+class LiveSession:
+    """حالة جلسة كتابة واحدة؛ update تُستدعى تتابعياً (لا تزامن داخل الجلسة)."""
+
+    def __init__(self):
+        self.index: Optional[CorpusIndex] = None
+        self.version = None
+        self._reset(None)
+
+    def _reset(self, index: Optional[CorpusIndex]) -> None:
+        self.index = index
+        self.version = index.version if index is not None else None
+        self.char3: FrozenSet[str] = frozenset()
+        self.words: FrozenSet[str] = frozenset()
+        # رقم المثال -> عدد الـ n-grams / الكلمات المشتركة مع النص الحالي
+        self.char3_shared: Dict[int, int] = defaultdict(int)
+        self.word_shared: Dict[int, int] = defaultdict(int)
+
+    @staticmethod
+    def _shift(
+        shared: Dict[int, int],
+        old: FrozenSet[str],
+        new: FrozenSet[str],
+        postings: Any
+    ) -> None:
+        for g in old - new:
+            for i in postings.get(g, ()):
+                shared[i] -= 1
+                if not shared[i]:
+                    del shared[i]
+        for g in new - old:
+            for i in postings.get(g, ()):
+                shared[i] += 1
+
+    def _shortlist(self, query: TextFeatures, top_k: int) -> List[int]:
+        """نفس نتيجة CorpusIndex.block_candidates لكن من العدّادات المحفوظة."""
+        index = self.index
+        n3 = len(query.char3)
+        nw = len(query.words)
+        scores: Dict[int, float] = {}
+        for i, c in self.char3_shared.items():
+            scores[i] = 0.20 * (c / (n3 + index.char3_sizes[i] - c))
+        for i, c in self.word_shared.items():
+            scores[i] = scores.get(i, 0.0) + 0.15 * (c / (nw + index.word_sizes[i] - c))
+        if not top_k:
+            return sorted(scores)
+        best_ids = heapq.nlargest(top_k, scores, key=lambda i: (scores[i], -i))
+        best_ids.sort()
+        return best_ids
+
+    def update(self, text: str) -> Dict[str, Any]:
+        """تخمين مبدئي للنص الجديد (عادةً النص السابق مع حرف زائد أو ناقص)."""
+        if len(text) > LIVE_MAX_CHARS:
+            return {
+                "ok": False,
+                "error": "too_long",
+                "message": f"التحليل أثناء الكتابة لأول {LIVE_MAX_CHARS} حرف فقط؛ اضغط تحليل الوزن."
+            }
+        with _INDEX_LOCK.reading():
+            index = _load_index()
+            if index is not self.index or index.version != self.version:
+                # فهرس جديد أو معدّل: أرقام الأمثلة تغيّرت
+                self._reset(index)
+            normalized = normalize_arabic(text, deep=False)
+            query = _query_features(text)
+            self._shift(self.char3_shared, self.char3, query.char3, index.char3_postings)
+            self._shift(self.word_shared, self.words, query.words, index.word_postings)
+            self.char3, self.words = query.char3, query.words
+
+            # نفس مفتاح المرحلة الأولى في _exact_match
+            entry = index.lookup_exact(normalized.replace(' ', ''))
+            if entry is not None:
+                return _guess(text, normalized, entry.weight, 1.0, entry.text, "exact_match", [])
+            ids = self._shortlist(query, index.top_k)
+            _, by_weight, _ = index._rank(query, ids, None, 0, per_weight=True)
+
+        ranked = list(by_weight.values())
+        if not ranked:
+            return _guess(text, normalized, "", 0.0, "", "", [])
+        best = ranked[0]
+        others = [{"weight": m.weight, "similarity": round(m.score, 3)} for m in ranked[:LIVE_WEIGHTS]]
+        return _guess(text, normalized, best.weight, best.score, best.example, "example_similarity", others)
+
+
+def _guess(text: str, normalized: str, weight: str, score: float, example: str, method: str,
+           weights: List[Dict[str, Any]]) -> Dict[str, Any]:
+    result: Dict[str, Any] = {
+        "ok": True,
+        "provisional": True,
+        "input": text,
+        "normalized": normalized,
+        "matched": score >= _MATCH_THRESHOLD,
+        "similarity": round(score, 3),
+        "weights": weights,
+    }
+    if result["matched"]:
+        result.update(weight=weight, closest_example=example, method=method)
+    return result
@@ -0,0 +1,154 @@
+"""
+بحث تقريبي عن أقرب جار بـ MinHash/LSH على مجموعات n-grams الحرفية الثلاثية.
+لكل مثال توقيع MinHash من bands × rows دالة، يُقسَّم إلى bands شريحة، وكل
+شريحة تُختزل إلى مفتاح واحد. مثالان يتشاركان مفتاح شريحة واحدة على الأقل
+يصبحان مرشحين، واحتمال ذلك يرتفع بحدة حول Jaccard ≈ (1/bands)^(1/rows).
+
+التخزين مسطّح لتكفي الذاكرة ملايين الأبيات: لكل شريحة مصفوفتان مرتبتان
+(المفتاح، رقم المثال)، أي 12 بايت لكل مثال لكل شريحة، ولا تُحفظ التواقيع.
+"""
+
+from __future__ import annotations
+
+import random
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from typing import AbstractSet, Iterable, List, Optional, Sequence, Tuple
+
+from app.core.vectorized import HAVE_NUMPY, np
+
+# عدد الشرائح وعدد الصفوف في كل شريحة (طول التوقيع = bands × rows)
+DEFAULT_BANDS = 32
+DEFAULT_ROWS = 2
+DEFAULT_SEED = 1
+
+# عدد أولي (2^31 - 1): a·h + b يبقى أقل من 2^63 فتتطابق نتائج NumPy وبايثون
+_PRIME = (1 << 31) - 1
+# freeze يدرج المفاتيح المعلّقة في مواضعها ما دامت أقل من 1/هذا من الشريحة
+_INSERT_FRACTION = 64
+
+
+def gram_hash(gram: str) -> int:
+    # crc32 ثابت بين العمليات (بخلاف hash() للنصوص)
+    return zlib.crc32(gram.encode("utf-8")) % _PRIME
+
+
+class MinHasher:
+    """num_perm دالة تجزئة (a·x + b) mod p، والتوقيع = أصغر قيمة لكل دالة."""
+
+    def __init__(self, num_perm: int, seed: int = DEFAULT_SEED):
+        rnd = random.Random(seed)
+        self.num_perm = num_perm
+        self.params = [(rnd.randrange(1, _PRIME), rnd.randrange(0, _PRIME)) for _ in range(num_perm)]
+        if HAVE_NUMPY:
+            self._a = np.asarray([a for a, _ in self.params], dtype=np.int64)[:, None]
+            self._b = np.asarray([b for _, b in self.params], dtype=np.int64)[:, None]
+
+    def signature(self, grams: AbstractSet[str]) -> Optional[Tuple[int, ...]]:
+        """توقيع المجموعة، أو None إن كانت فارغة (نص أقصر من 3 أحرف)."""
+        return self.signature_hashes([gram_hash(g) for g in grams])
+
+    def signature_hashes(self, hashes: Sequence[int]) -> Optional[Tuple[int, ...]]:
+        """مثل signature لكن على قيم gram_hash محسوبة مسبقاً."""
+        if not len(hashes):
+            return None
+        if HAVE_NUMPY:
+            h = np.asarray(hashes, dtype=np.int64)[None, :]
+            return tuple(((self._a * h + self._b) % _PRIME).min(axis=1).tolist())
+        return tuple(min((a * x + b) % _PRIME for x in hashes) for a, b in self.params)
+
+
+class MinHashLSH:
+    """
+    جداول LSH مسطّحة. add يجمّع المفاتيح، وfreeze يرتّبها في مصفوفات
+    (يُستدعى تلقائياً عند أول استعلام بعد الإضافة).
+    """
+
+    def __init__(self, bands: int = DEFAULT_BANDS, rows: int = DEFAULT_ROWS, seed: int = DEFAULT_SEED):
+        if bands <= 0 or rows <= 0:
+            raise ValueError("bands و rows يجب أن تكون موجبة.")
+        self.bands = bands
+        self.rows = rows
+        self.hasher = MinHasher(bands * rows, seed)
+        self.size = 0
+        self._keys: List[array] = [array("q") for _ in range(bands)]
+        self._ids: List[array] = [array("i") for _ in range(bands)]
+        self._pending: List[List[Tuple[int, int]]] = [[] for _ in range(bands)]
+
+    def _band_keys(self, signature: Tuple[int, ...]) -> List[int]:
+        r = self.rows
+        # hash لصف أعداد صحيحة ثابت بين العمليات
+        return [hash(signature[b * r:(b + 1) * r]) for b in range(self.bands)]
+
+    def add(self, i: int, grams: AbstractSet[str]) -> None:
+        """إضافة المثال رقم i (المجموعات الفارغة لا تدخل الجداول)."""
+        self.add_hashes(i, [gram_hash(g) for g in grams])
+
+    def add_hashes(self, i: int, hashes: Sequence[int]) -> None:
+        self.size += 1
+        signature = self.hasher.signature_hashes(hashes)
+        if signature is None:
+            return
+        for band, key in enumerate(self._band_keys(signature)):
+            self._pending[band].append((key, i))
+
+    def add_many(self, items: Iterable[Tuple[int, AbstractSet[str]]]) -> None:
+        for i, grams in items:
+            self.add(i, grams)
+        self.freeze()
+
+    def freeze(self) -> None:
+        for band, pending in enumerate(self._pending):
+            if not pending:
+                continue
+            keys, ids = self._keys[band], self._ids[band]
+            if len(pending) * _INSERT_FRACTION < len(keys):
+                # إضافات قليلة (add_example): إدراج في الموضع المرتب (نقل ذاكرة)
+                # بدل إعادة ترتيب الشريحة كلها
+                for key, i in pending:
+                    lo = bisect_left(keys, key)
+                    hi = bisect_right(keys, key, lo)
+                    at = lo + bisect_left(ids[lo:hi], i)
+                    keys.insert(at, key)
+                    ids.insert(at, i)
+                self._pending[band] = []
+                continue
+            pending.extend(zip(keys, ids))
+            pending.sort()
+            self._keys[band] = array("q", [k for k, _ in pending])
+            self._ids[band] = array("i", [i for _, i in pending])
+            self._pending[band] = []
+
+    def candidates(self, grams: AbstractSet[str], limit: Optional[int] = None) -> List[int]:
+        """
+        أرقام الأمثلة التي تشارك الاستعلام شريحة واحدة على الأقل، بترتيب
+        المدوّنة. limit: نُبقي الأكثر اشتراكاً في الشرائح (تقدير لـ Jaccard).
+        """
+        if any(self._pending):
+            self.freeze()
+        signature = self.hasher.signature(grams)
+        if signature is None:
+            return []
+        hits: Counter = Counter()
+        for band, key in enumerate(self._band_keys(signature)):
+            keys = self._keys[band]
+            lo = bisect_left(keys, key)
+            hi = bisect_right(keys, key, lo)
+            if hi > lo:
+                hits.update(self._ids[band][lo:hi])
+        if limit and len(hits) > limit:
+            ids = sorted(hits, key=lambda i: (-hits[i], i))[:limit]
+        else:
+            ids = list(hits)
+        ids.sort()
+        return ids
+
+    def nbytes(self) -> int:
+        """حجم الجداول بالبايت (المصفوفات فقط)."""
+        return sum(k.itemsize * len(k) + v.itemsize * len(v) for k, v in zip(self._keys, self._ids))
+
+    def threshold(self) -> float:
+        """Jaccard التقريبي الذي يصبح عنده احتمال الترشيح 50%."""
+        return (1.0 / self.bands) ** (1.0 / self.rows)
@@ -7,18 +7,107 @@ from __future__ import annotations
 
 import json
 import os
-import re
-from typing import Dict, List, Tuple, Any, Optional
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple, Any, Optional
 
+try:
+    import fcntl
+except ImportError:  # ويندوز: بلا قفل ملفات بين العمليات
+    fcntl = None
+
+from app.core.cache import LRUCache
 from app.core.normalize import normalize_arabic
-from app.core.similarity import (
-    find_best_match, BestMatch, combined_similarity,
-    levenshtein_ratio, TfidfVectorizer
-)
+from app.core.index import CorpusIndex, DEFAULT_ENGINE, DEFAULT_TOP_K
+from app.core.lsh import DEFAULT_ROWS
+from app.core.metrics import StageTimer
+from app.core.similarity import DTW_BAND
+from app.core.snapshot import file_checksum, load_snapshot_index, open_snapshot, write_snapshot
 
 _THIS_DIR = os.path.dirname(os.path.abspath(__file__))
 _DATA_PATH = os.path.join(os.path.dirname(_THIS_DIR), "data", "examples.json")
+# نسخة JS من الأمثلة (الأصل الذي حُوِّل إلى JSON)، تُعاد كتابتها مع كل تعديل
+_JS_PATH = os.path.join(os.path.dirname(_THIS_DIR), "data", "examples.js")
+# لقطة الفهرس الثنائية (python -m app.cli build-index)؛ فارغ = البناء من JSON دائماً
+_SNAPSHOT_PATH = os.environ.get(
+    "METER_SNAPSHOT", os.path.join(os.path.dirname(_THIS_DIR), "data", "index.bin")
+)
 _EXAMPLES_CACHE: Optional[Dict[str, Any]] = None
+_INDEX_CACHE: Optional[CorpusIndex] = None
+# (mtime_ns, size) لملف الأمثلة عند تحميله: عامل آخر عدّله إن تغيّرت
+_INDEX_STAMP: Optional[Tuple[int, int]] = None
+_STAMP_CHECKED_AT = 0.0
+# أقل فاصل (ثوانٍ) بين فحصين لتغيّر ملف الأمثلة (0 = مع كل طلب)
+_RELOAD_INTERVAL = float(os.environ.get("METER_RELOAD_INTERVAL", "1.0"))
+# عدد المرشحين بعد مرحلة الحجب (0 = بحث شامل)
+_TOP_K = int(os.environ.get("METER_TOP_K", DEFAULT_TOP_K))
+# محرك المقاييس: python / numpy / auto
+_ENGINE = os.environ.get("METER_ENGINE", DEFAULT_ENGINE)
+# تفعيل مقياس المقاطع (DTW) في combined_similarity، ونصف عرض شريطه (-1 = بلا شريط)
+_USE_SYLLABIC = os.environ.get("METER_SYLLABIC", "0") == "1"
+_DTW_BAND = int(os.environ.get("METER_DTW_BAND", DTW_BAND))
+# وضع MinHash/LSH التقريبي للمدوّنات الكبيرة (0 شرائح = معطّل)
+_LSH_BANDS = int(os.environ.get("METER_LSH_BANDS", "0"))
+_LSH_ROWS = int(os.environ.get("METER_LSH_ROWS", DEFAULT_ROWS))
+# المرحلة العروضية (قوالب المقاطع) قبل البحث في الأمثلة: اختيارية
+_USE_PROSODY = os.environ.get("METER_PROSODY", "0") == "1"
+# نتائج التحليل حسب النص المطبّع (0 = بدون ذاكرة مؤقتة)
+_RESULT_CACHE = LRUCache(
+    maxsize=int(os.environ.get("METER_CACHE_SIZE", "4096")),
+    ttl=float(os.environ.get("METER_CACHE_TTL", "3600")) or None,
+)
+
+class _RWLock:
+    """
+    قفل قرّاء/كاتب يفضّل الكاتب: التحليلات تعمل معاً، والتعديل ينتظر انتهاء
+    الجارية منها ويمنع الجديدة حتى ينتهي، فلا يرى أي طلب فهرساً نصف معدّل.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._waiting = 0
+
+    @contextmanager
+    def reading(self) -> Iterator[None]:
+        with self._cond:
+            while self._writing or self._waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def writing(self) -> Iterator[None]:
+        with self._cond:
+            self._waiting += 1
+            while self._writing or self._readers:
+                self._cond.wait()
+            self._waiting -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+
+
+_INDEX_LOCK = _RWLock()
+
+def _file_stamp(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
 
 def _load_examples() -> Dict:
     global _EXAMPLES_CACHE
@@ -28,6 +117,9 @@ def _load_examples() -> Dict:
     if not os.path.exists(_DATA_PATH):
         raise FileNotFoundError(f"ملف الأمثلة غير موجود: {_DATA_PATH}. يجب تحويل examples.js إلى examples.json أولاً.")
 
+    global _INDEX_STAMP
+    # الختم قبل القراءة: تعديل يقع أثناءها يُكتشف في الفحص التالي
+    _INDEX_STAMP = _file_stamp(_DATA_PATH)
     with open(_DATA_PATH, "r", encoding="utf-8") as f:
         data = json.load(f)
 
@@ -39,6 +131,213 @@ def _load_examples() -> Dict:
     _EXAMPLES_CACHE = data
     return data
 
+def _load_index() -> CorpusIndex:
+    global _INDEX_CACHE, _INDEX_STAMP, _STAMP_CHECKED_AT
+    if _INDEX_CACHE is not None:
+        now = time.monotonic()
+        if now - _STAMP_CHECKED_AT < _RELOAD_INTERVAL:
+            return _INDEX_CACHE
+        _STAMP_CHECKED_AT = now
+        if _file_stamp(_DATA_PATH) == _INDEX_STAMP:
+            return _INDEX_CACHE
+        # عُدّلت الأمثلة من عامل آخر: فهرس جديد، والطلبات الجارية تُكمل على القديم
+        _reset_caches()
+
+    _INDEX_STAMP = _file_stamp(_DATA_PATH)
+    lsh = (_LSH_BANDS, _LSH_ROWS) if _LSH_BANDS > 0 else None
+    # اللقطة إن كانت مطابقة لملف الأمثلة الحالي، وإلا البناء من JSON
+    snap = open_snapshot(_SNAPSHOT_PATH, _DATA_PATH)
+    if snap is not None:
+        try:
+            _INDEX_CACHE = load_snapshot_index(
+                snap, top_k=_TOP_K, engine=_ENGINE,
+                use_syllabic=_USE_SYLLABIC, dtw_band=_DTW_BAND, lsh=lsh
+            )
+            return _INDEX_CACHE
+        except (KeyError, ValueError, TypeError, IndexError):
+            # لقطة ناقصة أو تالفة (قسم أو مفتاح مفقود): نعود للبناء من JSON
+            pass
+
+    _INDEX_CACHE = _build_index(_load_examples())
+    return _INDEX_CACHE
+
+def _build_index(data: Dict) -> CorpusIndex:
+    lsh = (_LSH_BANDS, _LSH_ROWS) if _LSH_BANDS > 0 else None
+    return CorpusIndex(
+        _flatten_candidates(data), _build_weight_profiles(data),
+        top_k=_TOP_K, engine=_ENGINE,
+        use_syllabic=_USE_SYLLABIC, dtw_band=_DTW_BAND, lsh=lsh
+    )
+
+def _reset_caches() -> None:
+    global _EXAMPLES_CACHE, _INDEX_CACHE
+    _EXAMPLES_CACHE = None
+    _INDEX_CACHE = None
+
+def build_snapshot(path: Optional[str] = None) -> Dict[str, Any]:
+    """بناء الفهرس من JSON وكتابة لقطته الثنائية (افتراضياً في _SNAPSHOT_PATH)."""
+    path = path or _SNAPSHOT_PATH
+    checksum = file_checksum(_DATA_PATH)
+    data = _load_examples()
+    index = CorpusIndex(_flatten_candidates(data), _build_weight_profiles(data), engine="python")
+    return write_snapshot(index, path, checksum, list(data))
+
+# -------------------------------------------------------------
+# إدارة الأمثلة (إضافة/حذف دون إعادة بناء الفهرس)
+# -------------------------------------------------------------
+
+@contextmanager
+def _examples_file_lock() -> Iterator[None]:
+    """قفل حصري على ملف الأمثلة بين العمليات (عمّال uvicorn) أثناء التعديل."""
+    if fcntl is None:
+        yield
+        return
+    with open(_DATA_PATH + ".lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def _atomic_write(path: str, content: str) -> None:
+    # ملف مؤقت بجانب الهدف ثم os.replace: القارئ يرى الملف القديم أو الجديد كاملاً
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def _examples_js(data: Dict) -> str:
+    # بتنسيق examples.js: وزن في كل كتلة وسطر فارغ بين الأوزان
+    blocks = (
+        json.dumps(weight, ensure_ascii=False) + ": " + json.dumps(info, ensure_ascii=False, indent=2)
+        for weight, info in data.items()
+    )
+    return "export const EXAMPLES = {\n" + ",\n\n".join(blocks) + "\n};\n"
+
+def _save_examples(data: Dict) -> None:
+    """examples.json ثم examples.js، كلاهما بكتابة ذرية (المستدعي يمسك قفل الملف)."""
+    global _INDEX_STAMP
+    content = json.dumps(data, ensure_ascii=False, indent=2)
+    _atomic_write(_DATA_PATH, content)
+    _atomic_write(_JS_PATH, _examples_js(data))
+    # اللقطة الثنائية تصبح قديمة (checksum مختلف)، فالعمّال يبنون من JSON
+    _INDEX_STAMP = _file_stamp(_DATA_PATH)
+
+def _mutable_index() -> CorpusIndex:
+    """الفهرس الحالي بعد مزامنته مع الملف؛ المحمّل من لقطة (للقراءة فقط) يُبنى من JSON."""
+    global _INDEX_CACHE, _STAMP_CHECKED_AT
+    _STAMP_CHECKED_AT = 0.0
+    index = _load_index()
+    if index.snapshot is not None:
+        _INDEX_CACHE = index = _build_index(_load_examples())
+    return index
+
+def _unknown_weight(weight: str) -> Dict:
+    return {
+        "ok": False,
+        "error": "unknown_weight",
+        "message": f"الوزن غير موجود: {weight}"
+    }
+
+def _empty_example() -> Dict:
+    return {
+        "ok": False,
+        "error": "empty_input",
+        "message": "اكتب الوزن ونص المثال."
+    }
+
+def list_examples(weight: Optional[str] = None) -> Dict:
+    """عدد الأمثلة لكل وزن، أو أمثلة وزن واحد."""
+    with _INDEX_LOCK.reading():
+        _load_index()
+        data = _load_examples()
+        if not weight:
+            return {"ok": True, "weights": {w: len(info["examples"]) for w, info in data.items()}}
+        if weight not in data:
+            return _unknown_weight(weight)
+        return {"ok": True, "weight": weight, "examples": list(data[weight]["examples"])}
+
+def add_example(weight: str, text: str) -> Dict:
+    """إضافة مثال لوزن موجود: يُحفظ في الملف ثم يُضاف للفهرس في مكانه."""
+    text = (text or "").strip()
+    if not weight or not text:
+        return _empty_example()
+    with _examples_file_lock(), _INDEX_LOCK.writing():
+        index = _mutable_index()
+        data = _load_examples()
+        if weight not in data:
+            return _unknown_weight(weight)
+        examples = data[weight]["examples"]
+        if any(isinstance(ex, str) and ex.strip() == text for ex in examples):
+            return {
+                "ok": False,
+                "error": "duplicate",
+                "message": "المثال موجود مسبقاً في هذا الوزن."
+            }
+        examples.append(text)
+        try:
+            _save_examples(data)
+        except OSError:
+            examples.pop()
+            raise
+        index.add_example(weight, text)
+        return {"ok": True, "weight": weight, "text": text, "count": len(examples)}
+
+def remove_example(weight: str, text: str) -> Dict:
+    """حذف مثال من وزن: من الملف ثم من الفهرس في مكانه."""
+    text = (text or "").strip()
+    if not weight or not text:
+        return _empty_example()
+    with _examples_file_lock(), _INDEX_LOCK.writing():
+        index = _mutable_index()
+        data = _load_examples()
+        if weight not in data:
+            return _unknown_weight(weight)
+        examples = data[weight]["examples"]
+        pos = next((k for k, ex in enumerate(examples) if isinstance(ex, str) and ex.strip() == text), None)
+        if pos is None:
+            return {
+                "ok": False,
+                "error": "not_found",
+                "message": "المثال غير موجود في هذا الوزن."
+            }
+        removed = examples.pop(pos)
+        try:
+            _save_examples(data)
+        except OSError:
+            examples.insert(pos, removed)
+            raise
+        index.remove_example(weight, text)
+        return {"ok": True, "weight": weight, "text": text, "count": len(examples)}
+
+def result_cache_stats() -> Dict[str, Any]:
+    return _RESULT_CACHE.stats()
+
+def cache_self_test(groups: List[List[str]]) -> Dict[str, int]:
+    """
+    كل مجموعة أشكال لنص واحد (نفس المطبّع): نتيجة كل شكل من الذاكرة المؤقتة
+    بعد أن ملأها أولها = تحليل الشكل نفسه (كما وصل) دون ذاكرة. تُفرغ الذاكرة
+    المؤقتة قبل وبعد.
+    """
+    mismatches = 0
+    checked = 0
+    with _INDEX_LOCK.reading():
+        index = _load_index()
+        _RESULT_CACHE.clear()
+        try:
+            for group in groups:
+                _analyze_line(group[0], index, None, None)
+                for text in group:
+                    normalized = normalize_arabic(text, deep=False)
+                    expected = _analyze_uncached(text, normalized, index, None)
+                    checked += 1
+                    mismatches += _analyze_line(text, index, None, None) != expected
+        finally:
+            _RESULT_CACHE.clear()
+    return {"cache_checked": checked, "cache_mismatches": mismatches}
+
 def list_weights() -> List[str]:
     return sorted(_load_examples().keys())
 
@@ -58,89 +357,165 @@ def _build_weight_profiles(data: Dict) -> Dict[str, str]:
             profiles[weight] = ' '.join(examples)
     return profiles
 
-def _exact_match(text: str, candidates: List[Tuple[str, str]]) -> Tuple[bool, str, str]:
+def _exact_match(
+    text: str,
+    index: CorpusIndex,
+    timer: Optional[StageTimer] = None,
+    exclude: Optional[int] = None
+) -> Tuple[bool, str, str]:
     # المرحلة الأولى: deep=False
-    norm_input_light = normalize_arabic(text, deep=False)
-    compact_light = re.sub(r'\s+', '', norm_input_light)
-
-    for w, ex in candidates:
-        norm_ex_light = normalize_arabic(ex, deep=False)
-        compact_light_ex = re.sub(r'\s+', '', norm_ex_light)
-        if compact_light == compact_light_ex:
-            return True, w, ex
-        if abs(len(compact_light) - len(compact_light_ex)) <= 2:
-            sim = levenshtein_ratio(compact_light, compact_light_ex)
-            if sim > 0.95:
-                return True, w, ex
+    compact_light = normalize_arabic(text, deep=False).replace(' ', '')
+    entry = index.lookup_exact(compact_light, exclude=exclude) or index.lookup_near_exact(compact_light, exclude=exclude)
+    if timer is not None:
+        timer.mark("exact_light")
+    if entry is not None:
+        return True, entry.weight, entry.text
 
     # المرحلة الثانية: deep=True
-    norm_input_deep = normalize_arabic(text, deep=True)
-    compact_deep = re.sub(r'\s+', '', norm_input_deep)
-
-    for w, ex in candidates:
-        norm_ex_deep = normalize_arabic(ex, deep=True)
-        compact_deep_ex = re.sub(r'\s+', '', norm_ex_deep)
-        if compact_deep == compact_deep_ex:
-            return True, w, ex
-        if abs(len(compact_deep) - len(compact_deep_ex)) <= 2:
-            sim = levenshtein_ratio(compact_deep, compact_deep_ex)
-            if sim > 0.95:
-                return True, w, ex
+    compact_deep = normalize_arabic(text, deep=True).replace(' ', '')
+    entry = (index.lookup_exact(compact_deep, deep=True, exclude=exclude)
+             or index.lookup_near_exact(compact_deep, deep=True, exclude=exclude))
+    if timer is not None:
+        timer.mark("exact_deep")
+    if entry is not None:
+        return True, entry.weight, entry.text
 
     return False, "", ""
 
-def analyze_poem_line(text: str) -> Dict:
-    data = _load_examples()
-    candidates = _flatten_candidates(data)
-    weight_profiles = _build_weight_profiles(data)
+def analyze_poem_line(
+    text: str,
+    deadline: Optional[float] = None,
+    timings: bool = False,
+    k: int = 0,
+    per_weight: bool = False
+) -> Dict:
+    """
+    deadline: وقت (time.time) ينتهي عنده البحث؛ تعود النتيجة حينها
+    بأفضل تطابق وُجد حتى الآن مع "partial": True.
+    timings: إضافة حقل "timings" بزمن كل مرحلة (انظر metrics.observe).
+    k / per_weight: إضافة "matches" (أفضل k مثالاً) و/أو "per_weight" (أفضل
+    مثال لكل وزن)، كل منها مع درجة كل مقياس.
+    """
+    timer = StageTimer() if timings else None
+    with _INDEX_LOCK.reading():
+        index = _load_index()
+        result = _analyze_line(text, index, deadline, timer)
+        if (k or per_weight) and result.get("ok"):
+            _add_rankings(result, text, index, k, per_weight, deadline)
+            if timer is not None:
+                timer.mark("rank")
+    if timer is not None:
+        result["timings"] = timer.as_dict()
+    return result
+
+def _add_rankings(result: Dict, text: str, index: CorpusIndex, k: int, per_weight: bool,
+                  deadline: Optional[float]) -> None:
+    top, by_weight, partial = index.rank_matches(text, k, per_weight, deadline=deadline)
+    if k:
+        result["matches"] = [m.to_dict() for m in top]
+    if per_weight:
+        result["per_weight"] = {w: m.to_dict() for w, m in by_weight.items()}
+    if partial:
+        result["partial"] = True
 
-    if not candidates:
+def _analyze_line(text: str, index: CorpusIndex, deadline: Optional[float], timer: Optional[StageTimer]) -> Dict:
+    if not len(index):
         return {
             "ok": False,
             "error": "no_examples",
             "message": "لا توجد أمثلة في قاعدة البيانات."
         }
 
+    # 0. الذاكرة المؤقتة: التشكيل والتطويل والمسافات الزائدة لا تغيّر المفتاح،
+    # وكل مراحل التحليل تقيس الشكل المطبّع، فنتيجة المفتاح لا تتبع الشكل الذي وصل أولاً
+    normalized = normalize_arabic(text, deep=False)
+    if timer is not None:
+        timer.mark("normalize")
+    cached = _RESULT_CACHE.get(normalized, index.version)
+    if timer is not None:
+        timer.mark("cache")
+    if cached is not None:
+        result = dict(cached)
+        result["input"] = text
+        result["normalized"] = normalized
+        return result
+
+    result = _analyze_uncached(text, normalized, index, deadline, timer)
+    # النتائج الجزئية (انتهت مهلتها) لا تُخزَّن
+    if not result.get("partial"):
+        _RESULT_CACHE.put(normalized, dict(result), index.version)
+    return result
+
+def _analyze_uncached(
+    text: str,
+    normalized: str,
+    index: CorpusIndex,
+    deadline: Optional[float],
+    timer: Optional[StageTimer] = None,
+    exclude: Optional[int] = None
+) -> Dict:
+    """exclude: رقم مثال يُعامل كأنه محذوف من المدوّنة (leave-one-out في bench)."""
     # 1. تطابق تام
-    exact, w, ex = _exact_match(text, candidates)
+    exact, w, ex = _exact_match(text, index, timer, exclude)
     if exact:
         return {
             "ok": True,
             "matched": True,
             "input": text,
-            "normalized": normalize_arabic(text, deep=False),
+            "normalized": normalized,
             "weight": w,
             "similarity": 1.0,          # <-- هنا التشابه
             "closest_example": ex,
             "method": "exact_match"
         }
 
-    # 2. تجهيز TfidfVectorizer
-    all_examples = [ex for _, ex in candidates]
-    vectorizer = TfidfVectorizer(all_examples) if all_examples else None
+    # 2. مرحلة عروضية سريعة (METER_PROSODY=1): قالب مقاطع معروف بثقة عالية.
+    # نصيب الوزن من الأصوات في prosody_confidence، وsimilarity تشابه البيت
+    # مع المثال المعروض كسائر الطرق. قوالب الشجرة تشمل كل الأمثلة، فلا تُستعمل مع exclude
+    prosody = index.prosody.classify(text) if _USE_PROSODY and exclude is None else None
+    if timer is not None and _USE_PROSODY:
+        timer.mark("prosody")
+    if prosody is not None and prosody.confident:
+        return {
+            "ok": True,
+            "matched": True,
+            "input": text,
+            "normalized": normalized,
+            "weight": prosody.weight,
+            "similarity": round(index.example_score(text, prosody.weight, prosody.example), 3),
+            "closest_example": prosody.example,
+            "method": "prosody",
+            "prosody_confidence": round(prosody.score, 3),
+            "syllables": prosody.syllables,
+            "template": prosody.template,
+            "positions": prosody.positions
+        }
 
-    # 3. بحث أفضل تطابق
-    best = find_best_match(text, candidates, weight_profiles, vectorizer)
+    # 3. بحث أفضل تطابق (الفهرس جاهز مسبقاً)
+    best = index.find_best_match(text, deadline=deadline, timer=timer, exclude=exclude)
 
     # 4. عتبة تشابه ديناميكية
     similarity = best.score
     if similarity < 0.3:
-        return {
+        result = {
             "ok": True,
             "matched": False,
             "input": text,
-            "normalized": normalize_arabic(text, deep=False),
+            "normalized": normalized,
             "similarity": round(similarity, 3),
             "message": "البيت بعيد عن جميع الأوزان المدعومة حالياً. يرجى إضافة أمثلة أقرب."
         }
-
-    return {
-        "ok": True,
-        "matched": True,
-        "input": text,
-        "normalized": normalize_arabic(text, deep=False),
-        "weight": best.weight,
-        "similarity": round(similarity, 3),
-        "closest_example": best.example,
-        "method": best.method
-    }
+    else:
+        result = {
+            "ok": True,
+            "matched": True,
+            "input": text,
+            "normalized": normalized,
+            "weight": best.weight,
+            "similarity": round(similarity, 3),
+            "closest_example": best.example,
+            "method": best.method
+        }
+    if best.partial:
+        result["partial"] = True
+    return result
@@ -0,0 +1,188 @@
+"""
+مقاييس الأداء داخل العملية: أزمنة مراحل التحليل كمدرّجات (histograms)،
+وعدد الطلبات حسب طريقة المطابقة، وعدد المرشحين وطول المدخل، بصيغة
+Prometheus النصية (/api/metrics).
+
+التحليل نفسه لا يسجّل شيئاً: يعيد أزمنته في الحقل "timings" من النتيجة
+(يعمل ذلك مع مجمّع العمليات أيضاً)، وتسجّلها observe في العملية الرئيسية.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# تفعيل جمع الأزمنة مع كل تحليل (0 = لا قياس إلا مع ?debug=1)
+METRICS_ENABLED = os.environ.get("METER_METRICS", "1") == "1"
+
+# حدود المدرّجات (Prometheus: كل دلو يعدّ القيم <= حده)
+STAGE_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+CANDIDATE_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 150, 250, 500, 1000, 2500, 5000)
+LENGTH_BUCKETS = (10, 20, 30, 40, 50, 60, 80, 100, 150, 200, 500)
+
+# طرق المطابقة كما في حقل method، و"unmatched" للنتائج غير المطابقة
+METHODS = ("exact_match", "prosody", "example_similarity", "weight_tfidf", "unmatched", "error")
+
+
+class StageTimer:
+    """أزمنة مراحل طلب واحد: mark(stage) تنسب للمرحلة الزمن منذ آخر علامة."""
+    __slots__ = ("stages", "counts", "_start", "_last")
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self._start = self._last = time.perf_counter()
+
+    def mark(self, stage: str) -> None:
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + (now - self._last)
+        self._last = now
+
+    def count(self, name: str, value: int) -> None:
+        self.counts[name] = self.counts.get(name, 0) + value
+
+    def as_dict(self) -> Dict[str, Any]:
+        """الحقل "timings" في نتيجة التحليل (بالملّي ثانية)."""
+        out: Dict[str, Any] = {
+            "total_ms": round(1000 * (self._last - self._start), 4),
+            "stages_ms": {k: round(1000 * v, 4) for k, v in self.stages.items()},
+        }
+        out.update(self.counts)
+        return out
+
+
+class Histogram:
+    """مدرّج بحدود ثابتة (عدّاد لكل دلو + المجموع + العدد)."""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.stages: Dict[str, Histogram] = {}
+        self.request = Histogram(STAGE_BUCKETS)
+        self.candidates = Histogram(CANDIDATE_BUCKETS)
+        self.input_chars = Histogram(LENGTH_BUCKETS)
+        self.methods: Dict[str, int] = dict.fromkeys(METHODS, 0)
+
+    def observe(self, result: Dict[str, Any], timings: Optional[Dict[str, Any]]) -> None:
+        method = _method_label(result)
+        with self._lock:
+            self.methods[method] = self.methods.get(method, 0) + 1
+            self.input_chars.observe(len(result.get("input") or ""))
+            if timings is None:
+                return
+            for stage, ms in timings["stages_ms"].items():
+                hist = self.stages.get(stage)
+                if hist is None:
+                    hist = self.stages[stage] = Histogram(STAGE_BUCKETS)
+                hist.observe(ms / 1000.0)
+            self.request.observe(timings["total_ms"] / 1000.0)
+            if "scored" in timings:
+                self.candidates.observe(timings["scored"])
+
+
+REGISTRY = _Registry()
+
+
+def _method_label(result: Dict[str, Any]) -> str:
+    if not result.get("ok"):
+        return "error"
+    if not result.get("matched"):
+        return "unmatched"
+    return result.get("method") or "unmatched"
+
+
+def observe(result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """يسجّل نتيجة تحليل ويزيل منها "timings" (ويعيده لعرضه مع ?debug=1)."""
+    timings = result.pop("timings", None)
+    REGISTRY.observe(result, timings)
+    return timings
+
+
+def observe_many(results: Iterable[Dict[str, Any]]) -> None:
+    for result in results:
+        observe(result)
+
+
+# -------------------------------------------------------------
+# صيغة Prometheus النصية
+# -------------------------------------------------------------
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ""
+    inner = ",".join(f'{k}="{str(v)}"' for k, v in labels.items())
+    return "{" + inner + "}"
+
+
+def _histogram_lines(name: str, hist: Histogram, labels: Dict[str, Any]) -> List[str]:
+    lines = []
+    seen = 0
+    for bound, c in zip(hist.buckets + (float("inf"),), hist.counts):
+        seen += c
+        lines.append(f"{name}_bucket{_labels(dict(labels, le=_fmt(bound)))} {seen}")
+    lines.append(f"{name}_sum{_labels(labels)} {_fmt(hist.sum)}")
+    lines.append(f"{name}_count{_labels(labels)} {hist.count}")
+    return lines
+
+
+def render(gauges: Iterable[Tuple[str, str, str, float]] = ()) -> str:
+    """
+    كل المقاييس بصيغة Prometheus. gauges: (name, type, help, value) إضافية
+    من المكوّنات الأخرى (المجمّع، الذاكرة المؤقتة، الفهرس).
+    """
+    reg = REGISTRY
+    out: List[str] = []
+    with reg._lock:
+        out.append("# HELP meter_requests_total Analyzed lines by match method.")
+        out.append("# TYPE meter_requests_total counter")
+        for method, count in reg.methods.items():
+            out.append(f"meter_requests_total{_labels({'method': method})} {count}")
+
+        out.append("# HELP meter_stage_seconds Time spent in each analysis stage.")
+        out.append("# TYPE meter_stage_seconds histogram")
+        for stage, hist in reg.stages.items():
+            out.extend(_histogram_lines("meter_stage_seconds", hist, {"stage": stage}))
+
+        out.append("# HELP meter_analyze_seconds Total analysis time per line (inside the worker).")
+        out.append("# TYPE meter_analyze_seconds histogram")
+        out.extend(_histogram_lines("meter_analyze_seconds", reg.request, {}))
+
+        out.append("# HELP meter_candidates_scored Examples fully scored per line (after upper-bound pruning).")
+        out.append("# TYPE meter_candidates_scored histogram")
+        out.extend(_histogram_lines("meter_candidates_scored", reg.candidates, {}))
+
+        out.append("# HELP meter_input_chars Input length in characters.")
+        out.append("# TYPE meter_input_chars histogram")
+        out.extend(_histogram_lines("meter_input_chars", reg.input_chars, {}))
+
+    for name, kind, help_text, value in gauges:
+        out.append(f"# HELP {name} {help_text}")
+        out.append(f"# TYPE {name} {kind}")
+        out.append(f"{name} {_fmt(value)}")
+    return "\n".join(out) + "\n"
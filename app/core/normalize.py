@@ -6,10 +6,12 @@
 from __future__ import annotations
 
 import re
-from typing import List, Set, Optional
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Optional, Tuple
 
 # إزالة الحركات والتشكيل
-_DIACRITICS = re.compile(r"[\u064B-\u0652\u0670]")  # ً ٌ ٍ َ ُ ِ ّ ْ ٰ
+_DIACRITICS = "".join(chr(c) for c in range(0x064B, 0x0653)) + "\u0670"  # ً ٌ ٍ َ ُ ِ ّ ْ ٰ
+_TATWEEL = "ـ"
 
 # استبدال الحروف المتشابهة (آمن)
 _LETTER_MAP = {
@@ -37,62 +39,140 @@ _COMMON_REPLACEMENTS = {
 }
 
 _PUNCT = re.compile(r"[^\w\s\u0600-\u06FF]", re.UNICODE)
-_MULTI_SPACE = re.compile(r"\s+")
-_TATWEEL = re.compile(r"ـ+")
+
+# جدول str.translate: حذف التشكيل والتطويل والهمزة المنفردة + توحيد الحروف
+_TRANSLATE = str.maketrans({
+    **{c: None for c in _DIACRITICS + _TATWEEL},
+    **{old: (new or None) for old, new in _LETTER_MAP.items()},
+})
+
+class _FoldTable(dict):
+    """
+    _TRANSLATE + تحويل علامات الترقيم (_PUNCT) إلى مسافة في نفس المرور.
+    كل حرف جديد يُصنَّف بـ _PUNCT مرة واحدة ثم يُحفظ في الجدول.
+    """
+    _MAX_SIZE = 65536
+
+    def __missing__(self, code: int) -> int:
+        value = 32 if _PUNCT.match(chr(code)) else code
+        if len(self) < self._MAX_SIZE:
+            self[code] = value
+        return value
+
+_FOLD = _FoldTable(_TRANSLATE)
+
+# الكلمة -> بديلها اللهجي (أول زوج في _COMMON_REPLACEMENTS يطابق المفتاح أو القيمة)
+_DIALECT_LOOKUP: Dict[str, str] = {}
+for _key, _val in _COMMON_REPLACEMENTS.items():
+    _DIALECT_LOOKUP.setdefault(_key, _val)
+    _DIALECT_LOOKUP.setdefault(_val, _val)
+
+# ذاكرة مؤقتة صغيرة للمدخلات القصيرة المتكررة (أبيات، كلمات)
+_NORMALIZE_CACHE_SIZE = 8192
+_NORMALIZE_CACHE_MAX_LEN = 256
 
 def normalize_arabic(text: str, deep: bool = False) -> str:
     """
     تطبيع النص العربي/العراقي.
     deep=True يطبق تحويلات لهجوية (قد تغير المعنى، استخدم بحذر).
     """
+    if isinstance(text, str) and len(text) <= _NORMALIZE_CACHE_MAX_LEN:
+        return _normalize_cached(text, deep)
+    return _normalize(text, deep)
+
+def _normalize(text: str, deep: bool) -> str:
     if not isinstance(text, str):
         return ""
     t = text.strip()
     if not t:
         return ""
 
-    t = _TATWEEL.sub("", t)
-    t = _DIACRITICS.sub("", t)
+    if deep:
+        # الترقيم يبقى ملتصقاً بالكلمة أثناء التحويلات اللهجوية (كلمات كاملة فقط)
+        t = t.translate(_TRANSLATE)
+        lookup = _DIALECT_LOOKUP.get
+        t = ' '.join(w if len(w) <= 2 else lookup(w, w) for w in t.split())
 
-    for old, new in _LETTER_MAP.items():
-        t = t.replace(old, new)
+    # التشكيل والتطويل وتوحيد الحروف والترقيم في مرور واحد
+    t = t.translate(_FOLD)
+    return ' '.join(t.split())
 
-    if deep:
-        # تطبيق تحويلات لهجوية على الكلمات الكاملة فقط
-        words = t.split()
-        normalized_words = []
-        for w in words:
-            if len(w) <= 2:
-                normalized_words.append(w)
-                continue
-            found = False
-            for key, val in _COMMON_REPLACEMENTS.items():
-                if w == key or w == val:
-                    normalized_words.append(val)
-                    found = True
-                    break
-            if not found:
-                normalized_words.append(w)
-        t = ' '.join(normalized_words)
-
-    t = _PUNCT.sub(" ", t)
-    t = _MULTI_SPACE.sub(" ", t)
-    return t.strip()
+_normalize_cached = lru_cache(maxsize=_NORMALIZE_CACHE_SIZE)(_normalize)
+
+class NormalizedText:
+    """
+    نص مطبّع (deep=False) قابل لإعادة الاستخدام: الكلمات والشكل المضغوط
+    والـ n-grams تُحسب عند أول طلب فقط.
+    """
+    __slots__ = ("raw", "text", "_tokens", "_token_set", "_compact", "_char_ngrams", "_word_ngrams")
+
+    def __init__(self, raw: str, text: str):
+        self.raw = raw
+        self.text = text
+        self._tokens: Optional[Tuple[str, ...]] = None
+        self._token_set: Optional[FrozenSet[str]] = None
+        self._compact: Optional[str] = None
+        self._char_ngrams: Dict[int, FrozenSet[str]] = {}
+        self._word_ngrams: Dict[int, FrozenSet[str]] = {}
+
+    @property
+    def tokens(self) -> Tuple[str, ...]:
+        if self._tokens is None:
+            self._tokens = tuple(self.text.split())
+        return self._tokens
+
+    @property
+    def token_set(self) -> FrozenSet[str]:
+        if self._token_set is None:
+            self._token_set = frozenset(self.tokens)
+        return self._token_set
+
+    @property
+    def compact(self) -> str:
+        if self._compact is None:
+            self._compact = self.text.replace(' ', '')
+        return self._compact
+
+    def char_ngrams(self, n: int = 2) -> FrozenSet[str]:
+        grams = self._char_ngrams.get(n)
+        if grams is None:
+            t = self.compact
+            if len(t) < n:
+                grams = frozenset((t,)) if t else frozenset()
+            else:
+                grams = frozenset(t[i:i+n] for i in range(len(t)-n+1))
+            self._char_ngrams[n] = grams
+        return grams
+
+    def word_ngrams(self, n: int = 2) -> FrozenSet[str]:
+        grams = self._word_ngrams.get(n)
+        if grams is None:
+            words = self.tokens
+            if len(words) < n:
+                grams = frozenset((' '.join(words),)) if words else frozenset()
+            else:
+                grams = frozenset(' '.join(words[i:i+n]) for i in range(len(words)-n+1))
+            self._word_ngrams[n] = grams
+        return grams
+
+@lru_cache(maxsize=_NORMALIZE_CACHE_SIZE)
+def _normalize_text_cached(text: str) -> NormalizedText:
+    return NormalizedText(text, _normalize(text, False))
+
+def normalize_text(text: str) -> NormalizedText:
+    """NormalizedText للنص (مشترك بين الاستدعاءات للمدخلات القصيرة)."""
+    if isinstance(text, str) and len(text) <= _NORMALIZE_CACHE_MAX_LEN:
+        return _normalize_text_cached(text)
+    return NormalizedText(text, normalize_arabic(text, deep=False))
 
 def tokenize(text: str) -> List[str]:
     """تقطيع النص إلى كلمات بعد التطبيع."""
-    return normalize_arabic(text, deep=False).split()
+    return list(normalize_text(text).tokens)
 
-def char_ngrams(text: str, n: int = 2) -> Set[str]:
+def char_ngrams(text: str, n: int = 2) -> FrozenSet[str]:
     """n-grams حرفية."""
-    t = normalize_arabic(text, deep=False).replace(' ', '')
-    if len(t) < n:
-        return {t} if t else set()
-    return {t[i:i+n] for i in range(len(t)-n+1)}
+    return normalize_text(text).char_ngrams(n)
 
-def word_ngrams(text: str, n: int = 2) -> Set[str]:
+def word_ngrams(text: str, n: int = 2) -> FrozenSet[str]:
     """n-grams كلمات."""
-    words = tokenize(text)
-    if len(words) < n:
-        return {' '.join(words)} if words else set()
-    return {' '.join(words[i:i+n]) for i in range(len(words)-n+1)}
+    return normalize_text(text).word_ngrams(n)
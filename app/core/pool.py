@@ -0,0 +1,228 @@
+"""
+مجمّع تنفيذ التحليل خارج حلقة الأحداث.
+طابور محدود: عند امتلائه نرفض فوراً (PoolBusy) بدل أن تتراكم الطلبات،
+ولكل مهمة مهلة (deadline) يعيد بعدها التحليل أفضل نتيجة وصل إليها.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.core.meter import _load_index, result_cache_stats
+
+# نوع المجمّع: thread (افتراضي) أو process
+POOL_KIND = os.environ.get("METER_POOL", "thread")
+# عدد العمّال (0 = عدد المعالجات)
+POOL_WORKERS = int(os.environ.get("METER_WORKERS", "0")) or (os.cpu_count() or 1)
+# أقصى عدد مهام تنتظر فوق عدد العمّال قبل الرفض
+POOL_MAX_QUEUE = int(os.environ.get("METER_QUEUE_SIZE", "64"))
+# مهلة التحليل لكل طلب بالثواني
+ANALYZE_TIMEOUT = float(os.environ.get("METER_TIMEOUT", "2.0"))
+
+
+# عدّادات الذاكرة المؤقتة التي تُجمع من عمليات العمّال؛ خانة كل عامل: pid ثم العدّادات
+_CACHE_COUNTERS = ("size", "hits", "misses", "evictions", "expirations", "invalidations")
+_SLOT_WIDTH = 1 + len(_CACHE_COUNTERS)
+
+# داخل عامل العمليات: (المصفوفة المشتركة، بداية خانته) أو None
+_CACHE_SLOT: Optional[Tuple[Any, int]] = None
+
+
+class PoolBusy(Exception):
+    """الطابور ممتلئ: يجب رفض الطلب فوراً (503)."""
+
+
+def _init_worker(slots: Any = None, next_slot: Any = None) -> None:
+    # كل عملية تحمّل الفهرس مرة واحدة عند بدئها، وتحجز خانة لعدّادات ذاكرتها المؤقتة
+    global _CACHE_SLOT
+    _load_index()
+    if slots is not None:
+        with next_slot.get_lock():
+            slot = next_slot.value
+            next_slot.value += 1
+        if (slot + 1) * _SLOT_WIDTH <= len(slots):
+            _CACHE_SLOT = (slots, slot * _SLOT_WIDTH)
+            slots[slot * _SLOT_WIDTH] = os.getpid()
+            _publish_cache_stats()
+
+
+def _publish_cache_stats() -> None:
+    if _CACHE_SLOT is None:
+        return
+    slots, start = _CACHE_SLOT
+    stats = result_cache_stats()
+    for n, key in enumerate(_CACHE_COUNTERS, 1):
+        slots[start + n] = stats[key]
+
+
+def _timed_call(enqueued_at: float, fn: Callable, args: Tuple, deadline: Optional[float]) -> Tuple[float, Any]:
+    # يعمل داخل العامل: زمن الانتظار في الطابور ثم التنفيذ
+    waited = time.time() - enqueued_at
+    try:
+        if deadline is None:
+            return waited, fn(*args)
+        return waited, fn(*args, deadline=deadline)
+    finally:
+        _publish_cache_stats()
+
+
+async def _result(pending: "asyncio.Future[Tuple[float, Any]]") -> Any:
+    # الانتظار فقط؛ المهمة أُرسلت، وزمن انتظارها يُحسب في _finish
+    _, result = await pending
+    return result
+
+
+def _is_partial(result: Any) -> bool:
+    if isinstance(result, list):
+        return any(_is_partial(r) for r in result)
+    return isinstance(result, dict) and bool(result.get("partial"))
+
+
+class AnalysisPool:
+    def __init__(self, kind: str = POOL_KIND, workers: int = POOL_WORKERS, max_queue: int = POOL_MAX_QUEUE):
+        self.kind = kind
+        self.workers = workers
+        self.max_queue = max_queue
+        # لكل عامل عملية ذاكرته المؤقتة؛ ينشر عدّاداتها في خانته بعد كل مهمة
+        self._cache_slots: Any = None
+        if kind == "process":
+            # نحمّل الفهرس قبل التفرّع ليتشاركه العمّال عبر copy-on-write
+            _load_index()
+            self._cache_slots = multiprocessing.Array("q", workers * _SLOT_WIDTH, lock=False)
+            self.executor: Executor = ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_worker,
+                initargs=(self._cache_slots, multiprocessing.Value("i", 0))
+            )
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="meter")
+        # خيوط لمهام تعدّل حالة في هذه العملية (انظر submit_local)
+        self._local: Optional[Executor] = self.executor if kind != "process" else None
+
+        # العدّادات تُعدَّل فقط من خيط حلقة الأحداث
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.max_queue
+
+    def acquire(self, jobs: int = 1) -> None:
+        """حجز مكان لعدد من المهام أو رفع PoolBusy إن لم يكن هناك متسع."""
+        if self.in_flight + jobs > self.capacity:
+            self.rejected += 1
+            raise PoolBusy()
+        self.in_flight += jobs
+
+    def run(
+        self,
+        fn: Callable,
+        *args: Any,
+        deadline: Optional[float] = None,
+        executor: Optional[Executor] = None
+    ) -> Awaitable[Any]:
+        """
+        إرسال fn(*args, deadline=deadline) إلى المجمّع فوراً، وانتظار نتيجته
+        بـ await. يجب حجز المكان مسبقاً بـ acquire؛ يتحرر حين تنتهي المهمة
+        نفسها لا حين يتوقف المنتظر، فإلغاء الطلب لا يحرر مكان مهمة ما زالت تعمل.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            job = (executor or self.executor).submit(_timed_call, time.time(), fn, args, deadline)
+        except Exception:
+            # لم تُرسل (المجمّع مغلق أو معطوب): المكان يتحرر الآن
+            self.in_flight -= 1
+            raise
+        job.add_done_callback(lambda done: self._on_done(loop, done))
+        return _result(asyncio.wrap_future(job, loop=loop))
+
+    def _on_done(self, loop: asyncio.AbstractEventLoop, job: Future) -> None:
+        # يُستدعى في خيط العامل (أو خيط الإلغاء): العدّادات تُعدَّل في خيط الحلقة
+        try:
+            loop.call_soon_threadsafe(self._finish, job)
+        except RuntimeError:
+            # الحلقة أُغلقت (إيقاف الخادم)
+            pass
+
+    def _finish(self, job: Future) -> None:
+        self.in_flight -= 1
+        if job.cancelled() or job.exception() is not None:
+            return
+        waited, result = job.result()
+        self.completed += 1
+        if _is_partial(result):
+            self.timeouts += 1
+        self.wait_total += waited
+        if waited > self.wait_max:
+            self.wait_max = waited
+
+    async def submit(self, fn: Callable, *args: Any, timeout: float = ANALYZE_TIMEOUT) -> Any:
+        """حجز + تنفيذ مهمة واحدة بمهلة timeout."""
+        self.acquire()
+        return await self.run(fn, *args, deadline=time.time() + timeout)
+
+    async def submit_local(self, fn: Callable, *args: Any) -> Any:
+        """
+        حجز + تنفيذ fn(*args) في خيط من هذه العملية حتى مع مجمّع العمليات،
+        لدوال تعدّل حالة محلية (مثل LiveSession)، بحد الطابور نفسه.
+        """
+        self.acquire()
+        if self._local is None:
+            self._local = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="meter-local")
+        return await self.run(fn, *args, executor=self._local)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """
+        عدّادات الذاكرة المؤقتة للنتائج: مجموع هذه العملية وكل عمّال العمليات
+        (كما نشرها كل عامل بعد آخر مهمة له). maxsize مجموع سعات العمليات.
+        """
+        stats = result_cache_stats()
+        stats["processes"] = 1
+        slots = self._cache_slots
+        if slots is None:
+            return stats
+        maxsize = stats["maxsize"]
+        for start in range(0, len(slots), _SLOT_WIDTH):
+            pid, *values = slots[start:start + _SLOT_WIDTH]
+            if not pid:
+                # عامل لم يبدأ بعد
+                continue
+            stats["processes"] += 1
+            stats["maxsize"] += maxsize
+            for key, value in zip(_CACHE_COUNTERS, values):
+                stats[key] += value
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queued": max(0, self.in_flight - self.workers),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "avg_wait_ms": round(1000 * self.wait_total / self.completed, 3) if self.completed else 0.0,
+            "max_wait_ms": round(1000 * self.wait_max, 3),
+        }
+
+
+_POOL: Optional[AnalysisPool] = None
+
+
+def get_pool() -> AnalysisPool:
+    global _POOL
+    if _POOL is None:
+        _POOL = AnalysisPool()
+    return _POOL
@@ -0,0 +1,248 @@
+"""
+محرك عروضي تقريبي: يحوّل البيت المطبّع إلى سلسلة متحرك/ساكن (1/0) ثم
+إلى مقاطع طويلة/قصيرة (L/S)، ويتعلم قوالب كل وزن من الأمثلة في شجرة
+بادئات (trie). التصنيف بحث في الشجرة بمسافة تحرير محدودة، فكلفته تعتمد
+على طول البيت ونصف القطر لا على حجم المدوّنة.
+
+ملاحظة: الكتابة بلا تشكيل، فالتقطيع هنا تقريبي (حروف المد سواكن، آخر
+الكلمة ساكن للوقف، ألف الوصل في "ال" تسقط)؛ لذلك لا نقبل نتيجته إلا
+عند ثقة عالية ونرجع بعدها للبحث بالتشابه.
+"""
+
+from __future__ import annotations
+
+import os
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from app.core.normalize import normalize_arabic
+
+_LONG_VOWELS = frozenset("اوي")
+
+# نصف قطر البحث في الشجرة (مسافة تحرير على المقاطع)
+PROSODY_MAX_DIST = int(os.environ.get("METER_PROSODY_MAX_DIST", "0"))
+# أقل دعم (عدد أمثلة مطابقة للوزن الفائز) وأقل حصة من الأصوات لقبول النتيجة
+PROSODY_MIN_SUPPORT = float(os.environ.get("METER_PROSODY_MIN_SUPPORT", "3"))
+PROSODY_MIN_SHARE = float(os.environ.get("METER_PROSODY_MIN_SHARE", "0.7"))
+
+
+def arud_bits(normalized: str) -> str:
+    """سلسلة متحرك (1) / ساكن (0) لنص مطبّع."""
+    bits: List[str] = []
+    for wi, word in enumerate(normalized.split()):
+        start = len(bits)
+        i = 0
+        if word.startswith("ال") and len(word) > 2:
+            # ألف الوصل تُنطق فقط في أول البيت، واللام (أو الحرف الشمسي) ساكنة
+            if wi == 0:
+                bits.append("1")
+            bits.append("0")
+            i = 2
+        for j in range(i, len(word)):
+            if word[j] in _LONG_VOWELS and j > 0 and bits and bits[-1] == "1":
+                bits.append("0")
+            else:
+                bits.append("1")
+        # الوقف: آخر الكلمة ساكن
+        if len(bits) - start > 1 and bits[-1] == "1":
+            bits[-1] = "0"
+    return "".join(bits)
+
+
+def syllables_from_bits(bits: str) -> str:
+    """1 ثم 0 = مقطع طويل (L)، 1 وحده = مقطع قصير (S)؛ الساكن الزائد يُهمل."""
+    out: List[str] = []
+    i = 0
+    n = len(bits)
+    while i < n:
+        if bits[i] == "1":
+            if i + 1 < n and bits[i + 1] == "0":
+                out.append("L")
+                i += 2
+            else:
+                out.append("S")
+                i += 1
+        else:
+            i += 1
+    return "".join(out)
+
+
+def syllable_pattern(text: str) -> str:
+    """نمط المقاطع L/S لبيت (يُطبَّع أولاً)."""
+    return syllables_from_bits(arud_bits(normalize_arabic(text, deep=False)))
+
+
+def align_positions(query: str, template: str) -> List[Optional[int]]:
+    """لكل مقطع من الاستعلام: موقعه المقابل في القالب (None = مقطع زائد)."""
+    m, n = len(query), len(template)
+    dp = [[0] * (n + 1) for _ in range(m + 1)]
+    for i in range(m + 1):
+        dp[i][0] = i
+    for j in range(n + 1):
+        dp[0][j] = j
+    for i in range(1, m + 1):
+        for j in range(1, n + 1):
+            dp[i][j] = min(
+                dp[i - 1][j] + 1,
+                dp[i][j - 1] + 1,
+                dp[i - 1][j - 1] + (query[i - 1] != template[j - 1]),
+            )
+    positions: List[Optional[int]] = [None] * m
+    i, j = m, n
+    while i > 0 and j > 0:
+        if dp[i][j] == dp[i - 1][j - 1] + (query[i - 1] != template[j - 1]):
+            positions[i - 1] = j - 1
+            i, j = i - 1, j - 1
+        elif dp[i][j] == dp[i - 1][j] + 1:
+            i -= 1
+        else:
+            j -= 1
+    return positions
+
+
+class _TrieNode:
+    __slots__ = ("kids", "weights", "examples")
+
+    def __init__(self):
+        self.kids: Dict[str, _TrieNode] = {}
+        # الوزن -> عدد الأمثلة بهذا القالب، وأول مثال لكل وزن
+        self.weights: Optional[Counter] = None
+        self.examples: Optional[Dict[str, str]] = None
+
+
+class ProsodyMatch:
+    __slots__ = ("weight", "score", "support", "distance", "template", "syllables", "positions", "example")
+
+    def __init__(self, weight: str, score: float, support: float, distance: int,
+                 template: str, syllables: str, positions: List[Optional[int]], example: str):
+        self.weight = weight
+        self.score = score
+        self.support = support
+        self.distance = distance
+        self.template = template
+        self.syllables = syllables
+        self.positions = positions
+        self.example = example
+
+    @property
+    def confident(self) -> bool:
+        return self.support >= PROSODY_MIN_SUPPORT and self.score >= PROSODY_MIN_SHARE
+
+
+class ProsodyEngine:
+    """قوالب المقاطع لكل وزن في شجرة بادئات واحدة."""
+
+    def __init__(self, candidates: List[Tuple[str, str]] = ()):
+        self.root = _TrieNode()
+        self.templates = 0
+        for weight, text in candidates:
+            self.add(weight, text)
+
+    def add(self, weight: str, text: str, pattern: Optional[str] = None) -> None:
+        if pattern is None:
+            pattern = syllable_pattern(text)
+        if not pattern:
+            return
+        node = self.root
+        for c in pattern:
+            child = node.kids.get(c)
+            if child is None:
+                child = node.kids[c] = _TrieNode()
+            node = child
+        if node.weights is None:
+            node.weights = Counter()
+            node.examples = {}
+            self.templates += 1
+        node.weights[weight] += 1
+        node.examples.setdefault(weight, text)
+
+    def remove(self, weight: str, text: str, pattern: Optional[str] = None,
+               replacement: Optional[str] = None) -> None:
+        """
+        عكس add. إن كان text هو المثال المعروض لهذا الوزن في القالب نضع
+        replacement مكانه (مثال آخر من الوزن نفسه بالقالب نفسه).
+        """
+        if pattern is None:
+            pattern = syllable_pattern(text)
+        node = self.root
+        for c in pattern:
+            node = node.kids.get(c)
+            if node is None:
+                return
+        if not node.weights or weight not in node.weights:
+            return
+        node.weights[weight] -= 1
+        if node.weights[weight] <= 0:
+            del node.weights[weight]
+            del node.examples[weight]
+        elif node.examples.get(weight) == text and replacement is not None:
+            node.examples[weight] = replacement
+        if not node.weights:
+            node.weights = None
+            node.examples = None
+            self.templates -= 1
+
+    def search(self, pattern: str, max_dist: int) -> List[Tuple[int, str, _TrieNode]]:
+        """كل القوالب ضمن مسافة تحرير max_dist (بحث في الشجرة مع صف DP وتقليم)."""
+        results: List[Tuple[int, str, _TrieNode]] = []
+        if max_dist <= 0:
+            # تطابق تام: مسار واحد في الشجرة
+            node = self.root
+            for c in pattern:
+                node = node.kids.get(c)
+                if node is None:
+                    return results
+            if node.weights:
+                results.append((0, pattern, node))
+            return results
+        m = len(pattern)
+        stack = [(self.root, "", list(range(m + 1)))]
+        while stack:
+            node, path, row = stack.pop()
+            if node.weights and row[m] <= max_dist:
+                results.append((row[m], path, node))
+            if min(row) > max_dist:
+                continue
+            for c, child in node.kids.items():
+                new_row = [row[0] + 1]
+                for j in range(1, m + 1):
+                    new_row.append(min(
+                        new_row[j - 1] + 1,
+                        row[j] + 1,
+                        row[j - 1] + (pattern[j - 1] != c),
+                    ))
+                stack.append((child, path + c, new_row))
+        return results
+
+    def classify(self, text: str, max_dist: Optional[int] = None) -> Optional[ProsodyMatch]:
+        """
+        تصويت القوالب القريبة (كل مثال بصوت 1/(1+المسافة)).
+        score = حصة الوزن الفائز من الأصوات؛ support = أصواته.
+        """
+        if max_dist is None:
+            max_dist = PROSODY_MAX_DIST
+        pattern = syllable_pattern(text)
+        if not pattern:
+            return None
+        votes: Counter = Counter()
+        best_for: Dict[str, Tuple[int, str, _TrieNode]] = {}
+        for dist, template, node in self.search(pattern, max_dist):
+            for weight, count in node.weights.items():
+                votes[weight] += count / (1 + dist)
+                current = best_for.get(weight)
+                if current is None or dist < current[0]:
+                    best_for[weight] = (dist, template, node)
+        if not votes:
+            return None
+        weight, support = votes.most_common(1)[0]
+        dist, template, node = best_for[weight]
+        return ProsodyMatch(
+            weight=weight,
+            score=support / sum(votes.values()),
+            support=support,
+            distance=dist,
+            template=template,
+            syllables=pattern,
+            positions=align_positions(pattern, template),
+            example=node.examples.get(weight, ""),
+        )
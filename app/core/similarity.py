@@ -4,21 +4,23 @@
 
 from __future__ import annotations
 
+import itertools
 import math
 import re
 from collections import Counter, defaultdict
-from typing import List, Set, Dict, Tuple, Optional
+from typing import Iterator, List, Mapping, Set, Dict, Tuple, Optional, Sequence
 from difflib import SequenceMatcher
 
-from app.core.normalize import normalize_arabic, tokenize, char_ngrams, word_ngrams
+from app.core.normalize import normalize_arabic, normalize_text, tokenize, char_ngrams, word_ngrams
 
 # -------------------------------------------------------------
 # 1. مقاييس المسافة الأساسية
 # -------------------------------------------------------------
 
-def levenshtein_distance(s1: str, s2: str) -> int:
+def _levenshtein_distance_dp(s1: str, s2: str) -> int:
+    """النسخة المرجعية (برمجة ديناميكية صفاً بصف)، تُستخدم في الاختبار الذاتي."""
     if len(s1) < len(s2):
-        return levenshtein_distance(s2, s1)
+        return _levenshtein_distance_dp(s2, s1)
     if not s2:
         return len(s1)
     previous_row = range(len(s2) + 1)
@@ -32,6 +34,69 @@ def levenshtein_distance(s1: str, s2: str) -> int:
         previous_row = current_row
     return previous_row[-1]
 
+def _peq_table(pattern: str) -> Dict[str, int]:
+    """لكل حرف: قناع بتات بمواقعه في النمط."""
+    peq: Dict[str, int] = {}
+    bit = 1
+    for c in pattern:
+        peq[c] = peq.get(c, 0) | bit
+        bit <<= 1
+    return peq
+
+def _myers_distance(pattern: str, text: str, max_dist: Optional[int] = None) -> int:
+    """
+    مسافة Levenshtein بالتوازي على مستوى البتات (Myers/Hyyrö): عمود كامل
+    من مصفوفة DP في عدد صحيح واحد لكل حرف من text.
+    أعداد بايثون غير محدودة العرض، فالأبيات الأطول من كلمة آلة (64 حرفاً)
+    تعمل تلقائياً بأعداد متعددة الكلمات.
+    max_dist: نتوقف ونعيد max_dist + 1 عندما يتأكد تجاوز الحد.
+    """
+    m = len(pattern)
+    n = len(text)
+    if m == 0:
+        return n
+    peq = _peq_table(pattern)
+    mask = (1 << m) - 1
+    last = 1 << (m - 1)
+    pv = mask
+    mv = 0
+    score = m
+    for j, c in enumerate(text, 1):
+        eq = peq.get(c, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | ~(xh | pv)
+        mh = pv & xh
+        if ph & last:
+            score += 1
+        elif mh & last:
+            score -= 1
+        # كل حرف متبقٍ يقلل المسافة بواحد على الأكثر
+        if max_dist is not None and score - (n - j) > max_dist:
+            return max_dist + 1
+        ph = (ph << 1) | 1
+        mh <<= 1
+        pv = (mh | ~(xv | ph)) & mask
+        mv = ph & xv & mask
+    return score
+
+def levenshtein_distance(s1: str, s2: str) -> int:
+    if len(s1) > len(s2):
+        s1, s2 = s2, s1
+    return _myers_distance(s1, s2)
+
+def levenshtein_distance_bounded(s1: str, s2: str, max_dist: int) -> int:
+    """
+    مسافة Levenshtein مع حد أعلى: نتوقف مبكراً بمجرد تجاوز الحد،
+    ونعيد max_dist + 1 في هذه الحالة.
+    """
+    if len(s1) > len(s2):
+        s1, s2 = s2, s1
+    if len(s2) - len(s1) > max_dist:
+        return max_dist + 1
+    dist = _myers_distance(s1, s2, max_dist)
+    return dist if dist <= max_dist else max_dist + 1
+
 def levenshtein_ratio(s1: str, s2: str) -> float:
     if not s1 and not s2:
         return 1.0
@@ -42,8 +107,7 @@ def levenshtein_ratio(s1: str, s2: str) -> float:
     return 1.0 - (dist / max_len)
 
 def jaccard_similarity(set1: Set, set2: Set) -> float:
-    if not set1 and not set2:
-        return 1.0
+    # مجموعة فارغة لا تشترك في شيء، ولو كانت الأخرى فارغة أيضاً (كما في مرحلة الحجب)
     if not set1 or not set2:
         return 0.0
     inter = len(set1 & set2)
@@ -77,24 +141,121 @@ def word_ngram_jaccard(text1: str, text2: str, n: int = 2) -> float:
 def sequence_matcher_ratio(text1: str, text2: str) -> float:
     return SequenceMatcher(None, text1, text2).ratio()
 
+def sequence_index(b: str) -> Dict[str, List[int]]:
+    """
+    جدول b2j كما يبنيه SequenceMatcher (بدون junk، مع حذف العناصر الشائعة
+    عند len(b) >= 200)، ليُحسب مرة واحدة لكل مثال.
+    """
+    b2j: Dict[str, List[int]] = {}
+    for i, elt in enumerate(b):
+        b2j.setdefault(elt, []).append(i)
+    n = len(b)
+    if n >= 200:
+        ntest = n // 100 + 1
+        for elt in [elt for elt, idxs in b2j.items() if len(idxs) > ntest]:
+            del b2j[elt]
+    return b2j
+
+def _longest_match(a: str, b: str, b2j: Dict[str, List[int]],
+                   alo: int, ahi: int, blo: int, bhi: int) -> Tuple[int, int, int]:
+    """نفس SequenceMatcher.find_longest_match بدون junk."""
+    besti, bestj, bestsize = alo, blo, 0
+    j2len: Dict[int, int] = {}
+    nothing: List[int] = []
+    for i in range(alo, ahi):
+        j2lenget = j2len.get
+        newj2len: Dict[int, int] = {}
+        for j in b2j.get(a[i], nothing):
+            if j < blo:
+                continue
+            if j >= bhi:
+                break
+            k = newj2len[j] = j2lenget(j - 1, 0) + 1
+            if k > bestsize:
+                besti, bestj, bestsize = i - k + 1, j - k + 1, k
+        j2len = newj2len
+    # العناصر الشائعة ليست في b2j: نمدد المطابقة على الطرفين
+    while besti > alo and bestj > blo and a[besti - 1] == b[bestj - 1]:
+        besti, bestj, bestsize = besti - 1, bestj - 1, bestsize + 1
+    while besti + bestsize < ahi and bestj + bestsize < bhi and \
+            a[besti + bestsize] == b[bestj + bestsize]:
+        bestsize += 1
+    return besti, bestj, bestsize
+
+def gestalt_ratio(a: str, b: str, b2j: Optional[Dict[str, List[int]]] = None) -> float:
+    """
+    نفس SequenceMatcher(None, a, b).ratio() بالضبط (خوارزمية Ratcliff/Obershelp)،
+    لكن بدون بناء كائن لكل زوج، ومع b2j محسوب مسبقاً للمثال.
+    """
+    if b2j is None:
+        b2j = sequence_index(b)
+    la, lb = len(a), len(b)
+    matches = 0
+    queue = [(0, la, 0, lb)]
+    while queue:
+        alo, ahi, blo, bhi = queue.pop()
+        i, j, k = _longest_match(a, b, b2j, alo, ahi, blo, bhi)
+        if k:
+            matches += k
+            if alo < i and blo < j:
+                queue.append((alo, i, blo, j))
+            if i + k < ahi and j + k < bhi:
+                queue.append((i + k, ahi, j + k, bhi))
+    length = la + lb
+    if length:
+        return 2.0 * matches / length
+    return 1.0
+
+def lcs_length(s1: str, s2: str) -> int:
+    """طول أطول تتابع مشترك بالتوازي على مستوى البتات (Allison-Dix/Hyyrö)."""
+    if len(s1) > len(s2):
+        s1, s2 = s2, s1
+    m = len(s1)
+    if m == 0:
+        return 0
+    peq = _peq_table(s1)
+    mask = (1 << m) - 1
+    v = mask
+    for c in s2:
+        u = v & peq.get(c, 0)
+        v = ((v + u) | (v - u)) & mask
+    return m - v.bit_count()
+
+def lcs_ratio(text1: str, text2: str) -> float:
+    """
+    2·LCS / (len1 + len2). لا يساوي SequenceMatcher دائماً (Ratcliff/Obershelp
+    لا يجد أطول تتابع مشترك)، لكنه حد أعلى له: lcs_ratio >= sequence_matcher_ratio.
+    """
+    length = len(text1) + len(text2)
+    if not length:
+        return 1.0
+    return 2.0 * lcs_length(text1, text2) / length
+
 # -------------------------------------------------------------
 # 3. تشابه عروضي تقريبي (اختياري)
 # -------------------------------------------------------------
 
-def simple_syllabic_pattern(text: str) -> List[int]:
-    """نمط بسيط: كل حرف علة (ا و ي) يبدأ مقطعاً."""
-    t = normalize_arabic(text, deep=False)
-    vowels = set('اوي')
+_SYLLABIC_VOWELS = frozenset('اوي')
+
+# نصف عرض شريط Sakoe-Chiba في DTW (بعدد العناصر حول القطر)؛ -1 = بلا شريط
+DTW_BAND = 2
+
+def syllabic_counts(normalized: str) -> Tuple[int, ...]:
+    """simple_syllabic_pattern لنص مطبّع مسبقاً."""
     pattern = []
     count = 0
-    for ch in t:
+    for ch in normalized:
         count += 1
-        if ch in vowels:
+        if ch in _SYLLABIC_VOWELS:
             pattern.append(count)
             count = 0
     if count > 0:
         pattern.append(count)
-    return pattern
+    return tuple(pattern)
+
+def simple_syllabic_pattern(text: str) -> List[int]:
+    """نمط بسيط: كل حرف علة (ا و ي) يبدأ مقطعاً."""
+    return list(syllabic_counts(normalize_arabic(text, deep=False)))
 
 def dtw_distance(seq1: List[int], seq2: List[int]) -> float:
     if not seq1 or not seq2:
@@ -112,6 +273,103 @@ def dtw_distance(seq1: List[int], seq2: List[int]) -> float:
             dtw[i][j] = cost + min(dtw[i-1][j], dtw[i][j-1], dtw[i-1][j-1])
     return dtw[m][n] / max(m, n)
 
+def _band_width(m: int, n: int, band: int) -> int:
+    # يُوسَّع الشريط عند اختلاف الطولين كي يبقى المسار من (1,1) إلى (m,n) ممكناً
+    if band < 0:
+        return max(m, n)
+    return max(band, -(-n // m))
+
+def dtw_distance_banded(
+    seq1: Sequence[int],
+    seq2: Sequence[int],
+    band: int = DTW_BAND,
+    cutoff: Optional[float] = None
+) -> float:
+    """
+    dtw_distance مقيّدة بشريط Sakoe-Chiba حول القطر j ≈ i·n/m، على صفّين
+    مسطّحين بدل مصفوفة كاملة. band=-1 يعطي نفس قيمة dtw_distance.
+    cutoff: حد للمسافة المطبّعة؛ إن تجاوزه صف كامل نتوقف ونعيد inf.
+    """
+    if not seq1 or not seq2:
+        return float('inf')
+    m, n = len(seq1), len(seq2)
+    r = _band_width(m, n, band)
+    inf = float('inf')
+    limit = inf if cutoff is None else cutoff * max(m, n)
+    prev = [inf] * (n + 1)
+    prev[0] = 0.0
+    cur = [inf] * (n + 1)
+    for i in range(1, m + 1):
+        # نافذة الصف: الأعمدة ضمن r من القطر (حساب صحيح بلا فاصلة عائمة)
+        lo = max(1, -((r * m - i * n) // m))
+        hi = min(n, (i * n + r * m) // m)
+        a = seq1[i - 1]
+        # النوافذ تتحرك يميناً فقط: يكفي مسح الخلية قبل النافذة
+        cur[lo - 1] = inf
+        left = inf
+        row_min = inf
+        for j in range(lo, hi + 1):
+            best = prev[j - 1]
+            up = prev[j]
+            if up < best:
+                best = up
+            if left < best:
+                best = left
+            left = abs(a - seq2[j - 1]) + best
+            cur[j] = left
+            if left < row_min:
+                row_min = left
+        if row_min > limit:
+            return inf
+        prev, cur = cur, prev
+    return prev[n] / max(m, n)
+
+def dtw_envelope(query: Sequence[int], n: int, band: int = DTW_BAND) -> Tuple[List[int], List[int]]:
+    """
+    غلاف الاستعلام (أعلى، أدنى) لكل عمود من مرشح طوله n ضمن نفس شريط
+    dtw_distance_banded. يعتمد على الطول فقط، فيُحسب مرة لكل طول.
+    """
+    m = len(query)
+    r = _band_width(m, n, band)
+    upper: List[int] = []
+    lower: List[int] = []
+    for j in range(1, n + 1):
+        # الصفوف i التي يقع العمود j ضمن r من قطرها: |j - i·n/m| <= r
+        lo = max(1, -(((r - j) * m) // n))
+        hi = min(m, ((j + r) * m) // n)
+        window = query[lo - 1:hi]
+        upper.append(max(window))
+        lower.append(min(window))
+    return upper, lower
+
+def lb_keogh(seq: Sequence[int], envelope: Tuple[List[int], List[int]]) -> int:
+    """
+    حد أدنى (LB_Keogh) لمسافة dtw_distance_banded قبل القسمة على max(m, n):
+    كل عمود يمر به المسار مرة على الأقل داخل الشريط، فكلفته لا تقل عن بعده
+    عن غلاف الاستعلام.
+    """
+    upper, lower = envelope
+    total = 0
+    for x, u, l in zip(seq, upper, lower):
+        if x > u:
+            total += x - u
+        elif x < l:
+            total += l - x
+    return total
+
+def pattern_similarity(
+    p1: Sequence[int],
+    p2: Sequence[int],
+    band: int = -1,
+    cutoff: Optional[float] = None
+) -> float:
+    """syllabic_similarity على أنماط محسوبة مسبقاً (band=-1: نفس القيمة بالضبط)."""
+    if not p1 and not p2:
+        return 1.0
+    if not p1 or not p2:
+        return 0.0
+    return 1.0 / (1.0 + dtw_distance_banded(p1, p2, band, cutoff))
+
 def syllabic_similarity(text1: str, text2: str) -> float:
     p1 = simple_syllabic_pattern(text1)
     p2 = simple_syllabic_pattern(text2)
@@ -126,21 +384,69 @@ def syllabic_similarity(text1: str, text2: str) -> float:
 # 4. TF-IDF Vectorizer حقيقي
 # -------------------------------------------------------------
 
+class _Idf(Mapping):
+    """
+    idf كل كلمة يُحسب عند الطلب من df وعدد الوثائق، فلا يُعاد حساب القاموس كله مع كل تعديل.
+    without: وثيقة يُحسب idf كأنها محذوفة (leave-one-out دون تعديل df).
+    """
+
+    def __init__(self, vectorizer: "TfidfVectorizer", without: Optional[str] = None):
+        self.vectorizer = vectorizer
+        self.without = frozenset(tokenize(without)) if without is not None else frozenset()
+        self.docs_removed = int(without is not None)
+
+    def _df(self, w: str) -> float:
+        return self.vectorizer.df.get(w, 0.0) - (w in self.without)
+
+    def __getitem__(self, w: str) -> float:
+        df = self._df(w)
+        if df <= 0:
+            raise KeyError(w)
+        return math.log((self.vectorizer.doc_count - self.docs_removed) / (1.0 + df)) + 1.0
+
+    def __contains__(self, w) -> bool:
+        return self._df(w) > 0
+
+    def __len__(self) -> int:
+        return len(self.vectorizer.df) - sum(1 for w in self.without if self._df(w) <= 0)
+
+    def __iter__(self) -> Iterator[str]:
+        return (w for w in self.vectorizer.df if self._df(w) > 0)
+
+
 class TfidfVectorizer:
     def __init__(self, corpus: List[str]):
         self.corpus = corpus
         self.doc_count = len(corpus)
-        self.idf = self._compute_idf()
-
-    def _compute_idf(self):
-        idf = defaultdict(float)
+        # عدد الوثائق لكل كلمة؛ يتغير مع add_document / remove_document
+        self.df: Dict[str, float] = defaultdict(float)
+        # يزيد مع كل تغيير في idf (لتحديث متجهات الأمثلة المحسوبة مسبقاً)
+        self.generation = 0
         for doc in self.corpus:
-            words = set(tokenize(doc))
-            for w in words:
-                idf[w] += 1.0
-        for w in idf:
-            idf[w] = math.log(self.doc_count / (1.0 + idf[w])) + 1.0
-        return dict(idf)
+            for w in set(tokenize(doc)):
+                self.df[w] += 1.0
+        self.idf: Mapping[str, float] = _Idf(self)
+
+    def add_document(self, doc: str) -> None:
+        """إضافة وثيقة: تحديث df بكلفة كلماتها (idf يُحسب عند الطلب)."""
+        self.corpus.append(doc)
+        self.doc_count += 1
+        for w in set(tokenize(doc)):
+            self.df[w] += 1.0
+        self.generation += 1
+
+    def remove_document(self, doc: str) -> None:
+        self.corpus.remove(doc)
+        self.doc_count -= 1
+        for w in set(tokenize(doc)):
+            self.df[w] -= 1.0
+            if self.df[w] <= 0:
+                del self.df[w]
+        self.generation += 1
+
+    def idf_without(self, doc: str) -> Mapping[str, float]:
+        """idf كأن الوثيقة doc محذوفة من المدوّنة."""
+        return _Idf(self, doc)
 
     def tf(self, text: str) -> Dict[str, float]:
         words = tokenize(text)
@@ -150,12 +456,14 @@ class TfidfVectorizer:
         cnt = Counter(words)
         return {w: c/total for w, c in cnt.items()}
 
-    def vector(self, text: str) -> Dict[str, float]:
+    def vector(self, text: str, idf: Optional[Mapping[str, float]] = None) -> Dict[str, float]:
+        if idf is None:
+            idf = self.idf
         tf = self.tf(text)
         vec = {}
         for w, tfv in tf.items():
-            if w in self.idf:
-                vec[w] = tfv * self.idf[w]
+            if w in idf:
+                vec[w] = tfv * idf[w]
         return vec
 
     def similarity(self, text: str, profile_text: str) -> float:
@@ -168,6 +476,28 @@ class TfidfVectorizer:
 # 5. دمج المقاييس
 # -------------------------------------------------------------
 
+_DEFAULT_WEIGHTS = {
+    'levenshtein': 0.25,
+    'jaccard_words': 0.15,
+    'jaccard_char3': 0.20,
+    'jaccard_word2': 0.15,
+    'sequence': 0.15,
+    'syllabic': 0.10,
+}
+
+def weighted_score(sims: Dict[str, float], weights: Optional[Dict[str, float]] = None) -> float:
+    """متوسط موزون لدرجات المقاييس (بنفس ترتيب المفاتيح)."""
+    if weights is None:
+        weights = _DEFAULT_WEIGHTS
+    total_weight = 0.0
+    result = 0.0
+    for key, val in sims.items():
+        w = weights.get(key, 0.0)
+        result += val * w
+        total_weight += w
+
+    return result / total_weight if total_weight > 0 else 0.0
+
 def combined_similarity(
     text1: str,
     text2: str,
@@ -180,14 +510,7 @@ def combined_similarity(
     weights: Optional[Dict[str, float]] = None
 ) -> float:
     if weights is None:
-        weights = {
-            'levenshtein': 0.25,
-            'jaccard_words': 0.15,
-            'jaccard_char3': 0.20,
-            'jaccard_word2': 0.15,
-            'sequence': 0.15,
-            'syllabic': 0.10,
-        }
+        weights = _DEFAULT_WEIGHTS
     sims = {}
     if use_lev:
         sims['levenshtein'] = levenshtein_ratio(text1, text2)
@@ -202,25 +525,82 @@ def combined_similarity(
     if use_syllabic:
         sims['syllabic'] = syllabic_similarity(text1, text2)
 
-    total_weight = 0.0
-    result = 0.0
-    for key, val in sims.items():
-        w = weights.get(key, 0.0)
-        result += val * w
-        total_weight += w
+    return weighted_score(sims, weights)
 
-    return result / total_weight if total_weight > 0 else 0.0
+class TextFeatures:
+    """
+    خصائص نص محسوبة مرة واحدة (كلمات، n-grams حرفية وكلامية، نمط المقاطع)،
+    حتى لا يُعاد التطبيع عند كل مقارنة.
+    """
+    __slots__ = ("text", "words", "char3", "word2", "b2j", "syllabic")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.b2j = sequence_index(text)
+        normalized = normalize_text(text)
+        self.words = normalized.token_set
+        self.char3 = normalized.char_ngrams(3)
+        self.word2 = normalized.word_ngrams(2)
+        self.syllabic = syllabic_counts(normalized.text)
+
+def similarity_breakdown(
+    f1: TextFeatures,
+    f2: TextFeatures,
+    use_lev: bool = True,
+    use_jaccard_words: bool = True,
+    use_jaccard_char3: bool = True,
+    use_jaccard_word2: bool = True,
+    use_sequence: bool = True,
+    use_syllabic: bool = False
+) -> Dict[str, float]:
+    """درجة كل مقياس على حدة (قبل الدمج) لخصائص محسوبة مسبقاً."""
+    sims = {}
+    if use_lev:
+        sims['levenshtein'] = levenshtein_ratio(f1.text, f2.text)
+    if use_jaccard_words:
+        sims['jaccard_words'] = jaccard_similarity(f1.words, f2.words)
+    if use_jaccard_char3:
+        sims['jaccard_char3'] = jaccard_similarity(f1.char3, f2.char3)
+    if use_jaccard_word2:
+        sims['jaccard_word2'] = jaccard_similarity(f1.word2, f2.word2)
+    if use_sequence:
+        sims['sequence'] = gestalt_ratio(f1.text, f2.text, f2.b2j)
+    if use_syllabic:
+        sims['syllabic'] = pattern_similarity(f1.syllabic, f2.syllabic)
+    return sims
+
+def combined_similarity_features(
+    f1: TextFeatures,
+    f2: TextFeatures,
+    use_lev: bool = True,
+    use_jaccard_words: bool = True,
+    use_jaccard_char3: bool = True,
+    use_jaccard_word2: bool = True,
+    use_sequence: bool = True,
+    use_syllabic: bool = False,
+    weights: Optional[Dict[str, float]] = None
+) -> float:
+    """نفس combined_similarity لكن على خصائص محسوبة مسبقاً (نفس النتيجة بالضبط)."""
+    if weights is None:
+        weights = _DEFAULT_WEIGHTS
+    sims = similarity_breakdown(
+        f1, f2, use_lev, use_jaccard_words, use_jaccard_char3,
+        use_jaccard_word2, use_sequence, use_syllabic
+    )
+    return weighted_score(sims, weights)
 
 # -------------------------------------------------------------
 # 6. البحث عن أفضل تطابق
 # -------------------------------------------------------------
 
 class BestMatch:
-    def __init__(self, score: float, example: str, weight: str, method: str):
+    def __init__(self, score: float, example: str, weight: str, method: str, partial: bool = False):
         self.score = score
         self.example = example
         self.weight = weight
         self.method = method
+        # True إذا انتهت المهلة قبل فحص كل المرشحين (أفضل نتيجة حتى الآن)
+        self.partial = partial
 
 def find_best_match(
     text: str,
@@ -258,3 +638,61 @@ def find_best_match(
                 best.method = "weight_tfidf"
 
     return best
+
+
+# -------------------------------------------------------------
+# 7. اختبار ذاتي للخوارزميات السريعة مقابل المرجعية
+# -------------------------------------------------------------
+
+def self_test(texts: List[str], max_pairs: Optional[int] = None) -> Dict[str, float]:
+    """
+    يقارن على أزواج الأمثلة (كلها، أو أول max_pairs):
+    - levenshtein_distance (Myers) مقابل البرمجة الديناميكية: يجب ألا يختلفا أبداً.
+    - gestalt_ratio مقابل difflib.SequenceMatcher: يجب ألا يختلفا أبداً.
+    - lcs_ratio: نسبة الأزواج التي يساوي فيها SequenceMatcher، ويجب ألا يقل عنه أبداً.
+    - dtw_distance_banded بلا شريط مقابل dtw_distance: يجب ألا يختلفا أبداً؛
+      ومع DTW_BAND: نسبة الأزواج المساوية، وLB_Keogh يجب ألا يتجاوزها أبداً.
+      dtw_pairs: عدد الأزواج التي لها مقاطع في الطرفين (التي فُحص عليها DTW).
+    """
+    patterns = {t: syllabic_counts(normalize_arabic(t, deep=False)) for t in texts}
+    pairs = itertools.combinations(texts, 2)
+    if max_pairs is not None:
+        pairs = itertools.islice(pairs, max_pairs)
+    total = lev_mismatch = gestalt_mismatch = lcs_equal = lcs_below = 0
+    dtw_pairs = dtw_mismatch = band_equal = lb_above = 0
+    for a, b in pairs:
+        total += 1
+        if levenshtein_distance(a, b) != _levenshtein_distance_dp(a, b):
+            lev_mismatch += 1
+        reference = sequence_matcher_ratio(a, b)
+        if gestalt_ratio(a, b) != reference:
+            gestalt_mismatch += 1
+        lcs = lcs_ratio(a, b)
+        if lcs == reference:
+            lcs_equal += 1
+        elif lcs < reference:
+            lcs_below += 1
+        p1, p2 = patterns[a], patterns[b]
+        if p1 and p2:
+            dtw_pairs += 1
+            full = dtw_distance(list(p1), list(p2))
+            if dtw_distance_banded(p1, p2, -1) != full:
+                dtw_mismatch += 1
+            banded = dtw_distance_banded(p1, p2)
+            if banded == full:
+                band_equal += 1
+            if lb_keogh(p2, dtw_envelope(p1, len(p2))) / max(len(p1), len(p2)) > banded:
+                lb_above += 1
+        else:
+            band_equal += 1
+    return {
+        "pairs": total,
+        "levenshtein_mismatches": lev_mismatch,
+        "gestalt_mismatches": gestalt_mismatch,
+        "lcs_equal_fraction": lcs_equal / total if total else 1.0,
+        "lcs_below_sequence_matcher": lcs_below,
+        "dtw_pairs": dtw_pairs,
+        "dtw_mismatches": dtw_mismatch,
+        "dtw_band_equal_fraction": band_equal / total if total else 1.0,
+        "lb_keogh_violations": lb_above,
+    }
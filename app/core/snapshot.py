@@ -0,0 +1,513 @@
+"""
+لقطة ثنائية لفهرس الأمثلة تُبنى مرة واحدة (python -m app.cli build-index)
+وتُحمَّل بـ mmap، فيتشارك كل العمّال نسخة واحدة من صفحات الملف في ذاكرة
+النظام، ويصبح الإقلاع فتح ملف بدل تحليل JSON وإعادة التطبيع.
+
+الملف: توقيع + رقم إصدار الصيغة + ترويسة JSON (بصمة sha256 لملف الأمثلة،
+أسماء الأوزان، جدول الأقسام) ثم أقسام مصفوفات مسطّحة (array) مصفوفة على 8
+بايت. النصوص كتلة UTF-8 مع مصفوفة إزاحات، والكلمات والـ n-grams لها أرقام
+ثابتة (interned)، والفهارس المقلوبة ومتجهات TF-IDF بصيغة CSR.
+إن تغيّر ملف الأمثلة (البصمة) أو الصيغة نرجع للبناء من JSON.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import mmap
+import os
+import sys
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from app.core.index import CorpusIndex, IndexedExample, _idf_offset
+from app.core.lsh import MinHashLSH, gram_hash
+from app.core.prosody import ProsodyEngine
+from app.core.similarity import TfidfVectorizer
+from app.core.vectorized import HAVE_NUMPY, VectorEngine, _BinaryMatrix
+
+FORMAT_VERSION = 2
+_MAGIC = b"IPMSNAP\0"
+_ALIGN = 8
+
+
+def file_checksum(path: str) -> str:
+    """sha256 لملف (قراءة على دفعات)."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def term_hash(term: str) -> int:
+    """تجزئة 64 بت ثابتة بين العمليات (بخلاف hash() للنصوص)."""
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+
+
+# -------------------------------------------------------------
+# الكتابة
+# -------------------------------------------------------------
+
+class _Writer:
+    def __init__(self):
+        self.sections: Dict[str, Tuple[str, bytes]] = {}
+
+    def add(self, name: str, typecode: str, values) -> None:
+        self.sections[name] = (typecode, array(typecode, values).tobytes())
+
+    def add_strings(self, name: str, strings: Sequence[str]) -> None:
+        offsets = [0]
+        blob = bytearray()
+        for s in strings:
+            blob += s.encode("utf-8")
+            offsets.append(len(blob))
+        self.add(name + ".off", "q", offsets)
+        self.sections[name + ".blob"] = ("B", bytes(blob))
+
+    def add_terms(self, name: str, terms: Sequence[str]) -> None:
+        """قاموس مصطلحات: النصوص بأرقامها + جدول تجزئة مرتب للبحث."""
+        self.add_strings(name, terms)
+        order = sorted(range(len(terms)), key=lambda i: term_hash(terms[i]))
+        self.add(name + ".hash", "q", [term_hash(terms[i]) for i in order])
+        self.add(name + ".order", "i", order)
+
+    def add_csr(self, name: str, rows: Sequence[Sequence[int]], typecode: str = "i", values=None) -> None:
+        indptr = [0]
+        indices: List[int] = []
+        for row in rows:
+            indices.extend(row)
+            indptr.append(len(indices))
+        self.add(name + ".ptr", "q", indptr)
+        self.add(name + ".idx", typecode, indices)
+        if values is not None:
+            self.add(name + ".val", "d", [v for row in values for v in row])
+
+    def write(self, path: str, header: Dict[str, Any]) -> None:
+        table = {}
+        offset = 0
+        for name, (typecode, data) in self.sections.items():
+            table[name] = [offset, typecode, len(data)]
+            offset += len(data) + (-len(data)) % _ALIGN
+        header = dict(header, sections=table)
+        head = json.dumps(header, ensure_ascii=False).encode("utf-8")
+        prefix = _MAGIC + FORMAT_VERSION.to_bytes(4, "little") + len(head).to_bytes(4, "little") + head
+        prefix += b"\0" * ((-len(prefix)) % _ALIGN)
+
+        # كتابة ذرية: ملف مؤقت ثم استبدال، فلا يقرأ عامل لقطة ناقصة
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(prefix)
+            for typecode, data in self.sections.values():
+                f.write(data)
+                f.write(b"\0" * ((-len(data)) % _ALIGN))
+        os.replace(tmp, path)
+
+
+def _intern(sets: Sequence[frozenset]) -> Tuple[List[str], List[List[int]], List[List[int]]]:
+    """أرقام ثابتة للمصطلحات (بترتيب الظهور) + الصفوف بالأرقام + الفهرس المقلوب."""
+    ids: Dict[str, int] = {}
+    rows = []
+    for terms in sets:
+        rows.append(sorted(ids.setdefault(t, len(ids)) for t in terms))
+    postings: List[List[int]] = [[] for _ in ids]
+    for i, row in enumerate(rows):
+        for t in row:
+            postings[t].append(i)
+    return list(ids), rows, postings
+
+
+def write_snapshot(
+    index: CorpusIndex,
+    path: str,
+    source_checksum: str,
+    weights: Sequence[str]
+) -> Dict[str, Any]:
+    """
+    كتابة لقطة لفهرس مبني من JSON.
+    weights: كل أسماء الأوزان في ملف الأمثلة (حتى التي بلا أمثلة).
+    """
+    entries = index.entries
+    weight_ids = {w: i for i, w in enumerate(weights)}
+    w = _Writer()
+    w.add("entry.weight", "i", [weight_ids[e.weight] for e in entries])
+    w.add_strings("text", [e.text for e in entries])
+    w.add_strings("light", [e.light for e in entries])
+    w.add_strings("deep", [e.deep for e in entries])
+    w.add_strings("syllables", [e.syllables for e in entries])
+
+    for kind in ("light", "deep"):
+        first: Dict[str, int] = {}
+        buckets: Dict[int, List[int]] = defaultdict(list)
+        for i, e in enumerate(entries):
+            compact = e.compact_light if kind == "light" else e.compact_deep
+            first.setdefault(compact, i)
+            buckets[len(compact)].append(i)
+        pairs = sorted((term_hash(c), i) for c, i in first.items())
+        w.add("exact_%s.hash" % kind, "q", [h for h, _ in pairs])
+        w.add("exact_%s.id" % kind, "i", [i for _, i in pairs])
+        lengths = sorted(buckets)
+        w.add("bucket_%s.len" % kind, "i", lengths)
+        w.add_csr("bucket_%s" % kind, [buckets[n] for n in lengths])
+
+    interned = {}
+    for name in ("char3", "words", "word2"):
+        terms, rows, postings = interned[name] = _intern([getattr(e.features, name) for e in entries])
+        w.add_terms(name, terms)
+        w.add_csr(name + ".post", postings)
+        w.add(name + ".size", "i", [len(r) for r in rows])
+    # الصفوف الأمامية وcrc لكل n-gram: لبناء جداول LSH دون فك النصوص
+    terms, rows, _ = interned["char3"]
+    w.add_csr("char3.fwd", rows)
+    w.add("char3.crc", "q", [gram_hash(t) for t in terms])
+    word_terms = interned["words"][0]
+    word_ids = {t: i for i, t in enumerate(word_terms)}
+
+    # idf على نفس أرقام الكلمات (كلمات المدوّنة هي مفردات TF-IDF)
+    idf = index.vectorizer.idf
+    w.add("idf", "d", [idf.get(t, 0.0) for t in word_terms])
+    tfidf_rows = [sorted((word_ids[t], v) for t, v in e.tfidf.items()) for e in entries]
+    w.add_csr("tfidf", [[t for t, _ in r] for r in tfidf_rows], values=[[v for _, v in r] for r in tfidf_rows])
+    w.add("tfidf.norm", "d", [e.tfidf_norm for e in entries])
+
+    profile_names = list(index.profile_tf)
+    # مصطلحات الملفات (tf) من كلمات المدوّنة نفسها، فلا نحتاج قاموساً آخر
+    profile_rows = [sorted((word_ids[t], v) for t, v in index.profile_tf[p].items()) for p in profile_names]
+    w.add_csr("profile", [[t for t, _ in r] for r in profile_rows], values=[[v for _, v in r] for r in profile_rows])
+
+    header = {
+        "source_sha256": source_checksum,
+        "byteorder": sys.byteorder,
+        "entries": len(entries),
+        "doc_count": index.vectorizer.doc_count,
+        "weights": list(weights),
+        "profiles": profile_names,
+    }
+    w.write(path, header)
+    return header
+
+
+# -------------------------------------------------------------
+# القراءة
+# -------------------------------------------------------------
+
+class _Strings(Sequence):
+    """نصوص من كتلة UTF-8 وإزاحات (تُفك عند الطلب)."""
+
+    def __init__(self, offsets: memoryview, blob: memoryview):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+
+class _TermTable(Mapping):
+    """مصطلح -> رقمه، ببحث ثنائي في جدول تجزئة مرتب داخل اللقطة."""
+
+    def __init__(self, strings: _Strings, hashes: memoryview, order: memoryview):
+        self.strings = strings
+        self.hashes = hashes
+        self.order = order
+
+    def get(self, term, default=None):
+        if not isinstance(term, str):
+            return default
+        h = term_hash(term)
+        k = bisect_left(self.hashes, h)
+        while k < len(self.hashes) and self.hashes[k] == h:
+            i = self.order[k]
+            if self.strings[i] == term:
+                return i
+            k += 1
+        return default
+
+    def __getitem__(self, term) -> int:
+        i = self.get(term)
+        if i is None:
+            raise KeyError(term)
+        return i
+
+    def __contains__(self, term) -> bool:
+        return self.get(term) is not None
+
+    def __len__(self) -> int:
+        return len(self.strings)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.strings)
+
+
+class _TermValues(Mapping):
+    """مصطلح -> قيمة (مثل idf) على أرقام _TermTable."""
+
+    def __init__(self, terms: _TermTable, values: memoryview):
+        self.terms = terms
+        self.values = values
+
+    def get(self, term, default=None):
+        i = self.terms.get(term)
+        return default if i is None else self.values[i]
+
+    def __getitem__(self, term) -> float:
+        return self.values[self.terms[term]]
+
+    def __contains__(self, term) -> bool:
+        return term in self.terms
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.terms)
+
+
+class _Postings:
+    """مصطلح -> أرقام الأمثلة (شريحة من المصفوفة المسطّحة)."""
+
+    def __init__(self, terms: _TermTable, ptr: memoryview, ids: memoryview):
+        self.terms = terms
+        self.ptr = ptr
+        self.ids = ids
+
+    def get(self, term, default=()):
+        t = self.terms.get(term)
+        if t is None:
+            return default
+        return self.ids[self.ptr[t]:self.ptr[t + 1]]
+
+
+class _Buckets:
+    """طول الشكل المضغوط -> أرقام الأمثلة."""
+
+    def __init__(self, lengths: memoryview, ptr: memoryview, ids: memoryview):
+        self.lengths = lengths
+        self.ptr = ptr
+        self.ids = ids
+
+    def get(self, length: int, default=()):
+        k = bisect_left(self.lengths, length)
+        if k == len(self.lengths) or self.lengths[k] != length:
+            return default
+        return self.ids[self.ptr[k]:self.ptr[k + 1]]
+
+
+class _ExactTable:
+    """الشكل المضغوط -> أول مثال بهذا الشكل (مثل dict.get)."""
+
+    def __init__(self, hashes: memoryview, ids: memoryview, entries: "SnapshotEntries", deep: bool):
+        self.hashes = hashes
+        self.ids = ids
+        self.entries = entries
+        self.deep = deep
+
+    def get(self, compact: str, default=None):
+        h = term_hash(compact)
+        k = bisect_left(self.hashes, h)
+        while k < len(self.hashes) and self.hashes[k] == h:
+            entry = self.entries[self.ids[k]]
+            if (entry.compact_deep if self.deep else entry.compact_light) == compact:
+                return entry
+            k += 1
+        return default
+
+
+class Snapshot:
+    """ملف لقطة مفتوح بـ mmap؛ الأقسام memoryview بلا نسخ."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mm)
+        if bytes(view[:8]) != _MAGIC:
+            raise ValueError("ليس ملف لقطة فهرس.")
+        self.format_version = int.from_bytes(view[8:12], "little")
+        size = int.from_bytes(view[12:16], "little")
+        self.header: Dict[str, Any] = json.loads(bytes(view[16:16 + size]).decode("utf-8"))
+        start = 16 + size
+        self._base = start + (-start) % _ALIGN
+        self._view = view
+
+    def array(self, name: str) -> memoryview:
+        offset, typecode, size = self.header["sections"][name]
+        start = self._base + offset
+        return self._view[start:start + size].cast(typecode)
+
+    def strings(self, name: str) -> _Strings:
+        return _Strings(self.array(name + ".off"), self.array(name + ".blob"))
+
+    def terms(self, name: str) -> _TermTable:
+        return _TermTable(self.strings(name), self.array(name + ".hash"), self.array(name + ".order"))
+
+    def row(self, name: str, i: int) -> memoryview:
+        ptr = self.array(name + ".ptr")
+        return self.array(name + ".idx")[ptr[i]:ptr[i + 1]]
+
+    def nbytes(self) -> int:
+        return len(self._mm)
+
+
+class SnapshotEntries(Sequence):
+    """أمثلة الفهرس من اللقطة؛ كل مثال يُنشأ عند أول طلب ثم يُحفظ."""
+
+    def __init__(self, snap: Snapshot, words: _TermTable):
+        self.snap = snap
+        self.weights = snap.header["weights"]
+        self.weight_ids = snap.array("entry.weight")
+        self.texts = snap.strings("text")
+        self.light = snap.strings("light")
+        self.deep = snap.strings("deep")
+        self.syllables = snap.strings("syllables")
+        self.words = words
+        self.tfidf_ptr = snap.array("tfidf.ptr")
+        self.tfidf_idx = snap.array("tfidf.idx")
+        self.tfidf_val = snap.array("tfidf.val")
+        self.tfidf_norm = snap.array("tfidf.norm")
+        self._cache: Dict[int, IndexedExample] = {}
+
+    def __len__(self) -> int:
+        return len(self.weight_ids)
+
+    def weight(self, i: int) -> str:
+        return self.weights[self.weight_ids[i]]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        entry = self._cache.get(i)
+        if entry is None:
+            if i < 0:
+                i += len(self)
+            lo, hi = self.tfidf_ptr[i], self.tfidf_ptr[i + 1]
+            tfidf = {self.words.strings[t]: v for t, v in zip(self.tfidf_idx[lo:hi], self.tfidf_val[lo:hi])}
+            entry = self._cache[i] = IndexedExample.restore(
+                self.weight(i), self.texts[i], self.light[i], self.deep[i],
+                tfidf, self.tfidf_norm[i], self.syllables[i],
+            )
+        return entry
+
+
+class _Candidates(Sequence):
+    """(الوزن، النص) لكل مثال دون إنشاء الأمثلة."""
+
+    def __init__(self, entries: SnapshotEntries):
+        self.entries = entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return self.entries.weight(i), self.entries.texts[i]
+
+
+def open_snapshot(path: str, source_path: str) -> Optional[Snapshot]:
+    """اللقطة إن كانت موجودة وصالحة ومطابقة لملف الأمثلة الحالي، وإلا None."""
+    if not path or not os.path.exists(path) or not os.path.exists(source_path):
+        return None
+    try:
+        snap = Snapshot(path)
+    except (OSError, ValueError):
+        return None
+    header = snap.header
+    if snap.format_version != FORMAT_VERSION or header.get("byteorder") != sys.byteorder:
+        return None
+    if header.get("source_sha256") != file_checksum(source_path):
+        return None
+    return snap
+
+
+def load_snapshot_index(
+    snap: Snapshot,
+    top_k: Optional[int],
+    engine: str,
+    use_syllabic: bool,
+    dtw_band: int,
+    lsh: Optional[Tuple[int, int]] = None
+) -> CorpusIndex:
+    """CorpusIndex فوق مصفوفات اللقطة مباشرة (بلا تطبيع ولا TF-IDF من جديد)."""
+    header = snap.header
+    words = snap.terms("words")
+    entries = SnapshotEntries(snap, words)
+    n = len(entries)
+
+    vectorizer = TfidfVectorizer.__new__(TfidfVectorizer)
+    vectorizer.corpus = _Candidates(entries)
+    vectorizer.doc_count = header["doc_count"]
+    vectorizer.idf = _TermValues(words, snap.array("idf"))
+    vectorizer.generation = 0
+
+    profile_tf = {}
+    for p, name in enumerate(header["profiles"]):
+        ptr = snap.array("profile.ptr")
+        lo, hi = ptr[p], ptr[p + 1]
+        profile_tf[name] = {
+            words.strings[t]: v
+            for t, v in zip(snap.array("profile.idx")[lo:hi], snap.array("profile.val")[lo:hi])
+        }
+
+    postings = {}
+    for name in ("char3", "words", "word2"):
+        postings[name] = (snap.terms(name), snap.array(name + ".post.ptr"), snap.array(name + ".post.idx"))
+
+    prosody = ProsodyEngine()
+    for i in range(n):
+        prosody.add(entries.weight(i), entries.texts[i], entries.syllables[i])
+
+    lsh_index = None
+    if lsh is not None:
+        lsh_index = MinHashLSH(*lsh)
+        crc = snap.array("char3.crc")
+        ptr = snap.array("char3.fwd.ptr")
+        fwd = snap.array("char3.fwd.idx")
+        for i in range(n):
+            lsh_index.add_hashes(i, [crc[t] for t in fwd[ptr[i]:ptr[i + 1]]])
+        lsh_index.freeze()
+
+    vector_engine = None
+    if engine == "numpy" or (engine == "auto" and HAVE_NUMPY):
+        matrices = {
+            name: _BinaryMatrix.from_postings(terms, ptr, ids, snap.array(name + ".size"), n)
+            for name, (terms, ptr, ids) in postings.items()
+        }
+        vector_engine = VectorEngine.from_matrices(matrices["words"], matrices["char3"], matrices["word2"])
+
+    index = CorpusIndex.restore(
+        candidates=_Candidates(entries),
+        top_k=top_k,
+        use_syllabic=use_syllabic,
+        dtw_band=dtw_band,
+        weight_profiles={},
+        vectorizer=vectorizer,
+        entries=entries,
+        profile_tf=profile_tf,
+        _idf_base=_idf_offset(vectorizer.doc_count),
+        exact_light=_ExactTable(snap.array("exact_light.hash"), snap.array("exact_light.id"), entries, False),
+        exact_deep=_ExactTable(snap.array("exact_deep.hash"), snap.array("exact_deep.id"), entries, True),
+        light_buckets=_Buckets(snap.array("bucket_light.len"), snap.array("bucket_light.ptr"),
+                               snap.array("bucket_light.idx")),
+        deep_buckets=_Buckets(snap.array("bucket_deep.len"), snap.array("bucket_deep.ptr"),
+                              snap.array("bucket_deep.idx")),
+        char3_postings=_Postings(*postings["char3"]),
+        word_postings=_Postings(*postings["words"]),
+        char3_sizes=snap.array("char3.size"),
+        word_sizes=snap.array("words.size"),
+        prosody=prosody,
+        lsh=lsh_index,
+        engine=vector_engine,
+        snapshot=snap,
+        removed=set(),
+        _profile_counts=None,
+        _bucket_texts={},
+    )
+    index._profile_stats = {w: index._stats(tf, 0.0) for w, tf in profile_tf.items()}
+    return index
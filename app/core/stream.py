@@ -0,0 +1,298 @@
+"""
+تصنيف ملفات كبيرة دفعةً واحدة (python -m app.cli classify) دون المرور بالخادم.
+
+المدخل (نص، CSV، JSONL) يُقرأ تتابعياً ويُقسَّم كل سجل إلى أبيات بـ
+split_poem، والأبيات تُرسل قطعاً إلى مجمّع عمليات يحمّل كل عامل فيه الفهرس
+مرة واحدة. النتائج تُكتب NDJSON بترتيب المدخل فور اكتمال كل قطعة، وعدد
+القطع المعلّقة محدود، فالذاكرة لا تنمو مع حجم الملف.
+
+كل سطر ناتج هو analyze_poem_line نفسها (كما في /api/analyze) مع موقعه في
+المدخل: record (رقم السجل) وline (رقم البيت فيه) وid إن وُجد.
+
+نقطة الاستئناف (checkpoint) تحفظ عدد الأبيات المكتوبة وحجم ملف الناتج بعد
+كل قطعة؛ عند --resume يُقص الناتج إلى ذلك الحجم (ما كُتب بعدها قد يكون
+ناقصاً) وتُتخطى الأبيات المنجزة.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+import os
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from app.core.batch import split_poem
+from app.core.meter import _atomic_write, _load_index, analyze_poem_line
+from app.core.metrics import _method_label
+from app.core.pool import _init_worker
+
+FORMATS = ("text", "csv", "jsonl")
+# أبيات كل مهمة في المجمّع: أكبر = كلفة إرسال أقل، أصغر = توازن أفضل
+DEFAULT_CHUNK_SIZE = 256
+# القطع المعلّقة لكل عامل (حد الذاكرة)
+_IN_FLIGHT_PER_WORKER = 2
+
+# (رقم السجل، رقم البيت في السجل، معرّف السجل أو None، نص البيت)
+Unit = Tuple[int, int, Optional[str], str]
+
+
+def detect_format(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        return "csv"
+    if ext in (".jsonl", ".ndjson"):
+        return "jsonl"
+    return "text"
+
+
+def _records(f: TextIO, fmt: str, field: str, id_field: Optional[str]) -> Iterator[Tuple[Optional[str], str]]:
+    """(المعرّف، النص) لكل سجل. النص العادي: كل سطر سجل."""
+    if fmt == "csv":
+        csv.field_size_limit(sys.maxsize)
+        reader = csv.DictReader(f)
+        if reader.fieldnames is not None and field not in reader.fieldnames:
+            raise ValueError(f"العمود {field} غير موجود في ملف CSV")
+        for row in reader:
+            yield (row.get(id_field) if id_field else None), row.get(field) or ""
+    elif fmt == "jsonl":
+        for raw in f:
+            raw = raw.strip()
+            if not raw:
+                continue
+            try:
+                obj = json.loads(raw)
+            except ValueError:
+                obj = None
+            if isinstance(obj, str):
+                yield None, obj
+            elif isinstance(obj, dict):
+                text = obj.get(field)
+                ident = obj.get(id_field) if id_field else None
+                yield (None if ident is None else str(ident)), text if isinstance(text, str) else ""
+            else:
+                # سطر غير صالح يبقى سجلاً فارغاً حتى لا تتزحزح أرقام السجلات
+                yield None, ""
+    else:
+        for raw in f:
+            yield None, raw
+
+
+def iter_units(
+    f: TextIO,
+    fmt: str = "text",
+    split: str = "bayt",
+    field: str = "text",
+    id_field: Optional[str] = None
+) -> Iterator[Unit]:
+    """الأبيات غير الفارغة بالترتيب (قراءة تتابعية)."""
+    for record, (ident, text) in enumerate(_records(f, fmt, field, id_field)):
+        for line_no, line in enumerate(split_poem(text, split)):
+            yield record, line_no, ident, line
+
+
+def _classify_chunk(lines: List[str], timeout: Optional[float]) -> List[Dict]:
+    # المهلة لكل بيت من بدء تحليله (كما في /api/analyze)، لا من إرسال القطعة
+    return [
+        analyze_poem_line(line, deadline=time.time() + timeout if timeout else None)
+        for line in lines
+    ]
+
+
+def _chunked(units: Iterable[Unit], size: int) -> Iterator[List[Unit]]:
+    chunk: List[Unit] = []
+    for unit in units:
+        chunk.append(unit)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _output_line(unit: Unit, result: Dict) -> str:
+    record, line_no, ident, _ = unit
+    out: Dict[str, Any] = {"record": record, "line": line_no}
+    if ident is not None:
+        out["id"] = ident
+    out.update(result)
+    return json.dumps(out, ensure_ascii=False) + "\n"
+
+
+class Progress:
+    """عدّادات التشغيل، وتقرير دوري (أبيات/ثانية) عبر report."""
+
+    def __init__(self, skipped: int = 0, every: float = 5.0,
+                 report: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.skipped = skipped
+        self.done = 0
+        self.matched = 0
+        self.methods: Counter = Counter()
+        self.every = every
+        self.report = report
+        self.started = time.perf_counter()
+        self._last = self.started
+
+    def add(self, result: Dict) -> None:
+        self.done += 1
+        method = _method_label(result)
+        self.methods[method] += 1
+        if method not in ("unmatched", "error"):
+            self.matched += 1
+
+    def tick(self, force: bool = False) -> None:
+        now = time.perf_counter()
+        if self.report is not None and (force or now - self._last >= self.every):
+            self._last = now
+            self.report(self.summary())
+
+    def summary(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.started
+        return {
+            "lines": self.skipped + self.done,
+            "classified": self.done,
+            "skipped": self.skipped,
+            "matched": self.matched,
+            "seconds": round(elapsed, 2),
+            "lines_per_s": round(self.done / elapsed, 1) if elapsed > 0 else 0.0,
+            "methods": dict(self.methods.most_common()),
+        }
+
+
+def load_checkpoint(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def classify_stream(
+    units: Iterable[Unit],
+    out: io.BufferedIOBase,
+    workers: int = 1,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    timeout: Optional[float] = None,
+    skip: int = 0,
+    checkpoint: Optional[Callable[[int], None]] = None,
+    progress: Optional[Progress] = None
+) -> Progress:
+    """
+    تصنيف الأبيات وكتابتها NDJSON (bytes) في out بالترتيب. skip: أبيات منجزة
+    سابقاً تُتخطى. checkpoint(n) بعد كتابة كل قطعة (n = الأبيات المنجزة كلها).
+    timeout: مهلة كل بيت بالثواني (None = بلا مهلة، نتائج كاملة).
+    """
+    if progress is None:
+        progress = Progress(skipped=skip)
+    units = iter(units)
+    for _ in range(skip):
+        if next(units, None) is None:
+            break
+
+    def write(chunk: List[Unit], results: List[Dict]) -> None:
+        out.write("".join(_output_line(u, r) for u, r in zip(chunk, results)).encode("utf-8"))
+        for result in results:
+            progress.add(result)
+        out.flush()
+        if checkpoint is not None:
+            checkpoint(skip + progress.done)
+        progress.tick()
+
+    if workers <= 1:
+        for chunk in _chunked(units, chunk_size):
+            write(chunk, _classify_chunk([u[3] for u in chunk], timeout))
+        progress.tick(force=True)
+        return progress
+
+    # نحمّل الفهرس قبل التفرّع ليتشاركه العمّال (كما في AnalysisPool)
+    _load_index()
+    pending: Deque[Tuple[List[Unit], Future]] = deque()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        for chunk in _chunked(units, chunk_size):
+            pending.append((chunk, executor.submit(_classify_chunk, [u[3] for u in chunk], timeout)))
+            if len(pending) >= workers * _IN_FLIGHT_PER_WORKER:
+                done_chunk, future = pending.popleft()
+                write(done_chunk, future.result())
+        while pending:
+            done_chunk, future = pending.popleft()
+            write(done_chunk, future.result())
+    progress.tick(force=True)
+    return progress
+
+
+def run_classify(
+    input_path: str,
+    output_path: str,
+    fmt: Optional[str] = None,
+    split: str = "bayt",
+    field: str = "text",
+    id_field: Optional[str] = None,
+    workers: int = 1,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    timeout: Optional[float] = None,
+    checkpoint_path: Optional[str] = None,
+    resume: bool = False,
+    progress_every: float = 5.0,
+    report: Optional[Callable[[Dict[str, Any]], None]] = None
+) -> Dict[str, Any]:
+    """
+    تصنيف ملف (أو "-" للمدخل القياسي) إلى ملف NDJSON. مع checkpoint_path
+    يُحفظ التقدم بعد كل قطعة، ومع resume يُكمل من آخر نقطة محفوظة.
+    """
+    fmt = fmt or detect_format(input_path)
+    if fmt not in FORMATS:
+        raise ValueError(f"صيغة غير معروفة: {fmt}")
+    if (resume or checkpoint_path) and (checkpoint_path is None or output_path == "-"):
+        raise ValueError("الاستئناف يحتاج ملف ناتج وملف نقطة استئناف")
+
+    skip = 0
+    offset = 0
+    state = load_checkpoint(checkpoint_path) if resume else None
+    if state is not None:
+        if state.get("input") != os.path.abspath(input_path) or state.get("split") != split:
+            raise ValueError("نقطة الاستئناف لمدخل أو تقسيم مختلف")
+        skip = state["done"]
+        offset = state["output_bytes"]
+        if os.path.getsize(output_path) < offset:
+            raise ValueError("ملف الناتج أقصر مما سجّلته نقطة الاستئناف")
+
+    if output_path == "-":
+        out = sys.stdout.buffer
+    elif state is not None:
+        out = open(output_path, "r+b")
+        # ما بعد آخر نقطة محفوظة قد يكون قطعة ناقصة
+        out.seek(offset)
+        out.truncate()
+    else:
+        out = open(output_path, "wb")
+
+    def save(done: int) -> None:
+        # الناتج على القرص قبل أن تشير إليه نقطة الاستئناف
+        os.fsync(out.fileno())
+        _atomic_write(checkpoint_path, json.dumps({
+            "input": os.path.abspath(input_path),
+            "split": split,
+            "done": done,
+            "output_bytes": out.tell(),
+        }))
+
+    source = sys.stdin if input_path == "-" else open(input_path, "r", encoding="utf-8", newline="")
+    try:
+        progress = classify_stream(
+            iter_units(source, fmt, split, field, id_field), out,
+            workers=workers, chunk_size=chunk_size, timeout=timeout, skip=skip,
+            checkpoint=save if checkpoint_path else None,
+            progress=Progress(skipped=skip, every=progress_every, report=report),
+        )
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if out is not sys.stdout.buffer:
+            out.close()
+        else:
+            out.flush()
+    return progress.summary()
@@ -0,0 +1,184 @@
+"""
+محرك مقاييس متجهي اختياري (NumPy/SciPy).
+يرمّز الأمثلة كمصفوفات ثنائية متناثرة على مفردات مُدمجة، فتُحسب التقاطعات
+والاتحادات لكل الأمثلة بضرب مصفوفات واحد بدل بناء مجموعات لكل زوج.
+(cosine ملفات الأوزان في CorpusIndex.profile_cosines: idf يتغير مع كل تعديل.)
+إذا لم تكن NumPy/SciPy مثبتة: HAVE_NUMPY = False ويبقى المسار البايثوني.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, List, Mapping, Sequence, Set, Tuple
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # pragma: no cover - يعتمد على البيئة
+    np = None
+    sparse = None
+
+from app.core.similarity import TextFeatures, jaccard_similarity
+
+HAVE_NUMPY = np is not None and sparse is not None
+
+# دمج الصفوف المضافة في المصفوفة حين تبلغ 1/_TAIL_FRACTION من صفوفها (وعلى الأقل _MIN_TAIL)
+_TAIL_FRACTION = 8
+_MIN_TAIL = 64
+
+
+class _BinaryMatrix:
+    """مصفوفة ثنائية (أمثلة × خصائص) مع قاموس الخصائص المُدمجة."""
+
+    def __init__(self, rows: Sequence[Set[str]]):
+        self.vocab: Dict[str, int] = {}
+        indptr = [0]
+        indices: List[int] = []
+        for row in rows:
+            for g in row:
+                indices.append(self.vocab.setdefault(g, len(self.vocab)))
+            indptr.append(len(indices))
+        data = np.ones(len(indices), dtype=np.int64)
+        self.matrix_t = sparse.csr_matrix(
+            (data, indices, indptr), shape=(len(rows), len(self.vocab))
+        ).T.tocsr()
+        self.sizes = np.diff(np.asarray(indptr, dtype=np.int64))
+        # صفوف أُضيفت بعد البناء (append)، تُحسب بالمجموعات حتى تُدمج في المصفوفة
+        self.tail: List[Set[str]] = []
+
+    @classmethod
+    def from_postings(cls, vocab: Mapping[str, int], indptr, postings, sizes, n_rows: int) -> "_BinaryMatrix":
+        """
+        من فهرس مقلوب جاهز (مصفوفات مسطّحة من لقطة الفهرس): الفهرس المقلوب
+        هو نفسه المصفوفة المنقولة، فلا نعيد بناء شيء.
+        """
+        self = cls.__new__(cls)
+        self.vocab = vocab
+        indptr = np.frombuffer(indptr, dtype=np.int64)
+        indices = np.frombuffer(postings, dtype=np.int32)
+        data = np.ones(len(indices), dtype=np.int64)
+        self.matrix_t = sparse.csr_matrix((data, indices, indptr), shape=(len(indptr) - 1, n_rows))
+        self.sizes = np.frombuffer(sizes, dtype=np.int32).astype(np.int64)
+        self.tail = []
+        return self
+
+    def append(self, row: Set[str]) -> None:
+        """
+        صف جديد في آخر المصفوفة بكلفته وحده؛ الدمج الفعلي (بكلفة المصفوفة)
+        حين يبلغ الذيل جزءاً ثابتاً من عدد الصفوف، فالكلفة الموزعة ثابتة.
+        """
+        self.tail.append(row)
+        if len(self.tail) >= max(_MIN_TAIL, len(self.sizes) // _TAIL_FRACTION):
+            self._merge_tail()
+
+    def _merge_tail(self) -> None:
+        indptr = [0]
+        indices: List[int] = []
+        for row in self.tail:
+            for g in row:
+                indices.append(self.vocab.setdefault(g, len(self.vocab)))
+            indptr.append(len(indices))
+        data = np.ones(len(indices), dtype=np.int64)
+        tail_t = sparse.csr_matrix(
+            (data, indices, indptr), shape=(len(self.tail), len(self.vocab))
+        ).T.tocsr()
+        matrix_t = self.matrix_t
+        if matrix_t.shape[0] < len(self.vocab):
+            # خصائص جديدة: صفوف أصفار في الجزء القديم
+            matrix_t = sparse.vstack([
+                matrix_t, sparse.csr_matrix((len(self.vocab) - matrix_t.shape[0], matrix_t.shape[1]), dtype=np.int64)
+            ])
+        self.matrix_t = sparse.hstack([matrix_t, tail_t]).tocsr()
+        self.sizes = np.concatenate([self.sizes, np.diff(np.asarray(indptr, dtype=np.int64))])
+        self.tail = []
+
+    def encode(self, rows: Sequence[Set[str]]):
+        """ترميز الاستعلامات؛ الخصائص غير الموجودة في المفردات لا تتقاطع لكنها تدخل في الحجم."""
+        indptr = [0]
+        indices: List[int] = []
+        for row in rows:
+            for g in row:
+                i = self.vocab.get(g)
+                if i is not None:
+                    indices.append(i)
+            indptr.append(len(indices))
+        data = np.ones(len(indices), dtype=np.int64)
+        encoded = sparse.csr_matrix((data, indices, indptr), shape=(len(rows), len(self.vocab)))
+        sizes = np.asarray([len(row) for row in rows], dtype=np.int64)
+        return encoded, sizes
+
+    def jaccard(self, rows: Sequence[Set[str]]):
+        """Jaccard لكل (استعلام، مثال): مصفوفة (استعلامات × أمثلة)."""
+        encoded, sizes = self.encode(rows)
+        inter = (encoded @ self.matrix_t).toarray()
+        union = sizes[:, None] + self.sizes[None, :] - inter
+        # union == 0 فقط عندما تكون المجموعتان فارغتين -> 0.0 مثل jaccard_similarity
+        safe = np.where(union > 0, union, 1)
+        result = np.where(union > 0, inter / safe, 0.0)
+        if self.tail:
+            tail = np.asarray([[jaccard_similarity(row, other) for other in self.tail] for row in rows])
+            result = np.hstack([result, tail])
+        return result
+
+
+class VectorEngine:
+    """Jaccard (كلمات، n-grams حرفية ثلاثية، ثنائيات كلمات) لكل الأمثلة دفعة واحدة."""
+
+    def __init__(self, features: Sequence[TextFeatures]):
+        if not HAVE_NUMPY:
+            raise RuntimeError("NumPy/SciPy غير مثبتة.")
+        self.words = _BinaryMatrix([f.words for f in features])
+        self.char3 = _BinaryMatrix([f.char3 for f in features])
+        self.word2 = _BinaryMatrix([f.word2 for f in features])
+
+    @classmethod
+    def from_matrices(cls, words: _BinaryMatrix, char3: _BinaryMatrix, word2: _BinaryMatrix) -> "VectorEngine":
+        if not HAVE_NUMPY:
+            raise RuntimeError("NumPy/SciPy غير مثبتة.")
+        self = cls.__new__(cls)
+        self.words = words
+        self.char3 = char3
+        self.word2 = word2
+        return self
+
+    def add(self, features: TextFeatures) -> None:
+        """مثال جديد في آخر المدوّنة (المحذوف يبقى صفه ويُستبعد عند الاستعلام)."""
+        self.words.append(features.words)
+        self.char3.append(features.char3)
+        self.word2.append(features.word2)
+
+    def jaccards(self, queries: Sequence[TextFeatures]) -> Dict[str, "np.ndarray"]:
+        """لكل مقياس: مصفوفة (استعلامات × أمثلة) بنفس قيم jaccard_similarity."""
+        return {
+            'jaccard_words': self.words.jaccard([q.words for q in queries]),
+            'jaccard_char3': self.char3.jaccard([q.char3 for q in queries]),
+            'jaccard_word2': self.word2.jaccard([q.word2 for q in queries]),
+        }
+
+
+def engine_self_test(features: Sequence[TextFeatures], queries: Sequence[TextFeatures]) -> Dict[str, int]:
+    """
+    Jaccard المحرك المتجهي مقابل jaccard_similarity لكل (استعلام، مثال)،
+    والمدخلات الفارغة ضمن الاستعلامات والأمثلة. آخر ربع الأمثلة يُضاف بـ add
+    ليُفحص الذيل أيضاً. يجب ألا يختلفا أبداً.
+    """
+    if not HAVE_NUMPY:
+        return {"engine_checked": 0, "engine_mismatches": 0}
+    empty = TextFeatures("")
+    features = [empty, *features]
+    queries = [empty, *queries]
+    split = len(features) - len(features) // 4
+    engine = VectorEngine(features[:split])
+    for f in features[split:]:
+        engine.add(f)
+    pairs: Tuple[Tuple[str, str], ...] = (
+        ("jaccard_words", "words"), ("jaccard_char3", "char3"), ("jaccard_word2", "word2"),
+    )
+    checked = mismatches = 0
+    matrices = engine.jaccards(queries)
+    for key, attr in pairs:
+        matrix = matrices[key]
+        for q, query in enumerate(queries):
+            for i, feature in enumerate(features):
+                checked += 1
+                mismatches += float(matrix[q, i]) != jaccard_similarity(getattr(query, attr), getattr(feature, attr))
+    return {"engine_checked": checked, "engine_mismatches": mismatches}
@@ -1240,27 +1240,27 @@ export const EXAMPLES = {
   ]
 },
 
-  "ابوذيه": {
-    "taf3eelat": "مفاعيلن / مفاعيلن / فعولن",
-    "examples": [
-      "اعله راسي حط همومك وانه كرهه",
-      "تنخت بيك روحي من ضفاهه دهرهه",
-      "بودادك عكل البراسي تخله",
-      "الف دنياي كلهه ما تلفني",
-      "مهله الطيني واسيرلي العلماك"
-    ]
-  },
+"ابوذيه": {
+  "taf3eelat": "مفاعيلن / مفاعيلن / فعولن",
+  "examples": [
+    "اعله راسي حط همومك وانه كرهه",
+    "تنخت بيك روحي من ضفاهه دهرهه",
+    "بودادك عكل البراسي تخله",
+    "الف دنياي كلهه ما تلفني",
+    "مهله الطيني واسيرلي العلماك"
+  ]
+},
 
-  "مفتون": {
-    "taf3eelat": "منسرح شعبي (مستفعلن/مفعولات/مستفعلن) (تقريب)",
-    "examples": [
-      "لا تظن يصحه المفتون ويبدل من الطباعه",
-      "الفخر ياهو الوباك بحيدر بعد باعه",
-      "اشكال كليه الساسون من طكت الطكاكه",
-      "لا تظن يسهلها الزمن وتروح بساعه",
-      "ما ينفعك لوم الناس لو قلبك باعه"
-    ]
-  },
+"مفتون": {
+  "taf3eelat": "منسرح شعبي (مستفعلن/مفعولات/مستفعلن) (تقريب)",
+  "examples": [
+    "لا تظن يصحه المفتون ويبدل من الطباعه",
+    "الفخر ياهو الوباك بحيدر بعد باعه",
+    "اشكال كليه الساسون من طكت الطكاكه",
+    "لا تظن يسهلها الزمن وتروح بساعه",
+    "ما ينفعك لوم الناس لو قلبك باعه"
+  ]
+},
 
 "ميمر": {
   "examples": [
@@ -1367,4 +1367,5 @@ export const EXAMPLES = {
     "باقِي ليالي اوْ يرجَع الها عاشُور",
     "تتذكّر احسين الغَريب المنحُور"
   ]
+}
 };
@@ -1,10 +1,37 @@
-from fastapi import FastAPI
+import asyncio
+import hmac
+import json
+import os
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Optional
+
+from fastapi import FastAPI, Header, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.core.meter import analyze_poem_line, list_weights
+from app.core.meter import (
+    _load_index, add_example, analyze_poem_line, list_examples, list_weights,
+    remove_example
+)
+from app.core import metrics
+from app.core.live import LiveSession
+from app.core.batch import MAX_BATCH_LINES, analyze_lines_async, poem_response, split_poem
+from app.core.pool import PoolBusy, get_pool
+
+# أقصى عدد نتائج مرتبة (k) في الطلب الواحد
+MAX_K = int(os.environ.get("METER_MAX_K", "20"))
+# رمز إدارة الأمثلة (ترويسة X-Admin-Token)؛ فارغ = نقاط الإدارة معطّلة
+ADMIN_TOKEN = os.environ.get("METER_ADMIN_TOKEN", "")
 
-app = FastAPI(title="Iraqi Poetry Meter")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # الفهرس يُحمَّل عند الإقلاع (لقطة mmap إن وُجدت) بدل أول طلب
+    _load_index()
+    yield
+
+app = FastAPI(title="Iraqi Poetry Meter", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -14,6 +41,37 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+_BUSY = {
+    "ok": False,
+    "error": "busy",
+    "message": "الخادم مشغول حالياً، حاول مرة أخرى بعد قليل."
+}
+
+def _busy_response() -> JSONResponse:
+    # رفض سريع بدل الانتظار الطويل عند امتلاء الطابور
+    return JSONResponse(status_code=503, headers={"Retry-After": "1"}, content=dict(_BUSY))
+
+def _admin_denied(token: Optional[str]) -> Optional[JSONResponse]:
+    if not ADMIN_TOKEN:
+        return JSONResponse(
+            status_code=403,
+            content={
+                "ok": False,
+                "error": "admin_disabled",
+                "message": "إدارة الأمثلة غير مفعّلة على هذا الخادم."
+            }
+        )
+    if not token or not hmac.compare_digest(token, ADMIN_TOKEN):
+        return JSONResponse(
+            status_code=401,
+            content={
+                "ok": False,
+                "error": "unauthorized",
+                "message": "رمز الإدارة غير صحيح."
+            }
+        )
+    return None
+
 # ✅ API routes FIRST
 @app.get("/api/weights")
 def api_weights():
@@ -21,7 +79,11 @@ def api_weights():
 
 
 @app.post("/api/analyze")
-async def api_analyze(payload: dict):
+async def api_analyze(payload: dict, debug: bool = False):
+    """
+    k: إضافة أفضل k أمثلة ("matches")، per_weight: أفضل مثال لكل وزن، كلاهما
+    مع درجة كل مقياس. debug=1: إضافة "timings" (زمن كل مرحلة وعدد المرشحين).
+    """
     text = (payload.get("text") or "").strip()
     if not text:
         return {
@@ -29,8 +91,218 @@ async def api_analyze(payload: dict):
             "error": "empty_input",
             "message": "اكتب بيت/شطر واحد على الأقل."
         }
+    k = payload.get("k") or 0
+    if not isinstance(k, int) or isinstance(k, bool) or not 0 <= k <= MAX_K:
+        return {
+            "ok": False,
+            "error": "invalid_k",
+            "message": f"k عدد صحيح بين 0 و {MAX_K}."
+        }
+    per_weight = payload.get("per_weight", False)
+    if not isinstance(per_weight, bool):
+        return {
+            "ok": False,
+            "error": "invalid_per_weight",
+            "message": "per_weight قيمة منطقية (true أو false)."
+        }
+
+    analyze = analyze_poem_line
+    if debug or metrics.METRICS_ENABLED or k or per_weight:
+        analyze = partial(
+            analyze_poem_line, timings=debug or metrics.METRICS_ENABLED, k=k, per_weight=per_weight
+        )
+    try:
+        result = await get_pool().submit(analyze, text)
+    except PoolBusy:
+        return _busy_response()
+    timings = metrics.observe(result)
+    if debug:
+        result["timings"] = timings
+    return result
+
+
+@app.post("/api/analyze/batch")
+async def api_analyze_batch(payload: dict):
+    """
+    lines: قائمة أبيات، أو text: قصيدة متعددة الأسطر.
+    split: "bayt" (افتراضي) أو "shatr" لتقسيم كل بيت إلى شطريه.
+    """
+    lines = payload.get("lines")
+    if isinstance(lines, list):
+        text = "\n".join(line for line in lines if isinstance(line, str))
+    else:
+        text = payload.get("text") or ""
+    lines = split_poem(text, payload.get("split") or "bayt")
+    if not lines:
+        return {
+            "ok": False,
+            "error": "empty_input",
+            "message": "اكتب بيت/شطر واحد على الأقل."
+        }
+    if len(lines) > MAX_BATCH_LINES:
+        return {
+            "ok": False,
+            "error": "too_many_lines",
+            "message": f"الحد الأقصى {MAX_BATCH_LINES} سطر في الطلب الواحد."
+        }
+
+    try:
+        return poem_response(await analyze_lines_async(lines))
+    except PoolBusy:
+        return _busy_response()
+
+
+@app.get("/api/pool")
+def api_pool():
+    """حالة مجمّع التحليل: عمق الطابور وزمن الانتظار."""
+    return {"ok": True, "pool": get_pool().stats()}
+
+
+@app.get("/api/cache")
+def api_cache():
+    """عدّادات الذاكرة المؤقتة للنتائج (hits/misses/evictions)، مجموعة من كل العمليات مع METER_POOL=process."""
+    return {"ok": True, "cache": get_pool().cache_stats()}
+
+
+@app.get("/api/metrics")
+def api_metrics():
+    """المقاييس بصيغة Prometheus النصية (المراحل + المجمّع + الذاكرة المؤقتة)."""
+    pool = get_pool().stats()
+    cache = get_pool().cache_stats()
+    index = _load_index()
+    gauges = [
+        ("meter_pool_in_flight", "gauge", "Jobs running or queued in the analysis pool.", pool["in_flight"]),
+        ("meter_pool_completed_total", "counter", "Jobs completed by the analysis pool.", pool["completed"]),
+        ("meter_pool_rejected_total", "counter", "Requests rejected because the queue was full.", pool["rejected"]),
+        ("meter_pool_timeouts_total", "counter", "Jobs that returned a partial result at their deadline.", pool["timeouts"]),
+        ("meter_pool_wait_avg_seconds", "gauge", "Average time jobs waited in the pool queue.", pool["avg_wait_ms"] / 1000),
+        ("meter_pool_wait_max_seconds", "gauge", "Longest time a job waited in the pool queue.", pool["max_wait_ms"] / 1000),
+        ("meter_cache_size", "gauge", "Entries in the result caches of all processes.", cache["size"]),
+        ("meter_cache_hits_total", "counter", "Result cache hits across all processes.", cache["hits"]),
+        ("meter_cache_misses_total", "counter", "Result cache misses across all processes.", cache["misses"]),
+        ("meter_cache_evictions_total", "counter", "Result cache evictions across all processes.", cache["evictions"]),
+        ("meter_cache_processes", "gauge", "Processes whose result cache is counted.", cache["processes"]),
+        ("meter_index_examples", "gauge", "Examples in the loaded index.", len(index)),
+    ]
+    return PlainTextResponse(metrics.render(gauges), media_type="text/plain; version=0.0.4")
+
+
+_EMPTY_INPUT = {
+    "ok": False,
+    "error": "empty_input",
+    "message": "اكتب بيت/شطر واحد على الأقل."
+}
+
+_LIVE_ERROR = {
+    "ok": False,
+    "error": "internal_error",
+    "message": "تعذّر تحليل النص، حاول مرة أخرى."
+}
+
+
+@app.websocket("/api/live")
+async def api_live(websocket: WebSocket):
+    """
+    تحليل أثناء الكتابة. العميل يرسل {id, text} مع كل تعديل (بعد debounce)
+    و{id, text, final: true} عند التوقف. الرد يحمل id نفسه؛ الرسائل الأحدث
+    تلغي الأقدم التي لم تبدأ، ونتيجة مبدئية تجاوزتها رسالة أحدث لا تُرسل.
+    """
+    await websocket.accept()
+    session = LiveSession()
+    latest: list = [None]
+    ready = asyncio.Event()
+
+    async def respond(message: dict) -> Optional[dict]:
+        text = message.get("text")
+        text = text.strip() if isinstance(text, str) else ""
+        if not text:
+            return dict(_EMPTY_INPUT)
+        pool = get_pool()
+        try:
+            if message.get("final"):
+                result = await pool.submit(partial(analyze_poem_line, timings=metrics.METRICS_ENABLED), text)
+                metrics.observe(result)
+                result["provisional"] = False
+                return result
+            # الحالة المبدئية في هذه العملية، لكن بحد طابور المجمّع نفسه
+            result = await pool.submit_local(session.update, text)
+        except PoolBusy:
+            # عند الازدحام يُترك التخمين المبدئي، فالتحليل النهائي يتبعه
+            return dict(_BUSY) if message.get("final") else None
+        # نتيجة مبدئية تجاوزتها رسالة أحدث لا تُرسل
+        return None if latest[0] is not None else result
+
+    async def worker():
+        while True:
+            await ready.wait()
+            ready.clear()
+            message, latest[0] = latest[0], None
+            if message is None:
+                continue
+            try:
+                result = await respond(message)
+            except Exception:
+                # خطأ في رسالة واحدة لا يوقف الجلسة
+                result = dict(_LIVE_ERROR)
+            if result is None:
+                continue
+            result["id"] = message.get("id")
+            try:
+                await websocket.send_json(result)
+            except Exception:
+                # الاتصال انقطع: حلقة الاستقبال تنهي الجلسة
+                return
+
+    task = asyncio.create_task(worker())
+    try:
+        while True:
+            raw = await websocket.receive_text()
+            try:
+                message = json.loads(raw)
+            except ValueError:
+                message = None
+            if not isinstance(message, dict):
+                await websocket.send_json({
+                    "ok": False,
+                    "error": "invalid_message",
+                    "message": "الرسالة يجب أن تكون JSON بالشكل {id, text}."
+                })
+                continue
+            latest[0] = message
+            ready.set()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        task.cancel()
+
+
+# إدارة الأمثلة: دوال عادية (def) فتعمل في threadpool ولا تحجب حلقة الأحداث
+# أثناء انتظار قفل الكتابة
+@app.get("/api/admin/examples")
+def api_admin_examples(weight: Optional[str] = None, x_admin_token: Optional[str] = Header(None)):
+    """عدد الأمثلة لكل وزن، أو أمثلة وزن واحد (?weight=)."""
+    denied = _admin_denied(x_admin_token)
+    if denied is not None:
+        return denied
+    return list_examples(weight)
+
+
+@app.post("/api/admin/examples")
+def api_admin_add_example(payload: dict, x_admin_token: Optional[str] = Header(None)):
+    """{weight, text}: إضافة مثال يظهر في التحليل فوراً دون إعادة بناء الفهرس."""
+    denied = _admin_denied(x_admin_token)
+    if denied is not None:
+        return denied
+    return add_example(payload.get("weight") or "", payload.get("text") or "")
+
 
-    return analyze_poem_line(text)
+@app.delete("/api/admin/examples")
+def api_admin_remove_example(payload: dict, x_admin_token: Optional[str] = Header(None)):
+    """{weight, text}: حذف مثال."""
+    denied = _admin_denied(x_admin_token)
+    if denied is not None:
+        return denied
+    return remove_example(payload.get("weight") or "", payload.get("text") or "")
 
 
 # ✅ Static mount LAST (IMPORTANT)
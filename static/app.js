@@ -3,6 +3,10 @@ const analyzeBtn = document.getElementById("analyzeBtn");
 const clearBtn = document.getElementById("clearBtn");
 const resultBox = document.getElementById("result");
 
+// التحليل أثناء الكتابة: تخمين مبدئي بعد توقف قصير، وتحليل كامل بعد توقف أطول
+const LIVE_DEBOUNCE_MS = 150;
+const LIVE_FINAL_MS = 800;
+
 function showResult(html) {
   resultBox.innerHTML = html;
   resultBox.classList.remove("hidden");
@@ -13,7 +17,87 @@ function hideResult() {
   resultBox.innerHTML = "";
 }
 
+function renderResult(data) {
+  if (!data.ok) {
+    showResult(`<b>خطأ:</b> ${data.message || "غير معروف"}`);
+    return;
+  }
+
+  const mark = data.provisional ? ` <span style="color:#888">(مبدئي)</span>` : "";
+
+  if (!data.matched) {
+    // استخدام "غير متعارف" بدلاً من "غير مطابق"
+    showResult(`
+      <div><b>غير متعارف</b>${mark}</div>
+      <div>التشابه: <b>${data.similarity}</b></div>
+      <div style="margin-top:8px;color:#555">${data.message || ""}</div>
+    `);
+    return;
+  }
+
+  // تم إزالة سطر التفعيلات تماماً
+  showResult(`
+    <div><b>الوزن:</b> ${data.weight}${mark}</div>
+    <div><b>التشابه:</b> ${data.similarity}</div>
+    <hr />
+    <div><b>أقرب مثال:</b></div>
+    <div style="color:#333">${data.closest_example}</div>
+  `);
+}
+
+// -------------------------------------------------------------
+// WebSocket /api/live
+// -------------------------------------------------------------
+
+let liveSocket = null;
+let liveId = 0;
+let debounceTimer = null;
+let finalTimer = null;
+
+function liveConnect() {
+  const scheme = location.protocol === "https:" ? "wss" : "ws";
+  const socket = new WebSocket(`${scheme}://${location.host}/api/live`);
+  socket.onmessage = (event) => {
+    const data = JSON.parse(event.data);
+    // رد على نص قديم (وصل بعد إرسال نص أحدث): يُهمل
+    if (data.id !== liveId) return;
+    if (!input.value.trim()) return;
+    renderResult(data);
+  };
+  socket.onclose = () => {
+    liveSocket = null;
+    setTimeout(liveConnect, 2000);
+  };
+  liveSocket = socket;
+}
+
+function liveSend(final) {
+  const text = input.value.trim();
+  if (!text || !liveSocket || liveSocket.readyState !== WebSocket.OPEN) return;
+  liveId += 1;
+  liveSocket.send(JSON.stringify({ id: liveId, text, final }));
+}
+
+input.addEventListener("input", () => {
+  clearTimeout(debounceTimer);
+  clearTimeout(finalTimer);
+  if (!input.value.trim()) {
+    liveId += 1;
+    hideResult();
+    return;
+  }
+  debounceTimer = setTimeout(() => liveSend(false), LIVE_DEBOUNCE_MS);
+  finalTimer = setTimeout(() => liveSend(true), LIVE_FINAL_MS);
+});
+
+if ("WebSocket" in window) {
+  liveConnect();
+}
+
 clearBtn.addEventListener("click", () => {
+  clearTimeout(debounceTimer);
+  clearTimeout(finalTimer);
+  liveId += 1;
   input.value = "";
   hideResult();
   input.focus();
@@ -26,6 +110,11 @@ analyzeBtn.addEventListener("click", async () => {
     return;
   }
 
+  // نتائج الكتابة المعلّقة لا تغطي على نتيجة الزر
+  clearTimeout(debounceTimer);
+  clearTimeout(finalTimer);
+  liveId += 1;
+
   analyzeBtn.disabled = true;
   analyzeBtn.textContent = "جاري التحليل...";
 
@@ -36,31 +125,7 @@ analyzeBtn.addEventListener("click", async () => {
       body: JSON.stringify({ text })
     });
 
-    const data = await res.json();
-
-    if (!data.ok) {
-      showResult(`<b>خطأ:</b> ${data.message || "غير معروف"}`);
-      return;
-    }
-
-    if (!data.matched) {
-      // استخدام "غير متعارف" بدلاً من "غير مطابق"
-      showResult(`
-        <div><b>غير متعارف</b></div>
-        <div>التشابه: <b>${data.similarity}</b></div>
-        <div style="margin-top:8px;color:#555">${data.message || ""}</div>
-      `);
-      return;
-    }
-
-    // تم إزالة سطر التفعيلات تماماً
-    showResult(`
-      <div><b>الوزن:</b> ${data.weight}</div>
-      <div><b>التشابه:</b> ${data.similarity}</div>
-      <hr />
-      <div><b>أقرب مثال:</b></div>
-      <div style="color:#333">${data.closest_example}</div>
-    `);
+    renderResult(await res.json());
 
   } catch (e) {
     showResult(`<b>حدث خطأ في الاتصال بالسيرفر.</b><br/>${String(e)}`);
@@ -68,4 +133,4 @@ analyzeBtn.addEventListener("click", async () => {
     analyzeBtn.disabled = false;
     analyzeBtn.textContent = "تحليل الوزن";
   }
-});
\ No newline at end of file
+});